@@ -25,7 +25,7 @@ os.chdir("C:/Users/tmf77/courses/SYSEN5381/dsai/06_agents")
 ## 0.2 Load Functions #################################
 
 # Load helper functions for agent orchestration
-from functions import agent_run, get_shortages, df_as_text
+from functions import agent_run, agent_map_reduce, get_shortages
 
 # 1. CONFIGURATION ###################################
 
@@ -76,13 +76,12 @@ stat = data.groupby("generic_name").apply(lambda x: x.loc[x["update_date"].idxma
 # Just remove the line `.query("availability" == "Unavailable")` if that's the case.
 
 
-# Convert the data to a text string
-task2 = df_as_text(stat)
-
 # Task 2 - Analyst Agent -------------------------
 # This agent analyzes the data and returns a markdown table
 role2 = "I analyze medicine shortage data provided by the user in a table, and return a markdown table of currently ongoing shortages."
-result2 = agent_run(role=role2, task=task2, model=MODEL, output="text")
+# The whole table is often too long for one prompt, so analyze it in
+# token-bounded chunks and merge the partial answers (see agent_map_reduce())
+result2, report2 = agent_map_reduce(role=role2, df=stat, model=MODEL, chunk_tokens=1500, fan_in=4, max_concurrency=4)
 
 result2
 
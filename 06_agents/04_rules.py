@@ -20,7 +20,8 @@ import requests      # for HTTP requests
 ## 0.2 Load Functions #################################
 
 # Load helper functions for agent orchestration
-from functions import agent_run, get_shortages, df_as_text
+from functions import agent_run, agent_map_reduce, get_shortages, df_as_text
+import functions  # for LAST_STREAM_STATS after a streamed call
 
 # 1. CONFIGURATION ###################################
 
@@ -102,8 +103,14 @@ role2_base = "Analyze medicine shortage data provide by the user in a table, and
 # Add rules to the role
 role2_with_rules = f"{role2_base}\n\n{format_rules_for_prompt(rules_data_analysis)}"
 
-# Run the agent with rules
-result2 = agent_run(role=role2_with_rules, task=result1, model=MODEL, output="text")
+# Run the agent with rules.
+# Up to 500 rows won't fit in a small model's context window in one prompt,
+# so agent_map_reduce() analyzes ~1500-token chunks of the table 4 at a time,
+# then merges the partial tables 4 at a time until one is left.
+result2, report2 = agent_map_reduce(role=role2_with_rules, df=stat, model=MODEL,
+                                    chunk_tokens=1500, fan_in=4, max_concurrency=4)
+print(f"Analysis: {report2['rows']} rows in {report2['chunks']} chunks, "
+      f"{report2['levels']} merge rounds, {report2['calls']} calls, {report2['elapsed_seconds']:.1f}s")
 
 # Task 3 - Press Release Agent with Rules -------------------------
 # Base role for the press release agent
@@ -112,19 +119,26 @@ role3_base = "Write a 1-page press release on the currently ongoing shortages, u
 # Add rules to the role
 role3_with_rules = f"{role3_base}\n\n{format_rules_for_prompt(rules_press_release)}"
 
-# Run the agent with rules
-result3 = agent_run(role=role3_with_rules, task=result2, model=MODEL, output="text")
+# Run the agent with rules, streaming the press release as it is written.
+# stream=True prints each piece of text as soon as the model produces it,
+# instead of waiting for the whole 1-page release.
+print("📰 Press Release (streaming):")
+result3 = agent_run(role=role3_with_rules, task=result2, model=MODEL, output="text",
+                    stream=True, on_token=lambda t: print(t, end="", flush=True))
+print()
+
+# How long did we wait for the first token, and how fast did the rest arrive?
+stats = functions.LAST_STREAM_STATS
+print(f"Time to first token: {stats['ttft_seconds'] or 0:.2f}s | "
+      f"total: {stats['total_seconds']:.2f}s | "
+      f"speed: {stats['tokens_per_second'] or 0:.1f} tokens/s")
+print()
 
 # Note that the performance of the agent depends significantly on how much context you allow in one call.
 # https://docs.ollama.com/context-length
 
 # 6. DISPLAY RESULTS ###################################
 
-# View press release
-print("📰 Press Release:")
-print(result3)
-print()
-
 # Display all results
 print("=== Agent 1 Result (Data Fetch) ===")
 print(result1)
@@ -51,6 +51,9 @@ import requests  # for HTTP requests
 from dotenv import load_dotenv  # for loading .env files
 from PIL import Image  # for image resizing
 
+# Shared Ollama Cloud rate limiter (06_agents/functions.py)
+from functions import send_with_backoff
+
 ## 0.2 Image Processing #################################
 
 # First step: downscale the image.
@@ -121,8 +124,10 @@ def query(image_file_path, user_prompt, model_name, api_key):
         "Content-Type": "application/json",
     }
 
-    # POST to Ollama Cloud
-    response = requests.post("https://ollama.com/api/chat", headers=headers, json=body, timeout=120)
+    # POST to Ollama Cloud, through the rate limiter.
+    # If Ollama Cloud answers 429 (too many requests), send_with_backoff() waits and retries.
+    url = "https://ollama.com/api/chat"
+    response = send_with_backoff(lambda: requests.post(url, headers=headers, json=body, timeout=120), url)
     response.raise_for_status()
     result = response.json()
     return result["message"]["content"]
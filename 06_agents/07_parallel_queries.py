@@ -8,6 +8,7 @@
 # This script shows how to run basic qualitative coding / content analysis
 # very quickly with a local LLM. We'll send many requests in parallel, then
 # clean the outputs into standardized labels we can analyze.
+# Run from the repo root: python 06_agents/07_parallel_queries.py
 
 # If you haven't already, install these packages...
 # pip install requests pandas
@@ -16,17 +17,21 @@
 
 ## 0.1 Load Packages #################################
 
-import time  # for timing parallel requests
-from concurrent.futures import ThreadPoolExecutor  # for parallel API calls
+import os, sys  # for path handling
 
-import pandas as pd  # for reading and sampling feedback data
+import pandas as pd  # for reading feedback data
 import requests  # for HTTP requests
 
+# Load the adaptive batch runner from 06_agents/functions.py
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from functions import (OLLAMA_HOST, AIMDController, add_keep_alive, label_validator, normalize_text,
+                       run_batch_cascade, run_batch_dedup, warm_up)
+
 ## 0.2 Read Data #################################
 
 # Text to classify:
-# Let's take a random sample of 10 pieces of feedback.
-texts = pd.read_csv("06_agents/07_feedback.csv").sample(n=10, random_state=42)
+# We classify every piece of feedback in the file.
+texts = pd.read_csv("06_agents/07_feedback.csv")
 
 # 1. CONCEPT ###################################
 
@@ -48,9 +53,7 @@ texts = pd.read_csv("06_agents/07_feedback.csv").sample(n=10, random_state=42)
 
 def get_request(content, prompt, model):
     """Build URL + request body for a local Ollama chat call."""
-    port = 11434
-    ollama_host = f"http://localhost:{port}"
-    url = f"{ollama_host}/api/chat"
+    url = f"{OLLAMA_HOST}/api/chat"  # localhost:11434 unless OLLAMA_HOST is set
 
     # We use /api/chat so we can send multiple messages
     # (system instructions + user content), not just one prompt.
@@ -62,7 +65,8 @@ def get_request(content, prompt, model):
         ],
         "stream": False,
     }
-    return url, body
+    # Send the keep_alive set by warm_up(), so the model stays loaded between requests
+    return url, add_keep_alive(body)
 
 
 def req_perform(content, prompt, model):
@@ -88,6 +92,10 @@ model = "smollm2:1.7b"
 
 # 2. TEST ONE REQUEST ###################################
 
+# Load the model before timing anything. Otherwise the first request pays the
+# model load time, and the batch runner mistakes that for an overloaded server.
+warm_up([model], keep_alive="10m")
+
 # Do one quick test request.
 test_resp = req_perform(content="booo", prompt=prompt, model=model)
 print("Test response:")
@@ -98,13 +106,29 @@ print()
 
 feedback_list = texts["feedback"].astype(str).tolist()
 
-# Send all requests in parallel and time the operation.
-start_time = time.time()
-with ThreadPoolExecutor(max_workers=min(10, len(feedback_list))) as executor:
-    responses = list(executor.map(lambda text: req_perform(text, prompt, model), feedback_list))
-elapsed = time.time() - start_time
+# How many requests should be in flight at once? Too many overloads a small
+# local Ollama; too few wastes a big remote one. The AIMD controller starts small,
+# adds a request while latency stays flat, and halves on timeouts or 429/503 errors.
+#
+# Reviews often repeat (sometimes with extra spaces), so we also send only one
+# request per distinct (prompt, text, model) and copy the answer to the duplicates.
+controller = AIMDController(start=2, max_limit=16)
+responses, report = run_batch_dedup(
+    lambda text: req_perform(text, prompt, model),
+    feedback_list,
+    key=lambda text: (prompt, normalize_text(text), model),
+    controller=controller,
+)
+
+print(f"Time taken to classify {report['n']} texts: {report['elapsed_seconds']:.2f} seconds")
+print(f"Distinct texts sent: {report['n_unique']} "
+      f"(dedup ratio {report['dedup_ratio']:.0%}, {report['calls_saved']} LLM calls saved)")
+print(f"Throughput: {report['throughput_per_second']:.2f} requests/second")
+print(f"Concurrency settled at {report['settled_concurrency']} "
+      f"(average {report['mean_concurrency']:.1f}); errors: {report['errors']}")
 
-print(f"Time taken to send {len(feedback_list)} requests: {elapsed:.2f} seconds")
+# Failed requests come back as exceptions; treat them as missing responses
+responses = [None if isinstance(r, Exception) else r for r in responses]
 
 # View the results.
 print("Raw responses:")
@@ -120,4 +144,48 @@ sentiments = (
     .str.lower()
     .str.extract(r"(positive|negative|other)", expand=False)
 )
-print(sentiments)
\ No newline at end of file
+print(sentiments)
+
+# 5. CASCADE: SMALL MODEL FIRST ############################
+
+# Most reviews are easy ("love it!", "broke after a day"). A much smaller model
+# can label those, and we only need the bigger model when the small one's
+# answer doesn't name exactly one allowed label. Let's try that and compare
+# with the single-model run above on the same distinct texts.
+small_model = "smollm2:135m"
+warm_up([small_model], keep_alive="10m")
+
+first_text = {}
+for text in feedback_list:
+    first_text.setdefault(normalize_text(text), text)
+unique_texts = list(first_text.values())
+
+cascade_outputs, cascade_report = run_batch_cascade(
+    lambda text, m: req_perform(text, prompt, m),
+    unique_texts,
+    models=[small_model, model],
+    accept=label_validator(["positive", "negative", "other"]),
+    controller=AIMDController(start=2, max_limit=16),
+)
+
+print(f"Single model ({model}): {report['elapsed_seconds']:.2f} seconds, "
+      f"{report['n_unique'] / report['elapsed_seconds']:.2f} texts/second")
+print(f"Cascade ({small_model} -> {model}): {cascade_report['elapsed_seconds']:.2f} seconds, "
+      f"{cascade_report['throughput_per_second']:.2f} texts/second")
+print(f"Escalated to {model}: {cascade_report['escalated']} of {len(unique_texts)} "
+      f"({cascade_report['escalation_rate']:.0%}); calls per model: {cascade_report['calls_by_model']}")
+print(f"Answers that still failed the label check: {cascade_report['rejected']}")
+
+# Copy each answer back to every duplicate, then clean labels as before
+by_text = dict(zip(first_text, cascade_outputs))
+cascade_responses = [by_text[normalize_text(text)] for text in feedback_list]
+cascade_responses = [None if isinstance(r, Exception) else r for r in cascade_responses]
+cascade_sentiments = (
+    pd.Series(cascade_responses, name="response")
+    .str.lower()
+    .str.extract(r"(positive|negative|other)", expand=False)
+)
+
+# How often does the cascade agree with the bigger model alone?
+agreement = (cascade_sentiments == sentiments).mean()
+print(f"Cascade labels match the single-model labels for {agreement:.0%} of texts")
@@ -31,7 +31,7 @@ _ = runpy.run_path(ollama_script_path)
 ## 0.4 Load Functions #################################
 
 # Load helper functions for agent orchestration
-from functions import agent_run
+from functions import agent_run, warm_up
 
 ## 0.3 Configuration #################################
 
@@ -41,6 +41,12 @@ PORT = 11434  # use this default port
 OLLAMA_HOST = f"http://localhost:{PORT}"  # use this default host
 DOCUMENT = "data/sample.txt"  # path to the text document to search
 
+## 0.5 Warm Up the Model #################################
+
+# Load the model now (and keep it loaded for 30 minutes), so the first
+# question doesn't also wait for the model to load.
+warm_up([MODEL], keep_alive="30m")
+
 # 1. SEARCH FUNCTION ###################################
 
 def search_text(query, document_path):
@@ -32,13 +32,19 @@
 
 # Prefer local 07_rag/functions.py over the PyPI "functions" package (incompatible with Python 3).
 import json
+import hashlib   # for content hashes of chunks
 import os        # for file path operations
 import runpy     # for executing another Python script
 from dotenv import load_dotenv
 import requests  # for HTTP requests
 import sqlite3
+import threading # for the query embedding cache lock
+import time      # for timing the index build
+from collections import OrderedDict  # for the LRU query embedding cache
+import numpy as np  # for float32 embedding arrays
 from sentence_transformers import SentenceTransformer
 from sqlite_vec import load as sqlite_vec_load, serialize_float32
+from functions import send_with_backoff  # shared Ollama Cloud rate limiter
 
 # 0.2 Working Directory #################################
 
@@ -67,12 +73,16 @@ except ImportError:
 # To find the path for use in R, in git bash run:
 # python -c "import sqlite_vec; print(sqlite_vec.loadable_path())"
 
-DB_PATH = "data/embed.db"  # path to your new vector embeddings database
-if os.path.exists(DB_PATH): os.remove(DB_PATH) 
-else: print("No database found, creating new one.")
+DB_PATH = "data/embed.db"  # path to your vector embeddings database (kept between runs)
+if not os.path.exists(DB_PATH): print("No database found, creating new one.")
 DOCUMENT = "data/lower_manhattan_recovery_plan.txt"  # path to text doc
 EMBED_MODEL = "all-MiniLM-L6-v2"  # model for embedding text into vectors
 VEC_DIM = 384   # all-MiniLM-L6-v2 output size
+EMBED_BATCH_SIZE = 64  # chunks per encode() call when building the index
+QUERY_CACHE_PATH = "data/query_cache.npz"  # saved query embeddings (None = keep them in memory only)
+QUERY_CACHE_ITEMS = 1024  # max cached query embeddings
+QUERY_CACHE_BYTES = 16 * 1024 * 1024  # max memory for cached query embeddings (16 MB)
+VECTOR_STORE_PATH = "data/embed_store"  # file prefix for the NumPy copy of the index
 MODEL = "gpt-oss:20b-cloud"  # cloud model (Ollama Cloud; for RAG answer step)
 
 
@@ -103,15 +113,13 @@ def agent_run(role, task, model="gpt-oss:20b-cloud"):
         "stream": False  # Non-streaming response
     }
 
-    # Build and send the POST request to Ollama Cloud API
-    response = requests.post(
-        url,
-        headers={
-            "Authorization": f"Bearer {OLLAMA_API_KEY}",
-            "Content-Type": "application/json"
-        },
-        json=body
-    )
+    # Build and send the POST request to Ollama Cloud API.
+    # send_with_backoff() spaces out requests and retries on 429 (too many requests).
+    headers = {
+        "Authorization": f"Bearer {OLLAMA_API_KEY}",
+        "Content-Type": "application/json"
+    }
+    response = send_with_backoff(lambda: requests.post(url, headers=headers, json=body), url)
     response.raise_for_status()
 
     # Parse the response JSON
@@ -154,28 +162,187 @@ def get_text(document_path):
     chunks = [p.strip() for p in parts if p.strip()]
     return chunks
 
+# Encode many texts in one call. The model embeds a whole batch with one matrix
+# multiplication, which is much faster than one encode() call per sentence.
+def embed_many(texts, batch_size=EMBED_BATCH_SIZE):
+    m = get_embed_model()
+    vecs = m.encode(texts, batch_size=batch_size, convert_to_numpy=True)
+    return np.ascontiguousarray(vecs, dtype=np.float32)  # (len(texts), VEC_DIM) float32 array
+
+# Cache query embeddings. Users (and evaluation scripts) ask the same questions again
+# and again, and embedding a query is the slowest step of a search once the index exists.
+# This keeps the most recently used query vectors, up to max_items and max_bytes,
+# and forgets the least recently used one when full (an "LRU" cache).
+# Keys are (embedding model, normalized query), so changing EMBED_MODEL never reuses old vectors.
+class QueryEmbeddingCache:
+    def __init__(self, max_items=QUERY_CACHE_ITEMS, max_bytes=QUERY_CACHE_BYTES, path=None):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.path = path
+        self.items = OrderedDict()  # (model, query) -> float32 vector, least recently used first
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+        if path and os.path.exists(path):
+            self.load(path)
+
+    # Queries that differ only in case or spacing share one entry
+    # (all-MiniLM-L6-v2 lowercases its input, so they embed the same anyway).
+    @staticmethod
+    def key(query, model=None):
+        return (model or EMBED_MODEL, " ".join(query.split()).casefold())
+
+    @staticmethod
+    def size(key, vec):
+        return vec.nbytes + len(key[0]) + len(key[1])
+
+    def get(self, query, model=None):
+        key = self.key(query, model)
+        with self.lock:
+            vec = self.items.get(key)
+            if vec is None:
+                self.misses += 1
+                return None
+            self.items.move_to_end(key)
+            self.hits += 1
+            return vec
+
+    def put(self, query, vec, model=None):
+        key = self.key(query, model)
+        vec = np.ascontiguousarray(vec, dtype=np.float32)
+        with self.lock:
+            if key in self.items:
+                self.bytes -= self.size(key, self.items.pop(key))
+            self.items[key] = vec
+            self.bytes += self.size(key, vec)
+            while self.items and (len(self.items) > self.max_items or self.bytes > self.max_bytes):
+                old_key, old_vec = self.items.popitem(last=False)
+                self.bytes -= self.size(old_key, old_vec)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+            self.bytes = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {"items": len(self.items), "bytes": self.bytes, "hits": self.hits, "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0, "evictions": self.evictions}
+
+    # Save to / load from a .npz file, so a restarted script starts with a warm cache.
+    def save(self, path=None):
+        path = path or self.path
+        if not path:
+            return
+        with self.lock:
+            keys = list(self.items)
+            vecs = np.stack(list(self.items.values())) if keys else np.zeros((0, VEC_DIM), np.float32)
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, models=np.array([k[0] for k in keys], dtype=str),
+                     queries=np.array([k[1] for k in keys], dtype=str), vectors=vecs)
+        os.replace(tmp, path)  # never leave a half-written file behind
+
+    def load(self, path):
+        with np.load(path) as data:
+            for model, query, vec in zip(data["models"], data["queries"], data["vectors"]):
+                self.put(str(query), vec, model=str(model))
+
+query_cache = QueryEmbeddingCache(path=QUERY_CACHE_PATH)
+
+# Embed a search query, reusing the cached vector for a query we've seen before.
+def embed_query(query):
+    vec = query_cache.get(query)
+    if vec is None:
+        vec = np.asarray(embed(query), dtype=np.float32)
+        query_cache.put(query, vec)
+    return vec
+
+# A short fingerprint of a chunk's text. Same text -> same hash, so on a rerun
+# we can tell which chunks are already in the database without embedding them again.
+def chunk_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+# Create the chunks table and vec_chunks virtual table.
+# vec0 virtual table: rowid, embedding (float32). Cosine distance for similarity search.
+# We keep id, text, source file, content hash and embedding model in chunks so we can
+# join after MATCH and update the index incrementally.
+# Existing tables are kept, unless they were built with another EMBED_MODEL or VEC_DIM
+# (or by an older version of this script): then everything is dropped and rebuilt.
+def init_index(conn):
+    cols = {row[1] for row in conn.execute("PRAGMA table_info(chunks)")}
+    vec_sql = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'vec_chunks'").fetchone()
+    models = {m for (m,) in conn.execute("SELECT DISTINCT model FROM chunks")} if "model" in cols else set()
+    if {"hash", "model"} <= cols and vec_sql and f"float[{VEC_DIM}]" in vec_sql[0] and models <= {EMBED_MODEL}:
+        return False
+    if cols or vec_sql:
+        print(f"Index was built with another model, vector size or layout; rebuilding it for {EMBED_MODEL}.")
+    with conn:
+        conn.execute("DROP TABLE IF EXISTS chunks")
+        conn.execute("DROP TABLE IF EXISTS vec_chunks")
+        conn.execute(
+            "CREATE TABLE chunks (id INTEGER PRIMARY KEY, text TEXT NOT NULL, "
+            "source TEXT NOT NULL, hash TEXT NOT NULL, model TEXT NOT NULL)"
+        )
+        conn.execute("CREATE INDEX chunks_source_hash ON chunks (source, hash)")
+        conn.execute(f"CREATE VIRTUAL TABLE vec_chunks USING vec0(embedding float[{VEC_DIM}] distance_metric=cosine)")
+    return True
+
 # Embed each chunk and insert into vec_chunks (float32 blob + text).
 # R uses a single vec0 table with id, embedding, +text; Python sqlite_vec uses
-# a vec0 virtual table (rowid, embedding) plus a chunks table (id, text) for compatibility.
-def build_index_from_document(conn, chunks):
-    # Given a database connection 'conn' and a list of text chunks 'chunks',
-    # embed each chunk and insert into database (chunks table + vec_chunks virtual table).
+# a vec0 virtual table (rowid, embedding) plus a chunks table (id, text, ...) for compatibility.
+def build_index_from_document(conn, chunks, batch_size=EMBED_BATCH_SIZE, source=DOCUMENT):
+    # Given a database connection 'conn' and a list of new text chunks 'chunks',
+    # embed the chunks batch_size at a time and insert them into the database
+    # (chunks table + vec_chunks virtual table). batch_size=1 works like embedding one sentence at a time.
     n = len(chunks)
-    print(f"Embedding {n} chunks with {EMBED_MODEL}...")
-    for i, text in enumerate(chunks):
-        # Embed the chunk
-        vec = embed(text)
-        # Convert the vector to a float32 blob
-        blob = serialize_float32(vec)
-        # Insert the chunk into the chunks table
-        conn.execute("INSERT INTO chunks (id, text) VALUES (?, ?)", (i, text))
-        # Insert into vec_chunks (rowid aligns with chunks.id)
-        conn.execute(
-            "INSERT INTO vec_chunks (rowid, embedding) VALUES (?, ?)",
-            (i, blob)
-        )
-    conn.commit()
-    print("Index built.\n")
+    print(f"Embedding {n} chunks with {EMBED_MODEL} in batches of {batch_size}...")
+    start = time.perf_counter()
+    # New ids continue after the largest id already in the table
+    first_id = conn.execute("SELECT COALESCE(MAX(id), -1) + 1 FROM chunks").fetchone()[0]
+    # `with conn` wraps all inserts in one transaction (committed at the end)
+    with conn:
+        for b in range(0, n, batch_size):
+            batch = chunks[b:b + batch_size]
+            ids = range(first_id + b, first_id + b + len(batch))
+            vecs = embed_many(batch, batch_size=batch_size)
+            # Each row's raw bytes are already the float32 blob sqlite-vec expects
+            # (same as serialize_float32(vec.tolist()), without the list in between)
+            conn.executemany(
+                "INSERT INTO chunks (id, text, source, hash, model) VALUES (?, ?, ?, ?, ?)",
+                ((i, text, source, chunk_hash(text), EMBED_MODEL) for i, text in zip(ids, batch))
+            )
+            # Insert into vec_chunks (rowid aligns with chunks.id)
+            conn.executemany(
+                "INSERT INTO vec_chunks (rowid, embedding) VALUES (?, ?)",
+                zip(ids, (vec.tobytes() for vec in vecs))
+            )
+    elapsed = time.perf_counter() - start
+    print(f"Index built: {n} chunks in {elapsed:.2f}s ({n / elapsed if elapsed else 0:.0f} chunks/second).\n")
+    return {"chunks": n, "seconds": elapsed, "chunks_per_second": n / elapsed if elapsed else 0.0}
+
+# Bring the index up to date with a document: embed only chunks that are new or changed,
+# delete chunks that are no longer in it, and leave everything else alone.
+# On an unchanged document this only reads the stored hashes, so it takes milliseconds.
+def update_index(conn, chunks, source=DOCUMENT, batch_size=EMBED_BATCH_SIZE):
+    start = time.perf_counter()
+    wanted = {chunk_hash(text): text for text in chunks}  # a sentence that appears twice is stored once
+    stored = dict(conn.execute("SELECT hash, id FROM chunks WHERE source = ?", (source,)).fetchall())
+    new = [text for h, text in wanted.items() if h not in stored]
+    gone = [(i,) for h, i in stored.items() if h not in wanted]
+    with conn:
+        conn.executemany("DELETE FROM chunks WHERE id = ?", gone)
+        conn.executemany("DELETE FROM vec_chunks WHERE rowid = ?", gone)
+    if new:
+        build_index_from_document(conn, new, batch_size=batch_size, source=source)
+    elapsed = time.perf_counter() - start
+    report = {"added": len(new), "removed": len(gone), "unchanged": len(wanted) - len(new), "seconds": elapsed}
+    print(f"Index up to date for {source}: {report['added']} added, {report['removed']} removed, "
+          f"{report['unchanged']} unchanged ({elapsed * 1000:.0f} ms).\n")
+    return report
 
 
 # SEMANTIC SEARCH
@@ -183,28 +350,45 @@ def build_index_from_document(conn, chunks):
 # Create a function to perform semantic search on the vector embeddings database,
 # using the KNN search algorithm for similarity search with sqlite-vec.
 # KNN runs inside the DB: embed query, MATCH in SQL, return top k. Score = 1 - distance (higher = more similar).
-def search_embed_sql(conn, query, k=3):
-    query_vec = embed(query)
-    query_blob = serialize_float32(query_vec)
-    cur = conn.execute(
-        """
+# One statement finds the k nearest rowids (`k = ?` tells vec0 how many) and joins them
+# to their text, instead of one extra SELECT per hit.
+KNN_SQL = """
+    WITH knn AS (
         SELECT rowid, distance
         FROM vec_chunks
-        WHERE embedding MATCH ?
-        ORDER BY distance
-        LIMIT ?
-        """,
-        (query_blob, k)
+        WHERE embedding MATCH ? AND k = ?
     )
-    rows = cur.fetchall()
-    if not rows:
+    SELECT knn.rowid, knn.distance, chunks.text
+    FROM knn
+    JOIN chunks ON chunks.id = knn.rowid
+    ORDER BY knn.distance
+"""
+
+# Search with query vectors that are already embedded: one list of hits per vector.
+def search_vectors(conn, vecs, k=3):
+    vecs = np.ascontiguousarray(vecs, dtype=np.float32).reshape(-1, VEC_DIM)
+    return [
+        [{"id": rowid, "score": 1 - distance, "text": text}
+         for rowid, distance, text in conn.execute(KNN_SQL, (vec.tobytes(), k))]
+        for vec in vecs
+    ]
+
+def search_embed_sql(conn, query, k=3):
+    query_vec = embed_query(query)
+    return search_vectors(conn, query_vec, k=k)[0]
+
+# Search for many queries at once (e.g. an evaluation set of questions):
+# queries not in the cache are embedded in one batch, then each runs the same KNN statement.
+def search_embed_sql_many(conn, queries, k=3):
+    if not queries:
         return []
-    out = []
-    for rowid, distance in rows:
-        (text,) = conn.execute("SELECT text FROM chunks WHERE id = ?", (rowid,)).fetchone()
-        score = 1 - distance
-        out.append({"id": rowid, "score": score, "text": text})
-    return out
+    vecs = [query_cache.get(q) for q in queries]
+    todo = [i for i, v in enumerate(vecs) if v is None]
+    if todo:
+        for i, vec in zip(todo, embed_many([queries[i] for i in todo])):
+            vecs[i] = vec
+            query_cache.put(queries[i], vec)
+    return search_vectors(conn, np.stack(vecs), k=k)
 
 # Connect and load sqlite-vec.
 def connect_db(path=DB_PATH):
@@ -214,6 +398,123 @@ def connect_db(path=DB_PATH):
     conn.enable_load_extension(False)
     return conn
 
+# VECTOR STORES
+
+# Both stores answer store.search(query, k) and store.search_many(queries, k) with the same
+# hits ({"id", "score", "text"}, best first), so the RAG workflow can use either one.
+
+# sqlite-vec: vectors live inside the SQLite database (the index built above).
+class SqliteVecStore:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def search(self, query, k=3):
+        return search_embed_sql(self.conn, query, k=k)
+
+    def search_many(self, queries, k=3):
+        return search_embed_sql_many(self.conn, queries, k=k)
+
+# NumPy: for corpora of millions of sentences, keep the vectors in plain .npy files instead.
+# Opening the store memory-maps the files (np.load(mmap_mode="r")): nothing is copied
+# into memory up front, and the operating system pages in what a search touches.
+# Search is brute force: every vector is unit length, so one matrix-vector product gives
+# the cosine similarity to every chunk, and np.argpartition picks the top k without sorting all of them.
+# With quantize=True, each vector is stored as int8 (-127..127) times one float32 scale
+# per row: about 3x smaller files (text included), at a small cost in accuracy. Each block of
+# int8 rows is converted to float32 just before the product, so searches still use fast float math.
+# Files, for path="data/embed_store":
+#   embed_store.vectors.npy   (n, VEC_DIM) float32 or int8
+#   embed_store.scales.npy    (n,) float32, int8 stores only
+#   embed_store.ids.npy       (n,) int64 chunk ids
+#   embed_store.offsets.npy   (n + 1,) int64 byte offsets into embed_store.text.bin
+#   embed_store.text.bin      every chunk's UTF-8 text, back to back
+STORE_BLOCK_ROWS = 16384  # rows scored at once; bounds the temporary memory per search
+
+class NumpyVectorStore:
+    def __init__(self, path):
+        self.path = path
+        self.vectors = np.load(f"{path}.vectors.npy", mmap_mode="r")
+        self.scales = np.load(f"{path}.scales.npy", mmap_mode="r") if self.vectors.dtype == np.int8 else None
+        self.ids = np.load(f"{path}.ids.npy", mmap_mode="r")
+        self.offsets = np.load(f"{path}.offsets.npy", mmap_mode="r")
+        size = int(self.offsets[-1])
+        self.text = np.memmap(f"{path}.text.bin", dtype=np.uint8, mode="r") if size else np.zeros(0, np.uint8)
+
+    # Write a store from chunk ids, texts and their (n, VEC_DIM) embeddings.
+    @staticmethod
+    def write(path, ids, texts, vecs, quantize=False):
+        vecs = np.asarray(vecs, dtype=np.float32).reshape(-1, VEC_DIM)
+        norms = np.linalg.norm(vecs, axis=1, keepdims=True)
+        vecs = vecs / np.where(norms == 0, 1, norms)
+        if quantize:
+            scales = np.abs(vecs).max(axis=1) / 127
+            scales[scales == 0] = 1
+            np.save(f"{path}.scales.npy", scales.astype(np.float32))
+            vecs = np.round(vecs / scales[:, None]).astype(np.int8)
+        elif os.path.exists(f"{path}.scales.npy"):
+            os.remove(f"{path}.scales.npy")
+        np.save(f"{path}.vectors.npy", vecs)
+        np.save(f"{path}.ids.npy", np.asarray(ids, dtype=np.int64))
+        encoded = [t.encode("utf-8") for t in texts]
+        np.save(f"{path}.offsets.npy", np.concatenate([[0], np.cumsum([len(b) for b in encoded])]).astype(np.int64))
+        with open(f"{path}.text.bin", "wb") as f:
+            f.write(b"".join(encoded))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def nbytes(self):
+        return sum(a.nbytes for a in (self.vectors, self.ids, self.offsets, self.text)) + \
+            (self.scales.nbytes if self.scales is not None else 0)
+
+    def text_of(self, row):
+        return bytes(self.text[self.offsets[row]:self.offsets[row + 1]]).decode("utf-8")
+
+    # Search with query vectors that are already embedded: one list of hits per vector.
+    def search_vectors(self, vecs, k=3):
+        queries = np.asarray(vecs, dtype=np.float32).reshape(-1, VEC_DIM)
+        queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        k = min(k, len(self))
+        if k == 0:
+            return [[] for _ in queries]
+        best_rows, best_scores = [], []
+        for start in range(0, len(self), STORE_BLOCK_ROWS):
+            block = self.vectors[start:start + STORE_BLOCK_ROWS]
+            scores = block @ queries.T if self.scales is None else \
+                (block.astype(np.float32) @ queries.T) * self.scales[start:start + len(block), None]
+            # Best k rows of this block for every query (unordered), then keep only those
+            top = np.argpartition(-scores, k - 1, axis=0)[:k] if len(block) > k else \
+                np.broadcast_to(np.arange(len(block))[:, None], scores.shape)
+            best_rows.append(top + start)
+            best_scores.append(np.take_along_axis(scores, top, axis=0))
+        rows, scores = np.vstack(best_rows), np.vstack(best_scores)
+        results = []
+        for q in range(len(queries)):
+            order = np.argsort(-scores[:, q])[:k]
+            results.append([
+                {"id": int(self.ids[r]), "score": float(s), "text": self.text_of(r)}
+                for r, s in zip(rows[order, q], scores[order, q])
+            ])
+        return results
+
+    def search(self, query, k=3):
+        return self.search_vectors(embed_query(query), k=k)[0]
+
+    def search_many(self, queries, k=3):
+        if not queries:
+            return []
+        return self.search_vectors(embed_many(list(queries)), k=k)
+
+# Copy the sqlite-vec index into a NumPy store (no re-embedding needed).
+def export_numpy_store(conn, path, quantize=False):
+    rows = conn.execute(
+        "SELECT chunks.id, chunks.text, vec_chunks.embedding "
+        "FROM chunks JOIN vec_chunks ON vec_chunks.rowid = chunks.id ORDER BY chunks.id"
+    ).fetchall()
+    vecs = np.frombuffer(b"".join(r[2] for r in rows), dtype=np.float32).reshape(-1, VEC_DIM)
+    NumpyVectorStore.write(path, [r[0] for r in rows], [r[1] for r in rows], vecs, quantize=quantize)
+    return NumpyVectorStore(path)
+
 # 2. SEMANTIC SEARCHWORKFLOW ################
 
 print("--------------------------------")
@@ -231,24 +532,12 @@ print(f"Found {n} chunks in the document.")
 
 conn = connect_db(DB_PATH)
 
-# Create the chunks table and vec_chunks virtual table.
-# vec0 virtual table: rowid, embedding (float32). Cosine distance for similarity search.
-# We keep id and text in chunks so we can join after MATCH.
-conn.execute("CREATE TABLE IF NOT EXISTS chunks (id INTEGER PRIMARY KEY, text TEXT NOT NULL)")
-conn.execute("DROP TABLE IF EXISTS vec_chunks")
-conn.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS vec_chunks USING vec0(embedding float[{VEC_DIM}] distance_metric=cosine)")
-conn.commit()
-
-# Construct the embedding database (takes longer for larger text documents)
-n_chunks = conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
-if n_chunks == 0:
-    import time
-    start = time.perf_counter()
-    build_index_from_document(conn, chunks)
-    elapsed = time.perf_counter() - start
-    print(f"Time taken to build index: {elapsed:.2f} seconds\n")
-else:
-    print("Using existing embedding index.\n")
+# Create the tables (or keep the ones from the last run, if they use the same model)
+init_index(conn)
+
+# Construct the embedding database. The first run embeds every chunk (takes longer
+# for larger text documents); later runs only embed chunks that changed.
+update_index(conn, chunks, source=DOCUMENT)
 #
 # conn.execute("SELECT * FROM chunks LIMIT 3;").fetchall()
 # conn.execute("SELECT * FROM vec_chunks LIMIT 3;").fetchall()
@@ -271,6 +560,17 @@ print("--------------------------------")
 
 print(test)
 
+# The same search with the index copied into memory-mapped NumPy files,
+# full precision and int8-quantized. Both answer search(query, k) like the database.
+print("--------------------------------")
+print("🔍 TEST SEARCH (NUMPY STORES):")
+print("--------------------------------")
+
+for quantize in (False, True):
+    store = export_numpy_store(conn, VECTOR_STORE_PATH + ("_int8" if quantize else ""), quantize=quantize)
+    print(f"{'int8' if quantize else 'float32'} store: {len(store)} chunks, {store.nbytes() / 1024:.0f} KB")
+    print(store.search("vulnerability", k=3))
+
 # Disconnect from the database
 conn.close()
 
@@ -330,3 +630,9 @@ print(json.loads(result3))  # parse the JSON string!
 
 # Disconnect from the database
 conn.close()
+
+# Save the query embedding cache, so the next run can skip re-encoding these queries
+query_cache.save()
+stats = query_cache.stats()
+print(f"Query embedding cache: {stats['items']} queries, {stats['hits']} hits / {stats['misses']} misses "
+      f"({stats['hit_rate']:.0%} hit rate)")
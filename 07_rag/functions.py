@@ -11,22 +11,139 @@
 
 import requests  # for HTTP requests
 import json      # for working with JSON
+import re        # for estimating token counts
+import asyncio   # for async (concurrent) agent calls
+import time      # for timing streamed responses
+import os        # for OLLAMA_HOST and rate limit settings
+import random    # for backoff jitter
+import threading # for the shared rate limiter
+from email.utils import parsedate_to_datetime  # for Retry-After dates
+from urllib.parse import urlsplit  # for per-host limiters
 import pandas as pd  # for data manipulation
 
+try:
+    import httpx  # async HTTP client, only needed for the *_async helpers
+except ImportError:
+    httpx = None
+
 # If you haven't already, install these packages...
-# pip install requests pandas
+# pip install requests pandas httpx
 
 ## 0.2 Configuration #################################
 
 # Default model and Ollama connection
 DEFAULT_MODEL = "smollm2:135m"
 PORT = 11434
-OLLAMA_HOST = f"http://localhost:{PORT}"
+
+
+def normalize_ollama_host(value, default_port=PORT):
+    """
+    Turn an OLLAMA_HOST setting into a URL we can send requests to.
+    "0.0.0.0:11434" (the address `ollama serve` listens on) -> "http://localhost:11434",
+    "mybox" -> "http://mybox:11434", "https://ollama.com" stays as it is.
+    """
+    value = (value or "").strip().rstrip("/")
+    if not value:
+        return None
+    if "://" not in value:
+        value = "http://" + value
+        if ":" not in value.split("://", 1)[1]:
+            value += f":{default_port}"
+    for wildcard in ("0.0.0.0", "[::]"):
+        value = value.replace(f"://{wildcard}", "://localhost")
+    return value
+
+
+# OLLAMA_HOST lets you point these helpers at another server (or benchmarks/mock_ollama.py)
+OLLAMA_HOST = normalize_ollama_host(os.getenv("OLLAMA_HOST")) or f"http://localhost:{PORT}"
 CHAT_URL = f"{OLLAMA_HOST}/api/chat"
+REQUEST_TIMEOUT = 300  # seconds; used by the streaming and async helpers
+ASYNC_CONCURRENCY = 8  # default max requests in flight for agent_run_many()
 
 # 1. AGENT FUNCTION ###################################
 
-def agent(messages, model=DEFAULT_MODEL, output="text", tools=None, all=False):
+# Streaming: with "stream": True, Ollama sends one JSON object per line (NDJSON) as tokens
+# are generated. Reading them as they arrive lets us show text early and measure
+# time-to-first-token (TTFT), the wait before the model starts answering.
+
+LAST_STREAM_STATS = {}  # stats from the most recent streamed call
+
+
+def agent_stream(messages, model=DEFAULT_MODEL, tools=None, stats=None):
+    """
+    Stream one chat call, yielding text pieces (deltas) as they arrive.
+
+    When the stream ends, `stats` (and LAST_STREAM_STATS) hold:
+    ttft_seconds, total_seconds, eval_count, tokens_per_second, and
+    result (the assembled response, shaped like a non-streaming /api/chat result).
+    """
+    global LAST_STREAM_STATS
+    stats = {} if stats is None else stats
+    body = {
+        "model": model,
+        "messages": messages,
+        "stream": True
+    }
+    if tools is not None:
+        body["tools"] = tools
+    add_keep_alive(body)
+
+    t0 = time.perf_counter()
+    ttft = None
+    parts = []
+    tool_calls = []
+    final = {}
+    with requests.post(CHAT_URL, json=body, timeout=REQUEST_TIMEOUT, stream=True) as response:
+        response.raise_for_status()
+        for line in response.iter_lines():
+            if not line:
+                continue
+            chunk = json.loads(line)
+            msg = chunk.get("message") or {}
+            # Tool calls arrive whole inside a chunk; collect them across the stream
+            tool_calls.extend(msg.get("tool_calls") or [])
+            delta = msg.get("content") or ""
+            if delta:
+                if ttft is None:
+                    ttft = time.perf_counter() - t0
+                parts.append(delta)
+                yield delta
+            if chunk.get("done"):
+                final = chunk
+                break
+    total = time.perf_counter() - t0
+
+    # Prefer Ollama's own token count and timing; fall back to counting chunks
+    eval_count = final.get("eval_count") or len(parts)
+    eval_seconds = (final.get("eval_duration") or 0) / 1e9
+    if eval_seconds <= 0:
+        eval_seconds = total - (ttft or 0)
+    message = {"role": "assistant", "content": "".join(parts)}
+    if tool_calls:
+        message["tool_calls"] = tool_calls
+    result = {k: v for k, v in final.items() if k != "message"}
+    result["message"] = message
+    stats.update({
+        "ttft_seconds": ttft,
+        "total_seconds": total,
+        "eval_count": eval_count,
+        "tokens_per_second": eval_count / eval_seconds if eval_seconds > 0 else None,
+        "result": result,
+    })
+    LAST_STREAM_STATS = stats
+
+
+def stream_chat(messages, model=DEFAULT_MODEL, tools=None, on_token=None):
+    """Run agent_stream() to the end, passing each delta to on_token. Returns the assembled result."""
+    stats = {}
+    for delta in agent_stream(messages, model=model, tools=tools, stats=stats):
+        if on_token is not None:
+            on_token(delta)
+    return stats["result"]
+
+
+def agent(messages, model=DEFAULT_MODEL, output="text", tools=None, all=False,
+          stream=False, on_token=None):
     """
     Agent wrapper function that runs a single agent, with or without tools.
     
@@ -43,6 +160,11 @@ def agent(messages, model=DEFAULT_MODEL, output="text", tools=None, all=False):
         List of tool metadata dictionaries for function calling
     all : bool
         If True, return all responses. If False, return only the last response.
+    stream : bool
+        If True, read the reply token by token (see agent_stream()).
+        Timing stats are saved in LAST_STREAM_STATS.
+    on_token : callable, optional
+        Called with each text piece while streaming, e.g. lambda t: print(t, end="")
     
     Returns:
     --------
@@ -52,29 +174,35 @@ def agent(messages, model=DEFAULT_MODEL, output="text", tools=None, all=False):
     
     # If the agent has NO tools, perform a standard chat
     if tools is None:
-        body = {
-            "model": model,
-            "messages": messages,
-            "stream": False
-        }
-        
-        response = requests.post(CHAT_URL, json=body)
-        response.raise_for_status()
-        result = response.json()
+        if stream:
+            result = stream_chat(messages, model=model, on_token=on_token)
+        else:
+            body = {
+                "model": model,
+                "messages": messages,
+                "stream": False
+            }
+            add_keep_alive(body)
+            response = requests.post(CHAT_URL, json=body)
+            response.raise_for_status()
+            result = response.json()
         
         return result["message"]["content"]
     else:
         # If the agent has tools, perform a tool call
-        body = {
-            "model": model,
-            "messages": messages,
-            "tools": tools,
-            "stream": False
-        }
-        
-        response = requests.post(CHAT_URL, json=body)
-        response.raise_for_status()
-        result = response.json()
+        if stream:
+            result = stream_chat(messages, model=model, tools=tools, on_token=on_token)
+        else:
+            body = {
+                "model": model,
+                "messages": messages,
+                "tools": tools,
+                "stream": False
+            }
+            add_keep_alive(body)
+            response = requests.post(CHAT_URL, json=body)
+            response.raise_for_status()
+            result = response.json()
         
         # For any given tool call, execute the tool call
         if "tool_calls" in result.get("message", {}):
@@ -83,7 +211,9 @@ def agent(messages, model=DEFAULT_MODEL, output="text", tools=None, all=False):
                 # Execute the tool function
                 # Note: Tool functions must be defined in the global scope
                 func_name = tool_call["function"]["name"]
-                func_args = json.loads(tool_call["function"]["arguments"])
+                raw_args = tool_call["function"].get("arguments", {})
+                # Ollama sends arguments as a dict (streamed or not); some servers send a JSON string
+                func_args = json.loads(raw_args) if isinstance(raw_args, str) else raw_args
                 
                 # Get the function from globals and execute it
                 func = globals().get(func_name)
@@ -100,7 +230,7 @@ def agent(messages, model=DEFAULT_MODEL, output="text", tools=None, all=False):
             return result["message"]["content"]
 
 
-def agent_run(role, task, tools=None, output="text", model=DEFAULT_MODEL):
+def agent_run(role, task, tools=None, output="text", model=DEFAULT_MODEL, stream=False, on_token=None):
     """
     Run an agent with a specific role and task.
     
@@ -116,6 +246,8 @@ def agent_run(role, task, tools=None, output="text", model=DEFAULT_MODEL):
         Output format (default: "text")
     model : str
         Model to use (default: DEFAULT_MODEL)
+    stream, on_token :
+        Stream the reply token by token; see agent().
     
     Returns:
     --------
@@ -130,28 +262,529 @@ def agent_run(role, task, tools=None, output="text", model=DEFAULT_MODEL):
     ]
     
     # Run the agent
-    resp = agent(messages=messages, model=model, output=output, tools=tools)
+    resp = agent(messages=messages, model=model, output=output, tools=tools,
+                 stream=stream, on_token=on_token)
     return resp
 
 
 # 2. DATA CONVERSION FUNCTION ###################################
 
-def df_as_text(df):
+TABLE_FORMATS = ("markdown", "csv", "tsv", "columns")
+
+
+def estimate_tokens(text):
     """
-    Convert a pandas DataFrame to a markdown table string.
-    
+    Rough token count for a prompt, without loading a tokenizer.
+
+    About one token per 4 letters, per 3 digits, per 2 punctuation marks and per 4 spaces
+    of padding (a single space between words is free). Good for comparing table formats;
+    Ollama's prompt_eval_count gives the real number.
+    """
+    n = 0
+    for piece in re.findall(r"[^\W\d_]+|\d+|\s+|[^\w\s]+|_+", str(text)):
+        if piece[0].isspace():
+            n += 0 if piece == " " else -(-len(piece) // 4)
+        elif piece[0].isdigit():
+            n += -(-len(piece) // 3)
+        elif piece[0].isalpha():
+            n += -(-len(piece) // 4)
+        else:
+            n += -(-len(piece) // 2)
+    return n
+
+
+def _is_text(series):
+    """True for text columns (object dtype, or pandas' string dtype)."""
+    return series.dtype == object or pd.api.types.is_string_dtype(series)
+
+
+def _truncate_cells(df, max_chars):
+    """Cut text values longer than max_chars, ending them with '…'."""
+    def cut(value):
+        if isinstance(value, str) and len(value) > max_chars:
+            return value[: max_chars - 1].rstrip() + "…"
+        return value
+    return df.apply(lambda col: col.map(cut) if _is_text(col) else col)
+
+
+def _format_table(df, format="markdown"):
+    """Serialize a DataFrame in one of TABLE_FORMATS."""
+    if format == "markdown":
+        return df.to_markdown(index=False)
+    if format in ("csv", "tsv"):
+        return df.to_csv(index=False, sep="\t" if format == "tsv" else ",").strip()
+    if format != "columns":
+        raise ValueError(f"Unknown table format {format!r}; use one of {TABLE_FORMATS}.")
+
+    # List the columns once. Text columns with a few values repeated over many rows
+    # (status, type...) get short codes, so rows don't repeat the same long words.
+    lines = ["Columns (row values in this order, separated by |):"]
+    codes = {}
+    for col in df.columns:
+        values = df[col].dropna().astype(str)
+        distinct = list(values.unique())
+        if _is_text(df[col]) and 0 < len(distinct) <= 26 and len(distinct) <= len(values) / 2:
+            codes[col] = {v: chr(ord("A") + i) for i, v in enumerate(distinct)}
+            legend = ", ".join(f"{c}={v}" for v, c in codes[col].items())
+            lines.append(f"- {col}: " + legend.replace("\n", " "))
+        else:
+            lines.append(f"- {col}")
+    lines.append("Rows:")
+    for row in df.itertuples(index=False):
+        cells = []
+        for col, value in zip(df.columns, row):
+            if pd.isna(value):
+                cells.append("")
+                continue
+            if isinstance(value, pd.Timestamp) and value == value.normalize():
+                value = value.strftime("%Y-%m-%d")  # like to_csv(): no 00:00:00
+            text = codes[col][str(value)] if col in codes else str(value)
+            cells.append(text.replace("|", "/").replace("\n", " "))
+        lines.append("|".join(cells))
+    return "\n".join(lines)
+
+
+def _omitted_summary(rest):
+    """One line about rows left out of a table: how many, numeric totals, most common values."""
+    parts = []
+    for col in rest.columns:
+        values = rest[col].dropna()
+        if values.empty:
+            continue
+        if pd.api.types.is_datetime64_any_dtype(values):
+            parts.append(f"{col} {values.min():%Y-%m-%d} to {values.max():%Y-%m-%d}")
+        elif pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+            parts.append(f"{col} total {values.sum():g}")
+        elif _is_text(values) and values.nunique() <= len(values) / 2:
+            top = values.astype(str).str.replace("\n", " ").str.slice(0, 40).value_counts().head(3)
+            parts.append(f"{col}: " + ", ".join(f"{v} ({n})" for v, n in top.items()))
+    note = f"... {len(rest)} more rows not shown"
+    return note + (f" ({'; '.join(parts)})" if parts else "")
+
+
+def _clip_to_tokens(text, max_tokens):
+    """The longest start of text that fits in max_tokens."""
+    lo, hi = 0, len(text)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if estimate_tokens(text[:mid]) <= max_tokens:
+            lo = mid
+        else:
+            hi = mid - 1
+    return text[:lo]
+
+
+def _cheapest_table(df):
+    """The compact format (csv, tsv or columns) with the fewest estimated tokens."""
+    return min((_format_table(df, f) for f in ("csv", "tsv", "columns")), key=estimate_tokens)
+
+
+def _fit_table(df, max_tokens):
+    """
+    Cheapest format; then shorter text cells; then the first rows plus a summary of the rest.
+    If not even one row fits, just the summary (or a shorter note, cut to fit): the result
+    never goes over max_tokens.
+    """
+    text = _cheapest_table(df)
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    df = _truncate_cells(df, 40)
+    text = _cheapest_table(df)
+    if estimate_tokens(text) <= max_tokens:
+        return text
+
+    # Binary search for the most leading rows that fit next to the summary line
+    best, lo, hi = _omitted_summary(df), 1, len(df) - 1
+    while lo <= hi:
+        mid = (lo + hi) // 2
+        candidate = _cheapest_table(df.head(mid)) + "\n" + _omitted_summary(df.iloc[mid:])
+        if estimate_tokens(candidate) <= max_tokens:
+            best, lo = candidate, mid + 1
+        else:
+            hi = mid - 1
+    if estimate_tokens(best) <= max_tokens:
+        return best
+    note = f"... {len(df)} rows not shown"
+    return note if estimate_tokens(note) <= max_tokens else _clip_to_tokens(note, max_tokens)
+
+
+def df_as_text(df, format="markdown", max_tokens=None, max_chars_per_cell=None):
+    """
+    Convert a pandas DataFrame to a table string for a prompt.
+
+    Markdown is easy to read but its padding can make a big table several times more
+    tokens than the same data as CSV, and every prompt token adds to prompt-eval time.
+
     Parameters:
     -----------
     df : pandas.DataFrame
         The DataFrame to convert to text
-    
+    format : str
+        "markdown" (default), "csv", "tsv", or "columns" (column list, with short
+        codes for repeated text values, then one |-separated line per row).
+        Ignored when max_tokens is set.
+    max_tokens : int, optional
+        Token budget (see estimate_tokens()). Uses the cheapest compact format; if the
+        table still doesn't fit, shortens long text cells, then keeps the first rows
+        and summarizes the rest in one line. The result never goes over the budget.
+    max_chars_per_cell : int, optional
+        Cut text values longer than this many characters
+
     Returns:
     --------
     str
-        A markdown-formatted table string
+        The table as text
     """
-    
-    # Convert DataFrame to markdown table
-    # pandas to_markdown() method creates markdown tables
-    tab = df.to_markdown(index=False)
-    return tab
+    if max_chars_per_cell:
+        df = _truncate_cells(df, max_chars_per_cell)
+    if max_tokens:
+        return _fit_table(df, max_tokens)
+    return _format_table(df, format)
+
+# 3. ASYNC AGENT FUNCTIONS ###################################
+
+# agent_run() blocks until the model answers, so running many agents needs a thread pool.
+# The async versions below use httpx.AsyncClient instead: one process can keep hundreds
+# of requests in flight, and an asyncio.Semaphore caps how many run at once.
+# These are text-only; for tool calling see 08_function_calling/functions.py.
+
+def make_async_client(max_concurrency=ASYNC_CONCURRENCY):
+    """Build an httpx.AsyncClient whose connection pool matches the concurrency limit."""
+    if httpx is None:
+        raise ImportError("The async helpers need httpx. Install it with: pip install httpx")
+    limits = httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency)
+    return httpx.AsyncClient(limits=limits, timeout=REQUEST_TIMEOUT)
+
+
+async def agent_async(messages, model=DEFAULT_MODEL, client=None):
+    """
+    Async version of agent() for plain chat (no tools).
+    Pass a shared httpx.AsyncClient as `client` to reuse connections.
+    """
+    body = {
+        "model": model,
+        "messages": messages,
+        "stream": False
+    }
+    add_keep_alive(body)
+    own_client = client is None
+    if own_client:
+        client = make_async_client()
+    try:
+        response = await client.post(CHAT_URL, json=body, timeout=REQUEST_TIMEOUT)
+        response.raise_for_status()
+        result = response.json()
+    finally:
+        if own_client:
+            await client.aclose()
+    return result["message"]["content"]
+
+
+async def agent_run_async(role, task, model=DEFAULT_MODEL, client=None):
+    """Async version of agent_run(): one system role + one user task."""
+    messages = [
+        {"role": "system", "content": role},
+        {"role": "user", "content": task}
+    ]
+    return await agent_async(messages=messages, model=model, client=client)
+
+
+async def agent_run_many(role, tasks, model=DEFAULT_MODEL, max_concurrency=ASYNC_CONCURRENCY,
+                         return_exceptions=True):
+    """
+    Run the same agent role over many tasks concurrently.
+
+    Parameters:
+    -----------
+    role : str
+        The system prompt shared by every task
+    tasks : list of str
+        One user message per agent call
+    max_concurrency : int
+        Max requests in flight at once
+    return_exceptions : bool
+        If True, a failed task puts its exception in the results list instead of
+        stopping the whole batch. If False, the first error cancels the rest and is raised.
+
+    Returns:
+    --------
+    list
+        Results in the same order as tasks.
+
+    Example:
+    --------
+    results = asyncio.run(agent_run_many(role, ["text 1", "text 2"], max_concurrency=16))
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async with make_async_client(max_concurrency) as client:
+        async def run_one(task):
+            async with semaphore:
+                return await agent_run_async(role, task, model=model, client=client)
+
+        jobs = [asyncio.create_task(run_one(task)) for task in tasks]
+        try:
+            return await asyncio.gather(*jobs, return_exceptions=return_exceptions)
+        finally:
+            # If we were cancelled (or one job failed), stop anything still running
+            for job in jobs:
+                if not job.done():
+                    job.cancel()
+
+# 4. OLLAMA CLOUD RATE LIMITING ###################################
+
+# Ollama Cloud answers HTTP 429 ("too many requests") when we send too fast.
+# A token bucket lets through at most `rate` requests per second (with small bursts),
+# and a semaphore caps how many are in flight. One limiter per host is shared by the
+# whole process. If the server still says 429 (or 5xx), we wait and retry, using
+# its Retry-After header when given, like get_with_retry() in 12_end/01_ingest_traffic.py.
+
+DEFAULT_RPS = float(os.getenv("OLLAMA_RATE_LIMIT_RPS", "2") or 0)
+DEFAULT_MAX_CONCURRENT = int(os.getenv("OLLAMA_MAX_CONCURRENT", "4") or 4)
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Only Ollama Cloud gets these caps by default; other hosts (localhost, your own
+# servers) are unlimited unless OLLAMA_RATE_LIMIT_RPS / OLLAMA_MAX_CONCURRENT are set
+# or configure_rate_limit() is called for them.
+CLOUD_HOSTS = ("ollama.com",)
+
+
+def is_cloud_host(host):
+    name = host.rsplit("@", 1)[-1].split(":")[0].lower()
+    return any(name == h or name.endswith("." + h) for h in CLOUD_HOSTS)
+
+
+def default_limits(host):
+    """(requests/second, max concurrent) for a host nobody configured; 0 = no limit."""
+    if is_cloud_host(host):
+        return DEFAULT_RPS, DEFAULT_MAX_CONCURRENT
+    return float(os.getenv("OLLAMA_RATE_LIMIT_RPS") or 0), int(os.getenv("OLLAMA_MAX_CONCURRENT") or 0)
+
+
+class RateLimiter:
+    """Token bucket (requests/second) plus a cap on concurrent requests for one host."""
+
+    def __init__(self, rate=DEFAULT_RPS, max_concurrent=DEFAULT_MAX_CONCURRENT, burst=None):
+        self.rate = float(rate or 0)  # 0 = no requests/second limit
+        self.capacity = float(burst or max(1.0, self.rate))
+        self.tokens = self.capacity
+        self.max_concurrent = int(max_concurrent or 0)  # 0 = no cap on requests in flight
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_concurrent) if self.max_concurrent > 0 else None
+        self.acquired = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def acquire(self):
+        """Wait until a slot and a token are free. Returns the seconds we waited."""
+        t0 = time.monotonic()
+        if self._slots is not None:
+            self._slots.acquire()
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self._blocked_until:
+                    sleep_for = self._blocked_until - now
+                elif self.rate <= 0:
+                    break
+                else:
+                    # Refill tokens for the time that passed, up to the bucket size
+                    self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+                    self._updated = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        break
+                    sleep_for = (1 - self.tokens) / self.rate
+            time.sleep(sleep_for)
+        waited = time.monotonic() - t0
+        with self._lock:
+            self.acquired += 1
+            self.total_wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+        return waited
+
+    def release(self):
+        if self._slots is not None:
+            self._slots.release()
+
+    def pause(self, seconds):
+        """Hold every caller for this host (e.g. after a Retry-After header)."""
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + max(0.0, seconds))
+
+    def stats(self):
+        with self._lock:
+            return {
+                "rate_per_second": self.rate,
+                "max_concurrent": self.max_concurrent,
+                "acquired": self.acquired,
+                "total_wait_seconds": self.total_wait_seconds,
+                "mean_wait_seconds": self.total_wait_seconds / self.acquired if self.acquired else 0.0,
+                "max_wait_seconds": self.max_wait_seconds,
+            }
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def configure_rate_limit(host, rate=None, max_concurrent=None, burst=None):
+    """Set limits for one host, e.g. configure_rate_limit("ollama.com", rate=1, max_concurrent=2)."""
+    host = urlsplit(host).netloc or host
+    limiter = RateLimiter(
+        rate=default_limits(host)[0] if rate is None else rate,
+        max_concurrent=default_limits(host)[1] if max_concurrent is None else max_concurrent,
+        burst=burst,
+    )
+    with _limiters_lock:
+        _limiters[host] = limiter
+    return limiter
+
+
+def get_rate_limiter(url):
+    """Process-wide limiter for the host in url (created with default_limits() on first use)."""
+    host = urlsplit(url).netloc or url
+    with _limiters_lock:
+        if host not in _limiters:
+            _limiters[host] = RateLimiter(*default_limits(host))
+        return _limiters[host]
+
+
+def rate_limit_stats():
+    """How long callers waited in each host's limiter."""
+    with _limiters_lock:
+        items = list(_limiters.items())
+    return {host: limiter.stats() for host, limiter in items}
+
+
+def parse_retry_after(value):
+    """Retry-After is either seconds or an HTTP date; return seconds to wait (or None)."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def send_with_backoff(send, url, max_attempts=5, base_delay=1.0, max_delay=30.0):
+    """
+    Call send() (a function that makes one HTTP request) through the host's rate limiter.
+    On 429/5xx, retry after Retry-After seconds (pausing the whole host) or after a
+    jittered exponential backoff. Returns the last response.
+
+    Example:
+    --------
+    response = send_with_backoff(lambda: requests.post(url, json=body, headers=headers), url)
+    """
+    limiter = get_rate_limiter(url)
+    for attempt in range(1, max_attempts + 1):
+        limiter.acquire()
+        try:
+            response = send()
+        finally:
+            limiter.release()
+        if response.status_code not in RETRY_STATUSES or attempt >= max_attempts:
+            return response
+        retry_after = parse_retry_after(response.headers.get("Retry-After"))
+        if retry_after is not None:
+            limiter.pause(retry_after)
+            delay = retry_after
+        else:
+            cap = min(max_delay, base_delay * 2 ** (attempt - 1))
+            delay = cap / 2 + random.uniform(0, cap / 2)  # jitter spreads retries out
+        time.sleep(delay)
+    return response
+
+
+# 5. MODEL WARM-UP ###################################
+
+# The first request to a model waits for Ollama to load it into memory, which can take
+# several seconds. Ollama also unloads idle models after keep_alive (default 5 minutes),
+# and every request resets that timer to its own keep_alive value.
+# warm_up() loads each model ahead of time with an empty request and remembers its
+# keep_alive, so later chat calls keep the model loaded too.
+#
+# warm_up(["smollm2:1.7b", "llama3.2"], keep_alive="30m")
+# warm_up({"smollm2:1.7b": "1h", "llava": "10m"})   # keep_alive per model
+
+KEEP_ALIVE = {}  # model -> keep_alive sent with every chat call for that model
+
+
+def add_keep_alive(body):
+    """Add the model's keep_alive (set by warm_up()) to a request body."""
+    if body.get("model") in KEEP_ALIVE:
+        body["keep_alive"] = KEEP_ALIVE[body["model"]]
+    return body
+
+
+def wait_for_ollama(host=OLLAMA_HOST, max_wait_seconds=30, poll_interval_seconds=0.5):
+    """Poll /api/tags until the server answers (e.g. right after `ollama serve` starts)."""
+    deadline = time.time() + max_wait_seconds
+    while True:
+        try:
+            requests.get(f"{host}/api/tags", timeout=2).raise_for_status()
+            return
+        except requests.RequestException:
+            if time.time() >= deadline:
+                raise RuntimeError(f"Ollama is not responding at {host} after {max_wait_seconds}s.")
+            time.sleep(poll_interval_seconds)
+
+
+def warm_up(models, keep_alive="30m", host=OLLAMA_HOST, max_wait_seconds=30, verbose=True):
+    """
+    Load models into memory before the first real request.
+
+    Parameters:
+    -----------
+    models : list or dict
+        Model names, or {model: keep_alive} to set keep_alive per model
+    keep_alive : str or int
+        How long Ollama keeps each model loaded when idle, e.g. "30m", "1h", 3600, or -1 (forever)
+    host : str
+        Ollama server, e.g. "http://localhost:11434"
+    max_wait_seconds : int
+        How long to wait for the server to start answering
+
+    Returns:
+    --------
+    list of dict
+        One row per model: model, keep_alive, ok, load_seconds (Ollama's model load time),
+        total_seconds (wall time for the warm-up request), and error
+    """
+    plan = models if isinstance(models, dict) else {m: keep_alive for m in models}
+    wait_for_ollama(host, max_wait_seconds=max_wait_seconds)
+    report = []
+    for model, ka in plan.items():
+        row = {"model": model, "keep_alive": ka, "ok": False, "load_seconds": None,
+               "total_seconds": None, "error": None}
+        t0 = time.perf_counter()
+        try:
+            # An empty prompt just loads the model; embedding models only answer /api/embed
+            response = requests.post(f"{host}/api/generate", json={"model": model, "keep_alive": ka},
+                                     timeout=REQUEST_TIMEOUT)
+            if response.status_code == 400:
+                response = requests.post(f"{host}/api/embed",
+                                         json={"model": model, "input": "", "keep_alive": ka},
+                                         timeout=REQUEST_TIMEOUT)
+            response.raise_for_status()
+            data = response.json()
+            row["ok"] = True
+            row["load_seconds"] = data.get("load_duration", 0) / 1e9
+            KEEP_ALIVE[model] = ka
+        except requests.RequestException as e:
+            row["error"] = str(e)
+        row["total_seconds"] = time.perf_counter() - t0
+        if verbose:
+            if row["ok"]:
+                print(f"🔥 {model}: loaded in {row['load_seconds']:.2f}s "
+                      f"({row['total_seconds']:.2f}s total), keep_alive={ka}")
+            else:
+                print(f"⚠️ {model}: warm-up failed ({row['error']})")
+        report.append(row)
+    return report
@@ -7,13 +7,22 @@
 # python 08_function_calling/01_ollama.py
 
 # This script configures environment variables for Ollama,
-# then starts `ollama serve` in the background without blocking
+# then makes sure `ollama serve` is running in the background without blocking
 # the Python session. Useful for starting a local LLM server
 # from within Python notebooks or scripts.
 
+# Other scripts run this file with runpy.run_path("01_ollama.py"), often many times
+# in one session. So instead of starting a new server and sleeping every time, it:
+# 1. checks whether a server already answers on PORT, and if so, uses it (~1 ms)
+# 2. otherwise starts `ollama serve` and polls it until it answers,
+#    waiting a little longer between each check, up to START_TIMEOUT seconds
+# 3. only ever stops a server that it started itself
+
+import atexit
 import os
 import subprocess
 import time
+import urllib.request
 
 # 0. Setup #################################
 
@@ -22,27 +31,113 @@ import time
 PORT = 11434  # Match 01_ollama.sh
 OLLAMA_HOST = f"0.0.0.0:{PORT}"
 OLLAMA_CONTEXT_LENGTH = 32000
+START_TIMEOUT = 30  # seconds to wait for a new server to answer
+
+# Optional throughput settings, used only when this script starts the server.
+# None keeps Ollama's defaults (or whatever is already set in your environment).
+OLLAMA_NUM_PARALLEL = None       # e.g. 4: answer up to 4 requests per model at once
+OLLAMA_MAX_LOADED_MODELS = None  # e.g. 2: keep 2 models in memory, no swapping between them
 
 # Set environment variables for this process and any child processes
 os.environ["OLLAMA_HOST"] = OLLAMA_HOST
 os.environ["OLLAMA_CONTEXT_LENGTH"] = str(OLLAMA_CONTEXT_LENGTH)
+for name, value in (("OLLAMA_NUM_PARALLEL", OLLAMA_NUM_PARALLEL),
+                    ("OLLAMA_MAX_LOADED_MODELS", OLLAMA_MAX_LOADED_MODELS)):
+    if value is not None:
+        os.environ[name] = str(value)
+
+## 0.2 Server Manager #######################
+
+def ollama_is_up(url, timeout=0.5):
+    """True if an Ollama server answers GET /api/version at url."""
+    try:
+        with urllib.request.urlopen(f"{url}/api/version", timeout=timeout) as response:
+            return response.status == 200
+    except OSError:
+        return False
+
+
+class OllamaServer:
+    """
+    Start `ollama serve` only if nothing is listening on the port yet.
+
+    server = OllamaServer(PORT).start()
+    server.started    # True if this object launched the server
+    server.stop()     # stops it only if started is True
+    """
+
+    def __init__(self, port=PORT, start_timeout=START_TIMEOUT):
+        self.url = f"http://localhost:{port}"
+        self.start_timeout = start_timeout
+        self.process = None
+
+    @property
+    def started(self):
+        return self.process is not None
+
+    def start(self):
+        if ollama_is_up(self.url):
+            return self
+        try:
+            # stdout/stderr are redirected to DEVNULL so the console is not flooded.
+            self.process = subprocess.Popen(
+                ["ollama", "serve"],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+        except FileNotFoundError:
+            raise RuntimeError("Could not find `ollama` on your PATH. Install it from https://ollama.com/download")
+        self.wait_until_ready()
+        return self
+
+    def wait_until_ready(self):
+        """Poll the server, doubling the wait between checks (50 ms up to 1 s), until START_TIMEOUT."""
+        deadline = time.monotonic() + self.start_timeout
+        delay = 0.05
+        while not ollama_is_up(self.url):
+            if self.process is not None and self.process.poll() is not None:
+                code = self.process.returncode
+                self.process = None
+                raise RuntimeError(f"`ollama serve` exited with code {code} before answering at {self.url}.")
+            if time.monotonic() >= deadline:
+                self.stop()
+                raise RuntimeError(f"Ollama did not answer at {self.url} within {self.start_timeout}s.")
+            time.sleep(min(delay, max(deadline - time.monotonic(), 0)))
+            delay = min(delay * 2, 1.0)
+
+    def stop(self):
+        if self.process is None:
+            return
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+        self.process = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
 
-## 0.2 Start Ollama Server #######################
+## 0.3 Start Ollama Server #######################
 
-# Start `ollama serve` in the background.
-# stdout/stderr are redirected to DEVNULL so the console is not flooded.
-process = subprocess.Popen(
-    ["ollama", "serve"],
-    stdout=subprocess.DEVNULL,
-    stderr=subprocess.DEVNULL,
-)
+t0 = time.perf_counter()
+server = OllamaServer(PORT).start()
+process = server.process  # None if a server was already running
 
-# Give the server a moment to start listening before use
-time.sleep(1)
+if server.started:
+    print(f"🚀 Started ollama serve at {server.url} in {time.perf_counter() - t0:.2f}s")
+    if os.getenv("OLLAMA_STOP_ON_EXIT") == "1":
+        # Set OLLAMA_STOP_ON_EXIT=1 to stop the server when this Python session ends
+        atexit.register(server.stop)
+elif OLLAMA_NUM_PARALLEL is not None or OLLAMA_MAX_LOADED_MODELS is not None:
+    print(f"Ollama was already running at {server.url}; restart it to apply "
+          f"OLLAMA_NUM_PARALLEL / OLLAMA_MAX_LOADED_MODELS.")
 
-# Optional: you can keep a reference to `process` if you want to stop it later
-# For example:
-# process.terminate()  # or process.kill()
+# Optional: stop the server later (does nothing if it was already running before this script)
+# server.stop()
 
 # On Windows, from a separate shell you can also stop it with:
-#   taskkill /F /IM ollama.exe
\ No newline at end of file
+#   taskkill /F /IM ollama.exe
@@ -20,7 +20,7 @@ import pandas as pd  # for data manipulation
 ## 0.2 Load Functions #################################
 
 # Load helper functions for agent orchestration
-from functions import agent
+from functions import agent, ToolRegistry
 
 ## 0.3 Configuration #################################
 
@@ -113,6 +113,12 @@ tool_get_table = {
     }
 }
 
+# Register each function with its metadata, so agent() can look tools up by name
+# (instead of searching this script's globals)
+registry = ToolRegistry()
+registry.register(add_two_numbers, metadata=tool_add_two_numbers)
+registry.register(get_table, metadata=tool_get_table)
+
 # 3. EXAMPLE 1: STANDARD CHAT (NO TOOLS) ###################################
 
 # Trying to call a standard chat without tools
@@ -133,7 +139,7 @@ messages = [
     {"role": "user", "content": "Add 3 + 5."}
 ]
 
-resp = agent(messages=messages, model=MODEL, output="tools", tools=[tool_add_two_numbers])
+resp = agent(messages=messages, model=MODEL, output="tools", tools=[tool_add_two_numbers], registry=registry)
 print("Tool Call #1 Result:")
 print(resp)
 print()
@@ -160,7 +166,7 @@ messages = [
     }
 ]
 
-resp2 = agent(messages=messages, model=MODEL, output="tools", tools=[tool_get_table])
+resp2 = agent(messages=messages, model=MODEL, output="tools", tools=[tool_get_table], registry=registry)
 print("Tool Call #2 Result:")
 print(resp2)
 print()
@@ -171,4 +177,10 @@ manual_table = df.to_markdown(index=False)
 print(manual_table)
 print()
 
+# The registry counts and times every tool call
+print("Tool Call Stats:")
+for name, st in registry.stats().items():
+    print(f"  {name}: {st['calls']} call(s), {st['errors']} error(s), mean {st['mean_seconds'] * 1000:.1f}ms")
+print()
+
 # Note: We can use the agent() function to rapidly build and test out agents with or without tools.
@@ -21,7 +21,7 @@ from datetime import datetime  # for date parsing
 ## 0.2 Load Functions #################################
 
 # Load helper functions for agent orchestration
-from functions import agent_run, df_as_text
+from functions import agent_run, df_as_text, ToolRegistry
 
 ## 0.3 Configuration #################################
 
@@ -130,6 +130,10 @@ tool_get_shortages = {
     }
 }
 
+# Register the tool so agent_run() can look it up by name
+registry = ToolRegistry()
+registry.register(get_shortages, metadata=tool_get_shortages)
+
 # 3. MULTI-AGENT WORKFLOW ###################################
 
 # Let's create an agentic workflow with function calling.
@@ -138,7 +142,10 @@ tool_get_shortages = {
 # This agent uses the get_shortages tool to fetch data from the API
 task = "Get data on drug shortages for the category Psychiatry with limit 10"
 role1 = "I fetch information from the FDA Drug Shortages API"
-result1_calls = agent_run(role=role1, task=task, model=MODEL, output="tools", tools=[tool_get_shortages])
+# parallel_tools=True: if the model asks for several categories at once, fetch them
+# side by side (each gives up after 60 seconds) instead of one after another.
+result1_calls = agent_run(role=role1, task=task, model=MODEL, output="tools", tools=[tool_get_shortages],
+                          parallel_tools=True, tool_timeout=60, registry=registry)
 
 # When output="tools", agent_run() returns a list of tool_calls.
 # The actual tool output is stored at tool_call["output"].
@@ -25,7 +25,7 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 ## 0.3 Load Functions #################################
 
-from functions import agent_run, df_as_text
+from functions import agent_run, df_as_text, ToolRegistry
 
 ## 0.4 Configuration #################################
 
@@ -112,6 +112,10 @@ tool_get_earthquake = {
     },
 }
 
+# Register the tool so agent_run() can look it up by name
+registry = ToolRegistry()
+registry.register(get_earthquake, metadata=tool_get_earthquake)
+
 # 3. MULTI-AGENT WORKFLOW ###################################
 
 # Agent 1: Earthquake Data Fetcher (with tools) -------------------------
@@ -127,7 +131,7 @@ result1_calls = agent_run(
     model=MODEL,
     output="tools",
     tools=[tool_get_earthquake],
-    func_map={"get_earthquake": get_earthquake},   # explicit map so the function resolves correctly
+    registry=registry,   # explicit registry so the function resolves correctly
 )
 
 # Extract the DataFrame returned by the tool call
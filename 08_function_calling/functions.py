@@ -10,49 +10,577 @@
 ## 0.1 Load Packages #################################
 
 import requests  # for HTTP requests
+from requests.adapters import HTTPAdapter  # for connection pooling
 import json      # for working with JSON
+import re        # for estimating token counts
 import pandas as pd  # for data manipulation
 import sys       # for stack frame inspection
+import inspect   # for reading tool function signatures
+from functools import partial  # for binding tool arguments
+import asyncio   # for async (concurrent) agent calls
+import threading # for guarding shared counters
 import time      # for simple polling/retry
+import collections  # for the telemetry ring buffer
+import math      # for percentiles
+import contextvars  # for labeling telemetry by pipeline stage
+import sqlite3   # for the optional telemetry file
+import os        # for environment settings
+from contextlib import contextmanager  # for routing requests to a host
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as ToolTimeout  # for running tool calls side by side
+
+try:
+    import httpx  # async HTTP client, only needed for the *_async helpers
+except ImportError:
+    httpx = None
 
 # If you haven't already, install these packages...
-# pip install requests pandas
+# pip install requests pandas httpx
 
 ## 0.2 Configuration #################################
 
 # Default model and Ollama connection
 DEFAULT_MODEL = "smollm2:1.7b"
 PORT = 11434
-OLLAMA_HOST = f"http://localhost:{PORT}"
+
+
+def normalize_ollama_host(value, default_port=PORT):
+    """
+    Turn an OLLAMA_HOST setting into a URL we can send requests to.
+    "0.0.0.0:11434" (the address `ollama serve` listens on) -> "http://localhost:11434",
+    "mybox" -> "http://mybox:11434", "https://ollama.com" stays as it is.
+    """
+    value = (value or "").strip().rstrip("/")
+    if not value:
+        return None
+    if "://" not in value:
+        value = "http://" + value
+        if ":" not in value.split("://", 1)[1]:
+            value += f":{default_port}"
+    for wildcard in ("0.0.0.0", "[::]"):
+        value = value.replace(f"://{wildcard}", "://localhost")
+    return value
+
+
+# OLLAMA_HOST lets you point these helpers at another server (or benchmarks/mock_ollama.py)
+OLLAMA_HOST = normalize_ollama_host(os.getenv("OLLAMA_HOST")) or f"http://localhost:{PORT}"
 CHAT_URL = f"{OLLAMA_HOST}/api/chat"
 REQUEST_TIMEOUT = 300  # seconds; avoid hanging indefinitely on network/model issues
 OLLAMA_TAGS_URL = f"{OLLAMA_HOST}/api/tags"
+POOL_SIZE = 10  # max open connections kept alive per host
+OLLAMA_READY_TTL = 60  # seconds to trust a successful readiness probe
+ASYNC_CONCURRENCY = 8  # default max requests in flight for agent_run_many()
+TOOL_WORKERS = 8  # max tool calls run at once when parallel_tools=True
+
+## 0.3 Pooled HTTP Session #################################
+
+# A bare requests.post() opens a new TCP connection (plus a TLS handshake for https hosts)
+# on every call. A shared requests.Session keeps connections open and reuses them,
+# so repeated agent turns skip the connection setup.
 
+def make_session(pool_size=POOL_SIZE):
+    """
+    Build a requests.Session with a keep-alive connection pool.
 
-def ensure_ollama_available(max_wait_seconds: int = 15, poll_interval_seconds: float = 0.5) -> None:
+    pool_size sets how many connections are kept open per host;
+    match it to the number of threads that call agent() at once.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update({"Connection": "keep-alive"})
+    return session
+
+
+# Module-level session shared by agent(), agent_run() and ensure_ollama_available()
+SESSION = make_session()
+
+
+def configure_session(pool_size=None, timeout=None):
+    """
+    Rebuild the shared session (e.g. with a bigger pool) and/or change the request timeout.
+    Returns the new session.
+    """
+    global SESSION, REQUEST_TIMEOUT
+    if timeout is not None:
+        REQUEST_TIMEOUT = timeout
+    if pool_size is not None:
+        SESSION.close()
+        SESSION = make_session(pool_size=pool_size)
+    return SESSION
+
+
+## 0.4 Readiness Cache #################################
+
+# Probing /api/tags before every chat doubles the number of HTTP round trips.
+# Instead, one successful probe marks the server healthy for OLLAMA_READY_TTL seconds.
+# A connection error from a real chat call clears the mark, so the next call probes again.
+
+_ready_lock = threading.Lock()
+_ready_until = 0.0  # time.monotonic() value until which the server counts as healthy
+PROBE_STATS = {
+    "probes": 0,             # /api/tags requests sent
+    "cache_hits": 0,         # calls that skipped the probe
+    "invalidations": 0,      # times a chat connection error cleared the cache
+    "last_probe_seconds": None,   # latency of the last successful probe
+    "total_probe_seconds": 0.0,   # summed latency of successful probes
+}
+
+
+def invalidate_ollama_ready():
+    """Forget the cached readiness result so the next call probes /api/tags again."""
+    global _ready_until
+    with _ready_lock:
+        _ready_until = 0.0
+        PROBE_STATS["invalidations"] += 1
+
+
+def ollama_probe_stats():
+    """Return a copy of the readiness probe counters and latencies."""
+    with _ready_lock:
+        return dict(PROBE_STATS)
+
+
+def ensure_ollama_available(max_wait_seconds: int = 15, poll_interval_seconds: float = 0.5, ttl=None) -> None:
     """
     Fail fast with a helpful message if Ollama isn't reachable.
+    A successful probe is cached for `ttl` seconds (default OLLAMA_READY_TTL); use ttl=0 to always probe.
     """
+    global _ready_until
+    ttl = OLLAMA_READY_TTL if ttl is None else ttl
+    with _ready_lock:
+        if ttl > 0 and time.monotonic() < _ready_until:
+            PROBE_STATS["cache_hits"] += 1
+            return
+
     deadline = time.time() + max_wait_seconds
     last_err = None
     while time.time() < deadline:
+        t0 = time.perf_counter()
         try:
-            r = requests.get(OLLAMA_TAGS_URL, timeout=5)
+            with _ready_lock:
+                PROBE_STATS["probes"] += 1
+            r = SESSION.get(OLLAMA_TAGS_URL, timeout=5)
             if r.ok:
+                elapsed = time.perf_counter() - t0
+                with _ready_lock:
+                    PROBE_STATS["last_probe_seconds"] = elapsed
+                    PROBE_STATS["total_probe_seconds"] += elapsed
+                    _ready_until = time.monotonic() + ttl
                 return
         except Exception as e:
             last_err = e
         time.sleep(poll_interval_seconds)
 
     raise RuntimeError(
-        "Ollama is not reachable at localhost:11434. "
+        f"Ollama is not reachable at {OLLAMA_HOST}. "
         "Start it first with: `python 08_function_calling/01_ollama.py`.\n"
         f"Last error: {last_err}"
     )
 
+
+## 0.5 Multiple Ollama Hosts #################################
+
+# With several Ollama machines, we can spread chat calls across all of them.
+# Each call goes to the healthy host with the fewest requests in flight
+# ("least outstanding requests"). A host that fails 3 times in a row is skipped
+# for 30 seconds, and hosts whose /api/tags lacks the model are skipped.
+# Turn it on with configure_endpoints([...]) or OLLAMA_HOSTS="http://a:11434,http://b:11434".
+
+def split_hosts(value):
+    """'http://a:11434, http://b:11434' -> ['http://a:11434', 'http://b:11434']."""
+    return [h.strip().rstrip("/") for h in (value or "").split(",") if h.strip()]
+
+
+def _model_key(name):
+    """Ollama treats 'llama3.2' and 'llama3.2:latest' as the same model."""
+    n = (name or "").strip()
+    return n if ":" in n else f"{n}:latest"
+
+
+def is_endpoint_failure(exc):
+    """Connection errors, timeouts and 5xx count against a host; 4xx (bad request) does not."""
+    # GeneratorExit (a caller stopped reading a stream early), KeyboardInterrupt and
+    # SystemExit pass through route() too, but say nothing about the host's health
+    if not isinstance(exc, Exception):
+        return False
+    response = getattr(exc, "response", None)
+    status = getattr(response, "status_code", None)
+    if status is None:
+        return True
+    return status >= 500
+
+
+class Endpoint:
+    def __init__(self, host):
+        self.host = host
+        self.outstanding = 0
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.models = None  # set of model names; None = not fetched yet / unknown
+        self.models_fetched_at = 0.0
+
+
+class EndpointPool:
+    """
+    Route each request to the healthy host with the fewest requests in flight.
+
+    - Passive health: after `eject_after` consecutive failures a host is skipped for `eject_seconds`.
+    - Model awareness: `fetch_models(host)` (e.g. GET /api/tags) is cached for `models_ttl` seconds;
+      hosts known not to have the model are skipped while any other host has it.
+    """
+
+    def __init__(self, hosts, fetch_models=None, eject_after=3, eject_seconds=30.0, models_ttl=60.0):
+        if not hosts:
+            raise ValueError("EndpointPool needs at least one host.")
+        self.endpoints = [Endpoint(h.rstrip("/")) for h in hosts]
+        self.fetch_models = fetch_models
+        self.eject_after = int(eject_after)
+        self.eject_seconds = float(eject_seconds)
+        self.models_ttl = float(models_ttl)
+        self._lock = threading.Lock()
+        self._rr = 0  # round-robin tie breaker
+
+    def _refresh_models(self, ep):
+        if self.fetch_models is None or time.monotonic() - ep.models_fetched_at < self.models_ttl:
+            return
+        ep.models_fetched_at = time.monotonic()
+        try:
+            ep.models = {_model_key(m) for m in self.fetch_models(ep.host)}
+        except Exception:  # an unreachable host is handled by passive ejection
+            ep.models = None
+
+    def _pick(self, model):
+        now = time.monotonic()
+        if model:
+            for ep in self.endpoints:
+                self._refresh_models(ep)
+        with self._lock:
+            healthy = [ep for ep in self.endpoints if ep.ejected_until <= now]
+            if not healthy:
+                # Everyone is ejected: try the host that comes back soonest rather than failing outright
+                healthy = [min(self.endpoints, key=lambda e: e.ejected_until)]
+            if model:
+                key = _model_key(model)
+                serving = [ep for ep in healthy if ep.models is None or key in ep.models]
+                healthy = serving or healthy
+            low = min(ep.outstanding for ep in healthy)
+            ties = [ep for ep in healthy if ep.outstanding == low]
+            ep = ties[self._rr % len(ties)]
+            self._rr += 1
+            ep.outstanding += 1
+            ep.requests += 1
+            return ep
+
+    def _done(self, ep, ok):
+        with self._lock:
+            ep.outstanding -= 1
+            if ok:
+                ep.consecutive_failures = 0
+                return
+            ep.failures += 1
+            ep.consecutive_failures += 1
+            if ep.consecutive_failures >= self.eject_after:
+                ep.ejected_until = time.monotonic() + self.eject_seconds
+                ep.consecutive_failures = 0
+
+    @contextmanager
+    def route(self, model=None):
+        """with pool.route(model) as host: ... — host is released (and health recorded) on exit."""
+        ep = self._pick(model)
+        try:
+            yield ep.host
+        except BaseException as exc:
+            self._done(ep, ok=not is_endpoint_failure(exc))
+            raise
+        else:
+            self._done(ep, ok=True)
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            return [
+                {
+                    "host": ep.host,
+                    "outstanding": ep.outstanding,
+                    "requests": ep.requests,
+                    "failures": ep.failures,
+                    "ejected": ep.ejected_until > now,
+                    "models": sorted(ep.models) if ep.models is not None else None,
+                }
+                for ep in self.endpoints
+            ]
+
+
+ENDPOINT_POOL = None  # None = send everything to OLLAMA_HOST
+
+
+def fetch_host_models(host):
+    """List the model names a host has pulled (GET /api/tags)."""
+    r = SESSION.get(host + "/api/tags", timeout=5)
+    r.raise_for_status()
+    return [m.get("name", "") for m in r.json().get("models", [])]
+
+
+def configure_endpoints(hosts):
+    """
+    Spread chat calls over several hosts, e.g. configure_endpoints(["http://a:11434", "http://b:11434"]).
+    Pass None (or []) to go back to the single OLLAMA_HOST. Returns the pool.
+    """
+    global ENDPOINT_POOL
+    ENDPOINT_POOL = EndpointPool(hosts, fetch_models=fetch_host_models) if hosts else None
+    return ENDPOINT_POOL
+
+
+@contextmanager
+def chat_url_for(model):
+    """Yield the /api/chat URL for one request: CHAT_URL, or the best host in ENDPOINT_POOL."""
+    if ENDPOINT_POOL is None:
+        yield CHAT_URL
+    else:
+        with ENDPOINT_POOL.route(model) as host:
+            yield host + "/api/chat"
+
+
+if os.getenv("OLLAMA_HOSTS"):
+    configure_endpoints(split_hosts(os.getenv("OLLAMA_HOSTS")))
+
+
+def post_chat(body):
+    """
+    POST one /api/chat request through the shared session and return the parsed JSON.
+    Connection errors clear the readiness cache before being re-raised.
+    """
+    if ENDPOINT_POOL is None:
+        ensure_ollama_available()
+    with chat_url_for(body["model"]) as url:
+        t0 = time.perf_counter()
+        try:
+            response = SESSION.post(url, json=body, timeout=REQUEST_TIMEOUT)
+        except requests.ConnectionError:
+            invalidate_ollama_ready()
+            raise
+        response.raise_for_status()
+        result = response.json()
+        record_telemetry(result, time.perf_counter() - t0, model=body["model"], host=url)
+        return result
+
 # 1. AGENT FUNCTION ###################################
 
-def agent(messages, model=DEFAULT_MODEL, output="text", tools=None, all=False, func_map=None):
+def chat_body(messages, model=DEFAULT_MODEL, tools=None):
+    """Build the /api/chat request body shared by agent() and agent_async()."""
+    body = {
+        "model": model,
+        "messages": messages,
+        "stream": False,
+        # Token cap makes runtime more predictable for students' machines.
+        "options": {"num_predict": 500},
+    }
+    if tools is not None:
+        body["tools"] = tools
+    return add_keep_alive(body)
+
+
+def run_tool_calls(result, func_map=None, parallel=False, tool_timeout=None, registry=None):
+    """
+    Execute every tool call in an /api/chat result and store each output at tool_call["output"].
+    Returns the list of tool calls, or None if the model did not call any tools.
+
+    parallel=True runs the calls at the same time on a thread pool, so a turn with several
+    slow API fetches takes as long as the slowest one instead of the sum of all of them.
+    Results keep the model's order. Each call is isolated: if it raises, or runs longer than
+    tool_timeout seconds, its output is None and the reason is stored at tool_call["error"].
+    The timeout is per call and starts when that call starts running, so calls waiting for
+    a free worker (more calls than TOOL_WORKERS) still get their full tool_timeout.
+    A timed-out call is not stopped (Python threads can't be killed): it keeps running in
+    the background, and since the pool's threads are not daemon threads, Python won't exit
+    until it returns. Give slow tools their own timeout (e.g. requests' timeout=) as well.
+
+    registry (a ToolRegistry) is checked first: its tools are found by name directly,
+    their arguments are validated, and their calls are counted and timed.
+    """
+    if "tool_calls" not in result.get("message", {}):
+        return None
+    tool_calls = result["message"]["tool_calls"]
+    jobs = []  # (tool_call, zero-argument callable)
+    for tool_call in tool_calls:
+        # Execute the tool function
+        # Note: Tool functions must be defined in the global scope
+        func_name = tool_call["function"]["name"]
+        raw_args = tool_call["function"].get("arguments", {})
+        # Ollama may return tool arguments either as a JSON string or as an already-parsed dict.
+        # Keep behavior consistent with the R examples (where arguments are already structured).
+        func_args = json.loads(raw_args) if isinstance(raw_args, str) else raw_args
+        
+        # A registry knows its tools by name, so no searching is needed
+        if registry is not None and func_name in registry:
+            jobs.append((tool_call, partial(registry.call, func_name, func_args)))
+            continue
+
+        # Get the function: check func_map first, then module globals, then caller stack.
+        # func_map lets callers pass tool functions defined outside this module explicitly,
+        # which is more reliable than stack-frame inspection on some platforms.
+        # (Lookup happens here, on the caller's thread, even when parallel=True.)
+        func = (func_map or {}).get(func_name) or globals().get(func_name)
+        if func is None:
+            # Start at depth 2 to skip this helper and agent() itself
+            for depth in range(2, 7):  # reasonable small bound for examples
+                try:
+                    frame = sys._getframe(depth)
+                    func = frame.f_globals.get(func_name)
+                    if func is not None:
+                        break
+                except ValueError:
+                    break
+        if func:
+            jobs.append((tool_call, partial(func, **func_args)))
+
+    if not parallel:
+        for tool_call, job in jobs:
+            tool_call["output"] = job()
+        return tool_calls
+
+    # Parallel: start every call now, then collect them in order
+    workers = max(1, min(TOOL_WORKERS, len(jobs)))
+    pool = ThreadPoolExecutor(max_workers=workers)
+    started = [None] * len(jobs)  # when each call started running (time.monotonic())
+    timed_out = []  # futures we stopped waiting for
+
+    def run(i, job):
+        started[i] = time.monotonic()
+        return job()
+
+    def result(i, future):
+        # Wait for a queued call to start; its timeout only counts from then
+        while started[i] is None:
+            # A timed-out call keeps its worker busy; if every worker is stuck, this one never starts
+            if sum(not f.done() for f in timed_out) >= workers and future.cancel():
+                raise RuntimeError("not started: every tool worker is busy with a timed-out call")
+            try:
+                return future.result(timeout=0.05)
+            except ToolTimeout:
+                pass
+        return future.result(timeout=max(0.0, started[i] + tool_timeout - time.monotonic()))
+
+    try:
+        futures = [pool.submit(run, i, job) for i, (_, job) in enumerate(jobs)]
+        for i, ((tool_call, _), future) in enumerate(zip(jobs, futures)):
+            try:
+                tool_call["output"] = future.result() if tool_timeout is None else result(i, future)
+            except ToolTimeout:
+                timed_out.append(future)
+                tool_call["output"] = None
+                tool_call["error"] = f"timed out after {tool_timeout}s"
+            except Exception as e:
+                tool_call["output"] = None
+                tool_call["error"] = f"{type(e).__name__}: {e}"
+    finally:
+        # Don't wait for tools that timed out; their threads finish in the background
+        # (and the interpreter still joins them at exit)
+        pool.shutdown(wait=False, cancel_futures=True)
+    return tool_calls
+
+
+def format_agent_output(result, tool_calls, output="text", all=False):
+    """Pick what agent() returns: the full result, the tool calls, or the final text."""
+    if all:
+        return result
+    # When output="tools", return the tool_calls list with outputs
+    # When output="text", return the last tool call output or message content
+    if tool_calls is not None:
+        if output == "tools":
+            return tool_calls
+        return tool_calls[-1].get("output", result["message"]["content"])
+    return result["message"]["content"]
+
+
+# Streaming: with "stream": True, Ollama sends one JSON object per line (NDJSON) as tokens
+# are generated. Reading them as they arrive lets us show text early and measure
+# time-to-first-token (TTFT), the wait before the model starts answering.
+
+LAST_STREAM_STATS = {}  # stats from the most recent streamed call
+
+
+def agent_stream(messages, model=DEFAULT_MODEL, tools=None, stats=None):
+    """
+    Stream one chat call, yielding text pieces (deltas) as they arrive.
+
+    When the stream ends, `stats` (and LAST_STREAM_STATS) hold:
+    ttft_seconds, total_seconds, eval_count, tokens_per_second, and
+    result (the assembled response, shaped like a non-streaming /api/chat result).
+    """
+    global LAST_STREAM_STATS
+    stats = {} if stats is None else stats
+    body = chat_body(messages, model=model, tools=tools)
+    body["stream"] = True
+
+    if ENDPOINT_POOL is None:
+        ensure_ollama_available()
+    t0 = time.perf_counter()
+    ttft = None
+    parts = []
+    tool_calls = []
+    final = {}
+    with chat_url_for(model) as url:
+        try:
+            response = SESSION.post(url, json=body, timeout=REQUEST_TIMEOUT, stream=True)
+        except requests.ConnectionError:
+            invalidate_ollama_ready()
+            raise
+        with response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                msg = chunk.get("message") or {}
+                # Tool calls arrive whole inside a chunk; collect them across the stream
+                tool_calls.extend(msg.get("tool_calls") or [])
+                delta = msg.get("content") or ""
+                if delta:
+                    if ttft is None:
+                        ttft = time.perf_counter() - t0
+                    parts.append(delta)
+                    yield delta
+                if chunk.get("done"):
+                    final = chunk
+                    break
+    total = time.perf_counter() - t0
+    record_telemetry(final, total, model=model, host=url)
+
+    # Prefer Ollama's own token count and timing; fall back to counting chunks
+    eval_count = final.get("eval_count") or len(parts)
+    eval_seconds = (final.get("eval_duration") or 0) / 1e9
+    if eval_seconds <= 0:
+        eval_seconds = total - (ttft or 0)
+    message = {"role": "assistant", "content": "".join(parts)}
+    if tool_calls:
+        message["tool_calls"] = tool_calls
+    result = {k: v for k, v in final.items() if k != "message"}
+    result["message"] = message
+    stats.update({
+        "ttft_seconds": ttft,
+        "total_seconds": total,
+        "eval_count": eval_count,
+        "tokens_per_second": eval_count / eval_seconds if eval_seconds > 0 else None,
+        "result": result,
+    })
+    LAST_STREAM_STATS = stats
+
+
+def stream_chat(messages, model=DEFAULT_MODEL, tools=None, on_token=None):
+    """Run agent_stream() to the end, passing each delta to on_token. Returns the assembled result."""
+    stats = {}
+    for delta in agent_stream(messages, model=model, tools=tools, stats=stats):
+        if on_token is not None:
+            on_token(delta)
+    return stats["result"]
+
+
+def agent(messages, model=DEFAULT_MODEL, output="text", tools=None, all=False, func_map=None,
+          stream=False, on_token=None, parallel_tools=False, tool_timeout=None, registry=None):
     """
     Agent wrapper function that runs a single agent, with or without tools.
     
@@ -69,6 +597,20 @@ def agent(messages, model=DEFAULT_MODEL, output="text", tools=None, all=False, f
         List of tool metadata dictionaries for function calling
     all : bool
         If True, return all responses. If False, return only the last response.
+    stream : bool
+        If True, read the reply token by token (see agent_stream()).
+        Timing stats are saved in LAST_STREAM_STATS.
+    on_token : callable, optional
+        Called with each text piece while streaming, e.g. lambda t: print(t, end="")
+    parallel_tools : bool
+        If True and the model asks for several tools, run them at the same time.
+        A failing tool then sets tool_call["error"] instead of stopping the agent.
+    tool_timeout : float, optional
+        With parallel_tools=True, give up on tools still running after this many seconds.
+        The tool itself keeps running, and Python waits for it at exit (see run_tool_calls()).
+    registry : ToolRegistry, optional
+        Tools to call by name (see section 4). If tools is None, every tool in the
+        registry is offered to the model.
     
     Returns:
     --------
@@ -76,80 +618,26 @@ def agent(messages, model=DEFAULT_MODEL, output="text", tools=None, all=False, f
         The agent's response(s)
     """
     
-    # If the agent has NO tools, perform a standard chat
+    if tools is None and registry is not None:
+        tools = registry.schemas()
+    
+    if stream:
+        result = stream_chat(messages, model=model, tools=tools, on_token=on_token)
+    else:
+        result = post_chat(chat_body(messages, model=model, tools=tools))
+    
+    # If the agent has NO tools, return the chat text
     if tools is None:
-        ensure_ollama_available()
-        body = {
-            "model": model,
-            "messages": messages,
-            "stream": False,
-            # Token cap makes runtime more predictable for students' machines.
-            "options": {"num_predict": 500},
-        }
-        
-        response = requests.post(CHAT_URL, json=body, timeout=REQUEST_TIMEOUT)
-        response.raise_for_status()
-        result = response.json()
-        
         return result["message"]["content"]
-    else:
-        # If the agent has tools, perform a tool call
-        ensure_ollama_available()
-        body = {
-            "model": model,
-            "messages": messages,
-            "tools": tools,
-            "stream": False,
-            "options": {"num_predict": 500},
-        }
-        
-        response = requests.post(CHAT_URL, json=body, timeout=REQUEST_TIMEOUT)
-        response.raise_for_status()
-        result = response.json()
-        
-        # For any given tool call, execute the tool call
-        if "tool_calls" in result.get("message", {}):
-            tool_calls = result["message"]["tool_calls"]
-            for tool_call in tool_calls:
-                # Execute the tool function
-                # Note: Tool functions must be defined in the global scope
-                func_name = tool_call["function"]["name"]
-                raw_args = tool_call["function"].get("arguments", {})
-                # Ollama may return tool arguments either as a JSON string or as an already-parsed dict.
-                # Keep behavior consistent with the R examples (where arguments are already structured).
-                func_args = json.loads(raw_args) if isinstance(raw_args, str) else raw_args
-                
-                # Get the function: check func_map first, then module globals, then caller stack.
-                # func_map lets callers pass tool functions defined outside this module explicitly,
-                # which is more reliable than stack-frame inspection on some platforms.
-                func = (func_map or {}).get(func_name) or globals().get(func_name)
-                if func is None:
-                    for depth in range(1, 6):  # reasonable small bound for examples
-                        try:
-                            frame = sys._getframe(depth)
-                            func = frame.f_globals.get(func_name)
-                            if func is not None:
-                                break
-                        except ValueError:
-                            break
-                if func:
-                    tool_output = func(**func_args)
-                    tool_call["output"] = tool_output
-        
-        if all:
-            return result
-        else:
-            # When output="tools", return the tool_calls list with outputs
-            # When output="text", return the last tool call output or message content
-            if "tool_calls" in result.get("message", {}):
-                if output == "tools":
-                    return tool_calls
-                else:
-                    return tool_calls[-1].get("output", result["message"]["content"])
-            return result["message"]["content"]
+    
+    # If the agent has tools, execute any tool calls the model asked for
+    tool_calls = run_tool_calls(result, func_map=func_map, parallel=parallel_tools,
+                                tool_timeout=tool_timeout, registry=registry)
+    return format_agent_output(result, tool_calls, output=output, all=all)
 
 
-def agent_run(role, task, tools=None, output="text", model=DEFAULT_MODEL, func_map=None):
+def agent_run(role, task, tools=None, output="text", model=DEFAULT_MODEL, func_map=None,
+              stream=False, on_token=None, parallel_tools=False, tool_timeout=None, registry=None):
     """
     Run an agent with a specific role and task.
     
@@ -168,6 +656,12 @@ def agent_run(role, task, tools=None, output="text", model=DEFAULT_MODEL, func_m
     func_map : dict, optional
         Mapping of function name -> callable for tool resolution.
         Use this to pass tool functions defined outside functions.py.
+    stream, on_token :
+        Stream the reply token by token; see agent().
+    parallel_tools, tool_timeout :
+        Run several tool calls at once; see agent().
+    registry : ToolRegistry, optional
+        Tools to call by name; see agent().
 
     Returns:
     --------
@@ -182,28 +676,734 @@ def agent_run(role, task, tools=None, output="text", model=DEFAULT_MODEL, func_m
     ]
 
     # Run the agent
-    resp = agent(messages=messages, model=model, output=output, tools=tools, func_map=func_map)
+    resp = agent(messages=messages, model=model, output=output, tools=tools, func_map=func_map,
+                 stream=stream, on_token=on_token, parallel_tools=parallel_tools,
+                 tool_timeout=tool_timeout, registry=registry)
     return resp
 
 
 # 2. DATA CONVERSION FUNCTION ###################################
 
-def df_as_text(df):
+TABLE_FORMATS = ("markdown", "csv", "tsv", "columns")
+
+
+def estimate_tokens(text):
     """
-    Convert a pandas DataFrame to a markdown table string.
-    
+    Rough token count for a prompt, without loading a tokenizer.
+
+    About one token per 4 letters, per 3 digits, per 2 punctuation marks and per 4 spaces
+    of padding (a single space between words is free). Good for comparing table formats;
+    Ollama's prompt_eval_count gives the real number.
+    """
+    n = 0
+    for piece in re.findall(r"[^\W\d_]+|\d+|\s+|[^\w\s]+|_+", str(text)):
+        if piece[0].isspace():
+            n += 0 if piece == " " else -(-len(piece) // 4)
+        elif piece[0].isdigit():
+            n += -(-len(piece) // 3)
+        elif piece[0].isalpha():
+            n += -(-len(piece) // 4)
+        else:
+            n += -(-len(piece) // 2)
+    return n
+
+
+def _is_text(series):
+    """True for text columns (object dtype, or pandas' string dtype)."""
+    return series.dtype == object or pd.api.types.is_string_dtype(series)
+
+
+def _truncate_cells(df, max_chars):
+    """Cut text values longer than max_chars, ending them with '…'."""
+    def cut(value):
+        if isinstance(value, str) and len(value) > max_chars:
+            return value[: max_chars - 1].rstrip() + "…"
+        return value
+    return df.apply(lambda col: col.map(cut) if _is_text(col) else col)
+
+
+def _format_table(df, format="markdown"):
+    """Serialize a DataFrame in one of TABLE_FORMATS."""
+    if format == "markdown":
+        return df.to_markdown(index=False)
+    if format in ("csv", "tsv"):
+        return df.to_csv(index=False, sep="\t" if format == "tsv" else ",").strip()
+    if format != "columns":
+        raise ValueError(f"Unknown table format {format!r}; use one of {TABLE_FORMATS}.")
+
+    # List the columns once. Text columns with a few values repeated over many rows
+    # (status, type...) get short codes, so rows don't repeat the same long words.
+    lines = ["Columns (row values in this order, separated by |):"]
+    codes = {}
+    for col in df.columns:
+        values = df[col].dropna().astype(str)
+        distinct = list(values.unique())
+        if _is_text(df[col]) and 0 < len(distinct) <= 26 and len(distinct) <= len(values) / 2:
+            codes[col] = {v: chr(ord("A") + i) for i, v in enumerate(distinct)}
+            legend = ", ".join(f"{c}={v}" for v, c in codes[col].items())
+            lines.append(f"- {col}: " + legend.replace("\n", " "))
+        else:
+            lines.append(f"- {col}")
+    lines.append("Rows:")
+    for row in df.itertuples(index=False):
+        cells = []
+        for col, value in zip(df.columns, row):
+            if pd.isna(value):
+                cells.append("")
+                continue
+            if isinstance(value, pd.Timestamp) and value == value.normalize():
+                value = value.strftime("%Y-%m-%d")  # like to_csv(): no 00:00:00
+            text = codes[col][str(value)] if col in codes else str(value)
+            cells.append(text.replace("|", "/").replace("\n", " "))
+        lines.append("|".join(cells))
+    return "\n".join(lines)
+
+
+def _omitted_summary(rest):
+    """One line about rows left out of a table: how many, numeric totals, most common values."""
+    parts = []
+    for col in rest.columns:
+        values = rest[col].dropna()
+        if values.empty:
+            continue
+        if pd.api.types.is_datetime64_any_dtype(values):
+            parts.append(f"{col} {values.min():%Y-%m-%d} to {values.max():%Y-%m-%d}")
+        elif pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+            parts.append(f"{col} total {values.sum():g}")
+        elif _is_text(values) and values.nunique() <= len(values) / 2:
+            top = values.astype(str).str.replace("\n", " ").str.slice(0, 40).value_counts().head(3)
+            parts.append(f"{col}: " + ", ".join(f"{v} ({n})" for v, n in top.items()))
+    note = f"... {len(rest)} more rows not shown"
+    return note + (f" ({'; '.join(parts)})" if parts else "")
+
+
+def _clip_to_tokens(text, max_tokens):
+    """The longest start of text that fits in max_tokens."""
+    lo, hi = 0, len(text)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if estimate_tokens(text[:mid]) <= max_tokens:
+            lo = mid
+        else:
+            hi = mid - 1
+    return text[:lo]
+
+
+def _cheapest_table(df):
+    """The compact format (csv, tsv or columns) with the fewest estimated tokens."""
+    return min((_format_table(df, f) for f in ("csv", "tsv", "columns")), key=estimate_tokens)
+
+
+def _fit_table(df, max_tokens):
+    """
+    Cheapest format; then shorter text cells; then the first rows plus a summary of the rest.
+    If not even one row fits, just the summary (or a shorter note, cut to fit): the result
+    never goes over max_tokens.
+    """
+    text = _cheapest_table(df)
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    df = _truncate_cells(df, 40)
+    text = _cheapest_table(df)
+    if estimate_tokens(text) <= max_tokens:
+        return text
+
+    # Binary search for the most leading rows that fit next to the summary line
+    best, lo, hi = _omitted_summary(df), 1, len(df) - 1
+    while lo <= hi:
+        mid = (lo + hi) // 2
+        candidate = _cheapest_table(df.head(mid)) + "\n" + _omitted_summary(df.iloc[mid:])
+        if estimate_tokens(candidate) <= max_tokens:
+            best, lo = candidate, mid + 1
+        else:
+            hi = mid - 1
+    if estimate_tokens(best) <= max_tokens:
+        return best
+    note = f"... {len(df)} rows not shown"
+    return note if estimate_tokens(note) <= max_tokens else _clip_to_tokens(note, max_tokens)
+
+
+def df_as_text(df, format="markdown", max_tokens=None, max_chars_per_cell=None):
+    """
+    Convert a pandas DataFrame to a table string for a prompt.
+
+    Markdown is easy to read but its padding can make a big table several times more
+    tokens than the same data as CSV, and every prompt token adds to prompt-eval time.
+
     Parameters:
     -----------
     df : pandas.DataFrame
         The DataFrame to convert to text
-    
+    format : str
+        "markdown" (default), "csv", "tsv", or "columns" (column list, with short
+        codes for repeated text values, then one |-separated line per row).
+        Ignored when max_tokens is set.
+    max_tokens : int, optional
+        Token budget (see estimate_tokens()). Uses the cheapest compact format; if the
+        table still doesn't fit, shortens long text cells, then keeps the first rows
+        and summarizes the rest in one line. The result never goes over the budget.
+    max_chars_per_cell : int, optional
+        Cut text values longer than this many characters
+
     Returns:
     --------
     str
-        A markdown-formatted table string
+        The table as text
     """
-    
-    # Convert DataFrame to markdown table
-    # pandas to_markdown() method creates markdown tables
-    tab = df.to_markdown(index=False)
-    return tab
+    if max_chars_per_cell:
+        df = _truncate_cells(df, max_chars_per_cell)
+    if max_tokens:
+        return _fit_table(df, max_tokens)
+    return _format_table(df, format)
+
+
+# 3. ASYNC AGENT FUNCTIONS ###################################
+
+# agent_run() blocks until the model answers, so running many agents needs a thread pool.
+# The async versions below use httpx.AsyncClient instead: one process can keep hundreds
+# of requests in flight, and an asyncio.Semaphore caps how many run at once.
+# Tool functions run in a worker thread, so pass them with func_map (stack lookup can't see them).
+
+def make_async_client(max_concurrency=ASYNC_CONCURRENCY):
+    """Build an httpx.AsyncClient whose connection pool matches the concurrency limit."""
+    if httpx is None:
+        raise ImportError("The async helpers need httpx. Install it with: pip install httpx")
+    limits = httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency)
+    return httpx.AsyncClient(limits=limits, timeout=REQUEST_TIMEOUT)
+
+
+async def agent_async(messages, model=DEFAULT_MODEL, output="text", tools=None, all=False,
+                      func_map=None, client=None, registry=None):
+    """
+    Async version of agent(). Same parameters and return value, plus:
+
+    client : httpx.AsyncClient, optional
+        Shared client to reuse connections. If None, a temporary client is created.
+
+    Tools run on a worker thread, where caller-stack lookup can't see your script,
+    so pass func_map or registry for tool calls.
+    """
+    if tools is None and registry is not None:
+        tools = registry.schemas()
+    own_client = client is None
+    if own_client:
+        client = make_async_client()
+    try:
+        # Readiness check is cached, so this is usually instant
+        if ENDPOINT_POOL is None:
+            await asyncio.to_thread(ensure_ollama_available)
+        body = chat_body(messages, model=model, tools=tools)
+        with chat_url_for(model) as url:
+            t0 = time.perf_counter()
+            try:
+                response = await client.post(url, json=body, timeout=REQUEST_TIMEOUT)
+            except httpx.ConnectError:
+                invalidate_ollama_ready()
+                raise
+            response.raise_for_status()
+            result = response.json()
+            record_telemetry(result, time.perf_counter() - t0, model=model, host=url)
+    finally:
+        if own_client:
+            await client.aclose()
+
+    if tools is None:
+        return result["message"]["content"]
+    # Tools are ordinary (blocking) functions, so run them off the event loop
+    tool_calls = await asyncio.to_thread(run_tool_calls, result, func_map, registry=registry)
+    return format_agent_output(result, tool_calls, output=output, all=all)
+
+
+async def agent_run_async(role, task, tools=None, output="text", model=DEFAULT_MODEL,
+                          func_map=None, client=None, registry=None):
+    """Async version of agent_run(): one system role + one user task."""
+    messages = [
+        {"role": "system", "content": role},
+        {"role": "user", "content": task}
+    ]
+    return await agent_async(messages=messages, model=model, output=output, tools=tools,
+                             func_map=func_map, client=client, registry=registry)
+
+
+async def agent_run_many(role, tasks, tools=None, output="text", model=DEFAULT_MODEL,
+                         func_map=None, max_concurrency=ASYNC_CONCURRENCY, return_exceptions=True,
+                         registry=None):
+    """
+    Run the same agent role over many tasks concurrently.
+
+    Parameters:
+    -----------
+    role : str
+        The system prompt shared by every task
+    tasks : list of str
+        One user message per agent call
+    max_concurrency : int
+        Max requests in flight at once
+    return_exceptions : bool
+        If True, a failed task puts its exception in the results list instead of
+        stopping the whole batch. If False, the first error cancels the rest and is raised.
+
+    Returns:
+    --------
+    list
+        Results in the same order as tasks.
+
+    Example:
+    --------
+    results = asyncio.run(agent_run_many(role, ["text 1", "text 2"], max_concurrency=16))
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async with make_async_client(max_concurrency) as client:
+        async def run_one(task):
+            async with semaphore:
+                return await agent_run_async(role, task, tools=tools, output=output, model=model,
+                                             func_map=func_map, client=client, registry=registry)
+
+        jobs = [asyncio.create_task(run_one(task)) for task in tasks]
+        try:
+            return await asyncio.gather(*jobs, return_exceptions=return_exceptions)
+        finally:
+            # If we were cancelled (or one job failed), stop anything still running
+            for job in jobs:
+                if not job.done():
+                    job.cancel()
+
+
+# 4. TOOL REGISTRY ###################################
+
+# A ToolRegistry holds tool functions by name, so agent() can find them directly
+# instead of searching globals and the caller's stack. That lookup is fast, and it
+# works from worker threads and from tools defined in other modules.
+#
+# registry = ToolRegistry()
+#
+# @registry.tool
+# def add_two_numbers(x: float, y: float):
+#     """Add two numbers together."""
+#     return x + y
+#
+# agent(messages, registry=registry)
+
+# Python type -> JSON schema type, for building tool metadata from a signature
+JSON_TYPES = {int: "integer", float: "number", bool: "boolean", str: "string",
+              list: "array", tuple: "array", dict: "object"}
+
+# Upper edges (seconds) of the latency histogram buckets kept for each tool
+LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 5, 30, float("inf"))
+
+
+class ToolArgumentError(ValueError):
+    """The model called a tool with missing, unknown, or badly typed arguments."""
+
+
+def _param_docs(doc):
+    """Read 'name : type' + indented description pairs from a numpy-style Parameters section."""
+    docs = {}
+    name = None
+    for line in inspect.cleandoc(doc or "").splitlines():
+        if not line.strip():
+            continue
+        if not line.startswith(" ") and " : " in line:
+            name = line.split(" : ")[0].strip()
+            docs[name] = ""
+        elif line.startswith(" ") and name:
+            docs[name] = (docs[name] + " " + line.strip()).strip()
+        elif not line.startswith(" "):
+            name = None
+    return docs
+
+
+def tool_schema(func, name=None, description=None):
+    """
+    Build Ollama tool metadata from a function's signature and docstring.
+
+    Types come from annotations (or the type of the default value); parameters
+    without a default are required; descriptions come from the docstring.
+    """
+    doc = inspect.getdoc(func) or ""
+    summary = doc.split("\n\n")[0].replace("\n", " ").strip()
+    param_docs = _param_docs(doc)
+    properties, required = {}, []
+    for p in inspect.signature(func).parameters.values():
+        if p.kind in (p.VAR_POSITIONAL, p.VAR_KEYWORD):
+            continue
+        kind = p.annotation if p.annotation is not p.empty else type(p.default)
+        prop = {"type": JSON_TYPES.get(kind, "string")}
+        if p.default is p.empty:
+            required.append(p.name)
+        if param_docs.get(p.name):
+            prop["description"] = param_docs[p.name]
+        properties[p.name] = prop
+    return {
+        "type": "function",
+        "function": {
+            "name": name or func.__name__,
+            "description": description or summary or func.__name__,
+            "parameters": {"type": "object", "required": required, "properties": properties},
+        },
+    }
+
+
+def check_tool_args(schema, args):
+    """
+    Validate (and lightly fix up) tool-call arguments against tool metadata.
+    Small models often send numbers as strings, so "5" becomes 5 for a number field.
+    Raises ToolArgumentError if something is missing, unknown, or the wrong type.
+    """
+    params = schema["function"].get("parameters", {})
+    properties = params.get("properties", {})
+    name = schema["function"]["name"]
+    args = dict(args or {})
+    missing = [k for k in params.get("required", []) if k not in args]
+    if missing:
+        raise ToolArgumentError(f"{name}() is missing arguments: {', '.join(missing)}")
+    unknown = [k for k in args if k not in properties]
+    if unknown:
+        raise ToolArgumentError(f"{name}() got unknown arguments: {', '.join(unknown)}")
+    for key, value in args.items():
+        kind = properties[key].get("type")
+        try:
+            if kind == "integer" and not isinstance(value, bool):
+                number = float(value)
+                if not number.is_integer():
+                    raise ValueError
+                args[key] = int(number)
+            elif kind == "number" and not isinstance(value, bool):
+                args[key] = float(value) if isinstance(value, str) else value
+                if not isinstance(args[key], (int, float)):
+                    raise ValueError
+            elif kind == "boolean" and isinstance(value, str):
+                if value.lower() not in ("true", "false"):
+                    raise ValueError
+                args[key] = value.lower() == "true"
+        except (TypeError, ValueError):
+            raise ToolArgumentError(f"{name}(): {key}={value!r} is not a valid {kind}") from None
+    return args
+
+
+class ToolRegistry:
+    """Tool functions by name, with their metadata and per-tool call counts and latency."""
+
+    def __init__(self):
+        self._funcs = {}
+        self._schemas = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def register(self, func, metadata=None, name=None, description=None):
+        """
+        Add a tool. Pass metadata to use hand-written tool metadata; otherwise it is
+        built once from the function's signature and docstring. Returns func.
+        """
+        schema = metadata or tool_schema(func, name=name, description=description)
+        key = schema["function"]["name"]
+        with self._lock:
+            self._funcs[key] = func
+            self._schemas[key] = schema
+            self._stats[key] = {"calls": 0, "errors": 0, "total_seconds": 0.0, "max_seconds": 0.0,
+                                "histogram": [0] * len(LATENCY_BUCKETS)}
+        return func
+
+    def tool(self, func=None, *, name=None, description=None):
+        """Decorator: @registry.tool or @registry.tool(description="...")."""
+        if func is None:
+            return lambda f: self.register(f, name=name, description=description)
+        return self.register(func)
+
+    def __contains__(self, name):
+        return name in self._funcs
+
+    def __len__(self):
+        return len(self._funcs)
+
+    def schema(self, name):
+        """Tool metadata for one tool."""
+        return self._schemas[name]
+
+    def schemas(self, names=None):
+        """Tool metadata list for agent(tools=...): every tool, or just the given names."""
+        return [self._schemas[n] for n in (names or self._schemas)]
+
+    def call(self, name, args=None):
+        """Validate the arguments, run the tool, and record its latency."""
+        if name not in self._funcs:
+            raise KeyError(f"No tool named {name!r} in this registry.")
+        t0 = time.perf_counter()
+        ok = False
+        try:
+            result = self._funcs[name](**check_tool_args(self._schemas[name], args))
+            ok = True
+            return result
+        finally:
+            self._record(name, time.perf_counter() - t0, ok)
+
+    def _record(self, name, seconds, ok):
+        with self._lock:
+            st = self._stats[name]
+            st["calls"] += 1
+            st["errors"] += 0 if ok else 1
+            st["total_seconds"] += seconds
+            st["max_seconds"] = max(st["max_seconds"], seconds)
+            for i, edge in enumerate(LATENCY_BUCKETS):
+                if seconds <= edge:
+                    st["histogram"][i] += 1
+                    break
+
+    def stats(self):
+        """Per-tool calls, errors, mean/max seconds and a latency histogram ({"<=0.1s": n, ...})."""
+        labels = [f"<={edge:g}s" for edge in LATENCY_BUCKETS[:-1]] + [f">{LATENCY_BUCKETS[-2]:g}s"]
+        with self._lock:
+            return {
+                name: {
+                    "calls": st["calls"],
+                    "errors": st["errors"],
+                    "mean_seconds": st["total_seconds"] / st["calls"] if st["calls"] else 0.0,
+                    "max_seconds": st["max_seconds"],
+                    "histogram": dict(zip(labels, st["histogram"])),
+                }
+                for name, st in self._stats.items()
+            }
+
+
+# 5. MODEL WARM-UP ###################################
+
+# The first request to a model waits for Ollama to load it into memory, which can take
+# several seconds. Ollama also unloads idle models after keep_alive (default 5 minutes),
+# and every request resets that timer to its own keep_alive value.
+# warm_up() loads each model ahead of time with an empty request and remembers its
+# keep_alive, so later chat calls keep the model loaded too.
+#
+# warm_up(["smollm2:1.7b", "llama3.2"], keep_alive="30m")
+# warm_up({"smollm2:1.7b": "1h", "llava": "10m"})   # keep_alive per model
+
+KEEP_ALIVE = {}  # model -> keep_alive sent with every chat call for that model
+
+
+def add_keep_alive(body):
+    """Add the model's keep_alive (set by warm_up()) to a request body."""
+    if body.get("model") in KEEP_ALIVE:
+        body["keep_alive"] = KEEP_ALIVE[body["model"]]
+    return body
+
+
+def wait_for_ollama(host=OLLAMA_HOST, max_wait_seconds=30, poll_interval_seconds=0.5):
+    """Poll /api/tags until the server answers (e.g. right after `ollama serve` starts)."""
+    deadline = time.time() + max_wait_seconds
+    while True:
+        try:
+            SESSION.get(f"{host}/api/tags", timeout=2).raise_for_status()
+            return
+        except requests.RequestException:
+            if time.time() >= deadline:
+                raise RuntimeError(f"Ollama is not responding at {host} after {max_wait_seconds}s.")
+            time.sleep(poll_interval_seconds)
+
+
+def warm_up(models, keep_alive="30m", host=OLLAMA_HOST, max_wait_seconds=30, verbose=True):
+    """
+    Load models into memory before the first real request.
+
+    Parameters:
+    -----------
+    models : list or dict
+        Model names, or {model: keep_alive} to set keep_alive per model
+    keep_alive : str or int
+        How long Ollama keeps each model loaded when idle, e.g. "30m", "1h", 3600, or -1 (forever)
+    host : str
+        Ollama server, e.g. "http://localhost:11434"
+    max_wait_seconds : int
+        How long to wait for the server to start answering
+
+    Returns:
+    --------
+    list of dict
+        One row per model: model, keep_alive, ok, load_seconds (Ollama's model load time),
+        total_seconds (wall time for the warm-up request), and error
+    """
+    plan = models if isinstance(models, dict) else {m: keep_alive for m in models}
+    wait_for_ollama(host, max_wait_seconds=max_wait_seconds)
+    report = []
+    for model, ka in plan.items():
+        row = {"model": model, "keep_alive": ka, "ok": False, "load_seconds": None,
+               "total_seconds": None, "error": None}
+        t0 = time.perf_counter()
+        try:
+            # An empty prompt just loads the model; embedding models only answer /api/embed
+            response = SESSION.post(f"{host}/api/generate", json={"model": model, "keep_alive": ka},
+                                    timeout=REQUEST_TIMEOUT)
+            if response.status_code == 400:
+                response = SESSION.post(f"{host}/api/embed",
+                                        json={"model": model, "input": "", "keep_alive": ka},
+                                        timeout=REQUEST_TIMEOUT)
+            response.raise_for_status()
+            data = response.json()
+            row["ok"] = True
+            row["load_seconds"] = data.get("load_duration", 0) / 1e9
+            KEEP_ALIVE[model] = ka
+        except requests.RequestException as e:
+            row["error"] = str(e)
+        row["total_seconds"] = time.perf_counter() - t0
+        if verbose:
+            if row["ok"]:
+                print(f"🔥 {model}: loaded in {row['load_seconds']:.2f}s "
+                      f"({row['total_seconds']:.2f}s total), keep_alive={ka}")
+            else:
+                print(f"⚠️ {model}: warm-up failed ({row['error']})")
+        report.append(row)
+    return report
+
+
+# 6. CALL TELEMETRY ###################################
+
+# Ollama reports how each call spent its time: load_duration (loading the model),
+# prompt_eval_count/_duration (reading the prompt) and eval_count/_duration
+# (writing the reply), all in nanoseconds. We keep those, plus the wall time we
+# measured on our side, for the last TELEMETRY_MAXLEN calls, so we can see where
+# a pipeline's time goes.
+#
+# with telemetry_stage("summarize"):
+#     agent_run(role, task)
+# print_telemetry_summary()
+#
+# Set OLLAMA_TELEMETRY_JSONL and/or OLLAMA_TELEMETRY_SQLITE to a file path to
+# also save every record to disk.
+
+TELEMETRY_MAXLEN = int(os.getenv("OLLAMA_TELEMETRY_MAXLEN", "1000"))
+TELEMETRY_COLUMNS = ("ts", "stage", "model", "host", "wall_seconds", "server_seconds", "load_seconds",
+                     "prompt_tokens", "prompt_seconds", "output_tokens", "output_seconds",
+                     "tokens_per_second")
+
+_stage = contextvars.ContextVar("telemetry_stage", default=None)
+
+
+def _percentile(values, q):
+    """Nearest-rank percentile (q in 0-100) of a list of numbers."""
+    values = sorted(v for v in values if v is not None)
+    if not values:
+        return None
+    k = min(len(values), max(1, math.ceil(q / 100 * len(values))))
+    return values[k - 1]
+
+
+class Telemetry:
+    """Ring buffer of per-call records, with optional JSONL / SQLite files."""
+
+    def __init__(self, maxlen=TELEMETRY_MAXLEN, jsonl_path=None, sqlite_path=None):
+        self.buffer = collections.deque(maxlen=maxlen)
+        self.jsonl_path = jsonl_path
+        self.sqlite_path = sqlite_path
+        self._lock = threading.Lock()
+        self._db = None
+        if sqlite_path:
+            self._db = sqlite3.connect(sqlite_path, check_same_thread=False)
+            columns = ", ".join(TELEMETRY_COLUMNS)
+            self._db.execute(f"CREATE TABLE IF NOT EXISTS telemetry ({columns})")
+            self._db.commit()
+
+    def record(self, result, wall_seconds, model=None, host=None, stage=None):
+        """Save one /api/chat result (or final stream chunk). Returns the record."""
+        def seconds(key):
+            return result[key] / 1e9 if result.get(key) is not None else None
+
+        output_tokens = result.get("eval_count")
+        output_seconds = seconds("eval_duration")
+        row = {
+            "ts": time.time(),
+            "stage": stage if stage is not None else _stage.get(),
+            "model": model or result.get("model"),
+            "host": host,
+            "wall_seconds": wall_seconds,
+            "server_seconds": seconds("total_duration"),
+            "load_seconds": seconds("load_duration"),
+            "prompt_tokens": result.get("prompt_eval_count"),
+            "prompt_seconds": seconds("prompt_eval_duration"),
+            "output_tokens": output_tokens,
+            "output_seconds": output_seconds,
+            "tokens_per_second": output_tokens / output_seconds if output_tokens and output_seconds else None,
+        }
+        with self._lock:
+            self.buffer.append(row)
+            if self.jsonl_path:
+                with open(self.jsonl_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(row) + "\n")
+            if self._db is not None:
+                marks = ", ".join("?" for _ in TELEMETRY_COLUMNS)
+                self._db.execute(f"INSERT INTO telemetry VALUES ({marks})",
+                                 [row[c] for c in TELEMETRY_COLUMNS])
+                self._db.commit()
+        return row
+
+    def records(self):
+        with self._lock:
+            return list(self.buffer)
+
+    def clear(self):
+        with self._lock:
+            self.buffer.clear()
+
+    def summary(self, by="stage"):
+        """
+        Group records (by "stage", "model", "host", or None for everything) and report
+        calls, p50/p95 wall time, tokens/second, prompt/output tokens and model load time.
+        """
+        groups = {}
+        for row in self.records():
+            groups.setdefault(row.get(by) if by else "all", []).append(row)
+        out = {}
+        for key, rows in groups.items():
+            wall = [r["wall_seconds"] for r in rows]
+            prompt = [r["prompt_tokens"] or 0 for r in rows]
+            out_tokens = sum(r["output_tokens"] or 0 for r in rows)
+            out_seconds = sum(r["output_seconds"] or 0 for r in rows)
+            out[key] = {
+                "calls": len(rows),
+                "wall_seconds": sum(wall),
+                "p50_seconds": _percentile(wall, 50),
+                "p95_seconds": _percentile(wall, 95),
+                "tokens_per_second": out_tokens / out_seconds if out_seconds else None,
+                "prompt_tokens": sum(prompt),
+                "mean_prompt_tokens": sum(prompt) / len(rows),
+                "output_tokens": out_tokens,
+                "load_seconds": sum(r["load_seconds"] or 0 for r in rows),
+            }
+        return out
+
+
+TELEMETRY = Telemetry(jsonl_path=os.getenv("OLLAMA_TELEMETRY_JSONL") or None,
+                      sqlite_path=os.getenv("OLLAMA_TELEMETRY_SQLITE") or None)
+
+
+def configure_telemetry(maxlen=TELEMETRY_MAXLEN, jsonl_path=None, sqlite_path=None):
+    """Start a fresh telemetry buffer, optionally also writing to JSONL and/or SQLite files."""
+    global TELEMETRY
+    TELEMETRY = Telemetry(maxlen=maxlen, jsonl_path=jsonl_path, sqlite_path=sqlite_path)
+    return TELEMETRY
+
+
+@contextmanager
+def telemetry_stage(name):
+    """Label every call made inside this block, e.g. with telemetry_stage("retrieve"): ..."""
+    token = _stage.set(name)
+    try:
+        yield
+    finally:
+        _stage.reset(token)
+
+
+def record_telemetry(result, wall_seconds, model=None, host=None):
+    """Record one call in TELEMETRY (used by post_chat(), agent_stream() and agent_async())."""
+    return TELEMETRY.record(result, wall_seconds, model=model, host=host)
+
+
+def telemetry_summary(by="stage"):
+    return TELEMETRY.summary(by=by)
+
+
+def print_telemetry_summary(by="stage"):
+    """Print one line per group: where did the time go?"""
+    for key, s in telemetry_summary(by=by).items():
+        tps = f"{s['tokens_per_second']:.1f} tok/s" if s["tokens_per_second"] else "n/a tok/s"
+        print(f"📊 {key}: {s['calls']} calls, {s['wall_seconds']:.2f}s total, "
+              f"p50 {s['p50_seconds']:.2f}s, p95 {s['p95_seconds']:.2f}s, {tps}, "
+              f"{s['mean_prompt_tokens']:.0f} prompt tokens/call, {s['load_seconds']:.2f}s loading")
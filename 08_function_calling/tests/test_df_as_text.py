@@ -0,0 +1,47 @@
+# Offline tests for df_as_text(max_tokens=...) (no Ollama / no network)
+# Checks the identical copies in 06_agents, 07_rag and 08_function_calling
+# Run: python 08_function_calling/tests/test_df_as_text.py
+
+from __future__ import annotations
+
+import importlib.util
+from pathlib import Path
+
+import pandas as pd
+
+repo_root = Path(__file__).resolve().parents[2]
+COPIES = ["06_agents", "07_rag", "08_function_calling"]
+
+
+def load(folder: str):
+    spec = importlib.util.spec_from_file_location(f"functions_{folder}", repo_root / folder / "functions.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def main() -> None:
+    # Wide frame: not even one row plus the summary line fits a small budget
+    wide = pd.DataFrame({f"column_with_a_long_name_{i}": [f"value {i} " * 20] * 50 for i in range(40)})
+    small = pd.DataFrame({"a": [1, 2], "b": ["x", "y"]})
+
+    for folder in COPIES:
+        f = load(folder)
+
+        print(f"test_df_as_text [{folder}]: tiny budget on a wide frame ...")
+        for budget in (1, 3, 5, 10, 50, 200, 2000):
+            text = f.df_as_text(wide, max_tokens=budget)
+            assert f.estimate_tokens(text) <= budget, (budget, f.estimate_tokens(text), text[:80])
+        assert f.df_as_text(wide, max_tokens=10) == "... 50 rows not shown"
+        print("   OK")
+
+        print(f"test_df_as_text [{folder}]: a table that fits is unchanged ...")
+        text = f.df_as_text(small, max_tokens=1000)
+        assert "rows not shown" not in text and "x" in text and "y" in text
+        print("   OK")
+
+    print("test_df_as_text: all passed")
+
+
+if __name__ == "__main__":
+    main()
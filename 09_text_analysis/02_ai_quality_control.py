@@ -28,7 +28,28 @@ AI_PROVIDER = "ollama"  # Change to "openai" if using OpenAI
 
 # Ollama configuration
 PORT = 11434
-OLLAMA_HOST = f"http://localhost:{PORT}"
+
+
+def normalize_ollama_host(value, default_port=PORT):
+    """
+    Turn an OLLAMA_HOST setting into a URL we can send requests to.
+    "0.0.0.0:11434" (the address `ollama serve` listens on) -> "http://localhost:11434",
+    "mybox" -> "http://mybox:11434", "https://ollama.com" stays as it is.
+    """
+    value = (value or "").strip().rstrip("/")
+    if not value:
+        return None
+    if "://" not in value:
+        value = "http://" + value
+        if ":" not in value.split("://", 1)[1]:
+            value += f":{default_port}"
+    for wildcard in ("0.0.0.0", "[::]"):
+        value = value.replace(f"://{wildcard}", "://localhost")
+    return value
+
+
+# Set OLLAMA_HOST to use another server; "0.0.0.0:11434" (what `ollama serve` binds to) means this machine
+OLLAMA_HOST = normalize_ollama_host(os.getenv("OLLAMA_HOST")) or f"http://localhost:{PORT}"
 OLLAMA_MODEL = "llama3.2:latest"  # Use a model that supports JSON output
 
 # OpenAI configuration
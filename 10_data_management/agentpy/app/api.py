@@ -2,6 +2,7 @@
 # HTTP surface (FastAPI) for the disaster situational brief agent — pairs with loop.py and guardrails.py
 # Tim Fraser
 
+import asyncio
 import os
 import uuid
 from contextlib import asynccontextmanager
@@ -16,6 +17,8 @@ from pydantic import BaseModel, ConfigDict, Field, field_validator
 from .guardrails import MAX_AUTONOMOUS_TURNS, clamp_turns, min_completion_turns
 from .loop import run_research_loop
 from .logging_setup import configure_agent_logging
+from .telemetry import telemetry_summary
+from .warmup import keep_alive_setting, warm_up_enabled, warm_up_models
 
 # 0. CONFIGURATION ############################################################
 
@@ -25,6 +28,12 @@ load_dotenv()
 @asynccontextmanager
 async def _lifespan(_app: FastAPI):
     configure_agent_logging()
+    # Self-hosted Ollama: load the model before the first request instead of during it
+    _app.state.warmup = []
+    if warm_up_enabled(OLLAMA_HOST):
+        _app.state.warmup = await asyncio.to_thread(
+            warm_up_models, OLLAMA_HOST, OLLAMA_API_KEY, [OLLAMA_MODEL], keep_alive_setting()
+        )
     yield
 
 
@@ -251,13 +260,15 @@ AgentBodyDep = Annotated[
 
 @app.get("/health", tags=["health"], summary="Health check")
 async def health() -> dict[str, Any]:
-    """Returns `ok`, whether new agent runs are allowed, Ollama model name, and max autonomous turn cap."""
+    """Returns `ok`, whether new agent runs are allowed, Ollama model name, max autonomous turn cap, startup warm-up results, and Ollama call telemetry."""
     return {
         "ok": True,
         "run_enabled": app.state.run_enabled,
         "model": OLLAMA_MODEL,
         "max_autonomous_turns": MAX_AUTONOMOUS_TURNS,
         "min_completion_turns": min_completion_turns(),
+        "warmup": getattr(app.state, "warmup", []),
+        "telemetry": {"all": telemetry_summary(by=None).get("all"), "by_turn": telemetry_summary()},
     }
 
 
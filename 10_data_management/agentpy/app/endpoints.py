@@ -0,0 +1,166 @@
+# endpoints.py
+# Least-outstanding-requests load balancing across several Ollama hosts (OLLAMA_HOSTS="http://a:11434,http://b:11434")
+# Tim Fraser
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator
+
+
+def split_hosts(value: str) -> list[str]:
+    """'http://a:11434, http://b:11434' -> ['http://a:11434', 'http://b:11434']."""
+    return [h.strip().rstrip("/") for h in (value or "").split(",") if h.strip()]
+
+
+def ollama_hosts(base_url: str) -> list[str]:
+    """
+    Hosts to send chat calls to: the OLLAMA_HOSTS list if set, else just base_url.
+
+    OLLAMA_HOST stays a single URL, because the ollama CLI and server read it too.
+    """
+    return split_hosts(os.getenv("OLLAMA_HOSTS", "")) or split_hosts(base_url)[:1]
+
+
+def _model_key(name: str) -> str:
+    """Ollama treats 'llama3.2' and 'llama3.2:latest' as the same model."""
+    n = (name or "").strip()
+    return n if ":" in n else f"{n}:latest"
+
+
+def is_endpoint_failure(exc: BaseException) -> bool:
+    """Connection errors, timeouts and 5xx count against a host; 4xx (bad request) does not."""
+    # GeneratorExit (a caller stopped reading a stream early), KeyboardInterrupt and
+    # SystemExit pass through route() too, but say nothing about the host's health
+    if not isinstance(exc, Exception):
+        return False
+    response = getattr(exc, "response", None)
+    status = getattr(response, "status_code", None)
+    if status is None:
+        return True
+    return status >= 500
+
+
+class Endpoint:
+    def __init__(self, host: str):
+        self.host = host
+        self.outstanding = 0
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.models: set[str] | None = None  # None = not fetched yet / unknown
+        self.models_fetched_at = 0.0
+
+
+class EndpointPool:
+    """
+    Route each request to the healthy host with the fewest requests in flight.
+
+    - Passive health: after `eject_after` consecutive failures a host is skipped for `eject_seconds`.
+    - Model awareness: `fetch_models(host)` (e.g. GET /api/tags) is cached for `models_ttl` seconds;
+      hosts known not to have the model are skipped while any other host has it.
+    """
+
+    def __init__(
+        self,
+        hosts: list[str],
+        fetch_models: Callable[[str], list[str]] | None = None,
+        eject_after: int = 3,
+        eject_seconds: float = 30.0,
+        models_ttl: float = 60.0,
+    ):
+        if not hosts:
+            raise ValueError("EndpointPool needs at least one host.")
+        self.endpoints = [Endpoint(h.rstrip("/")) for h in hosts]
+        self.fetch_models = fetch_models
+        self.eject_after = int(eject_after)
+        self.eject_seconds = float(eject_seconds)
+        self.models_ttl = float(models_ttl)
+        self._lock = threading.Lock()
+        self._rr = 0  # round-robin tie breaker
+
+    def _refresh_models(self, ep: Endpoint) -> None:
+        if self.fetch_models is None or time.monotonic() - ep.models_fetched_at < self.models_ttl:
+            return
+        ep.models_fetched_at = time.monotonic()
+        try:
+            ep.models = {_model_key(m) for m in self.fetch_models(ep.host)}
+        except Exception:  # noqa: BLE001 — an unreachable host is handled by passive ejection
+            ep.models = None
+
+    def _pick(self, model: str | None) -> Endpoint:
+        now = time.monotonic()
+        if model:
+            for ep in self.endpoints:
+                self._refresh_models(ep)
+        with self._lock:
+            healthy = [ep for ep in self.endpoints if ep.ejected_until <= now]
+            if not healthy:
+                # Everyone is ejected: try the host that comes back soonest rather than failing outright
+                healthy = [min(self.endpoints, key=lambda e: e.ejected_until)]
+            if model:
+                key = _model_key(model)
+                serving = [ep for ep in healthy if ep.models is None or key in ep.models]
+                healthy = serving or healthy
+            low = min(ep.outstanding for ep in healthy)
+            ties = [ep for ep in healthy if ep.outstanding == low]
+            ep = ties[self._rr % len(ties)]
+            self._rr += 1
+            ep.outstanding += 1
+            ep.requests += 1
+            return ep
+
+    def _done(self, ep: Endpoint, ok: bool) -> None:
+        with self._lock:
+            ep.outstanding -= 1
+            if ok:
+                ep.consecutive_failures = 0
+                return
+            ep.failures += 1
+            ep.consecutive_failures += 1
+            if ep.consecutive_failures >= self.eject_after:
+                ep.ejected_until = time.monotonic() + self.eject_seconds
+                ep.consecutive_failures = 0
+
+    @contextmanager
+    def route(self, model: str | None = None) -> Iterator[str]:
+        """with pool.route(model) as host: ... — host is released (and health recorded) on exit."""
+        ep = self._pick(model)
+        try:
+            yield ep.host
+        except BaseException as exc:
+            self._done(ep, ok=not is_endpoint_failure(exc))
+            raise
+        else:
+            self._done(ep, ok=True)
+
+    def stats(self) -> list[dict[str, Any]]:
+        now = time.monotonic()
+        with self._lock:
+            return [
+                {
+                    "host": ep.host,
+                    "outstanding": ep.outstanding,
+                    "requests": ep.requests,
+                    "failures": ep.failures,
+                    "ejected": ep.ejected_until > now,
+                    "models": sorted(ep.models) if ep.models is not None else None,
+                }
+                for ep in self.endpoints
+            ]
+
+
+_pools: dict[str, EndpointPool] = {}
+_pools_lock = threading.Lock()
+
+
+def pool_for(hosts_value: str, fetch_models: Callable[[str], list[str]] | None = None) -> EndpointPool:
+    """One shared pool per comma-separated host list, so every request in the process sees the same load."""
+    key = ",".join(split_hosts(hosts_value))
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = EndpointPool(split_hosts(hosts_value), fetch_models=fetch_models)
+        return pool
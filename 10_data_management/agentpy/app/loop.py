@@ -6,12 +6,14 @@ import json
 import logging
 import os
 import re
+import time
 import uuid
 from typing import Any
 
 import httpx
 
 from .context import build_system_prompt
+from .endpoints import ollama_hosts, pool_for
 from .guardrails import (
     MAX_AUTONOMOUS_TURNS,
     MAX_SKILL_READS_PER_REQUEST,
@@ -21,6 +23,9 @@ from .guardrails import (
     task_size_ok,
 )
 from .logging_setup import configure_agent_logging
+from .ratelimit import send_with_backoff
+from .telemetry import record_telemetry
+from .warmup import keep_alive_setting
 from .tools import (
     ollama_tool_definitions,
     parse_function_arguments,
@@ -189,8 +194,9 @@ def _chat_once(
     messages: list[dict[str, Any]],
     max_tokens: int | None,
     tools: list[dict[str, Any]],
+    stage: str | None = None,
 ) -> dict[str, Any]:
-    """Single non-streaming /api/chat call (optionally with tools)."""
+    """Single non-streaming /api/chat call (optionally with tools); timing + token counts go to telemetry.py."""
     headers = {"Content-Type": "application/json"}
     if api_key:
         headers["Authorization"] = f"Bearer {api_key}"
@@ -202,10 +208,34 @@ def _chat_once(
     }
     if max_tokens is not None:
         body["options"] = {"num_predict": max_tokens}
-    url = base_url.rstrip("/") + "/api/chat"
-    resp = client.post(url, headers=headers, json=body, timeout=120.0)
-    resp.raise_for_status()
-    data = resp.json()
+    keep_alive = keep_alive_setting()
+    if keep_alive:
+        body["keep_alive"] = keep_alive
+
+    def post(host: str) -> dict[str, Any]:
+        url = host.rstrip("/") + "/api/chat"
+        # Shared per-host limiter + Retry-After-aware backoff (see ratelimit.py)
+        t0 = time.perf_counter()
+        resp = send_with_backoff(lambda: client.post(url, headers=headers, json=body, timeout=120.0), url)
+        resp.raise_for_status()
+        data = resp.json()
+        # Wall time includes limiter waits and retries; compare with server_seconds to see queueing
+        record_telemetry(data, time.perf_counter() - t0, model=model, host=host, stage=stage)
+        return data
+
+    hosts = ollama_hosts(base_url)
+    if len(hosts) > 1:
+        # Several hosts (comma-separated OLLAMA_HOSTS): least-outstanding routing, see endpoints.py
+        # The pool outlives this call's client, so fetch tags with a one-off request
+        def fetch_models(host: str) -> list[str]:
+            r = httpx.get(host + "/api/tags", headers=headers, timeout=10.0)
+            r.raise_for_status()
+            return [m.get("name", "") for m in r.json().get("models", [])]
+
+        with pool_for(",".join(hosts), fetch_models=fetch_models).route(model) as host:
+            data = post(host)
+    else:
+        data = post(hosts[0] if hosts else base_url)
     msg = data.get("message") or {}
     content = (msg.get("content") or "")
     if isinstance(content, str):
@@ -312,6 +342,7 @@ def run_research_loop(
                     messages,
                     max_output_tokens,
                     tools,
+                    stage=f"turn_{turns_used}",
                 )
             except Exception as exc:  # noqa: BLE001 — surface model/HTTP errors to API layer
                 log.warning("turn %s Ollama error: %s", turns_used, _redact_for_log(exc))
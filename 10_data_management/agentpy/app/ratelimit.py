@@ -0,0 +1,182 @@
+# ratelimit.py
+# Process-wide client-side rate limiting + Retry-After-aware backoff for Ollama Cloud calls
+# Tim Fraser
+
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable
+from urllib.parse import urlsplit
+
+# Ollama Cloud defaults (override with env or configure_rate_limit()).
+DEFAULT_RPS = float(os.getenv("OLLAMA_RATE_LIMIT_RPS", "2") or 0)
+DEFAULT_MAX_CONCURRENT = int(os.getenv("OLLAMA_MAX_CONCURRENT", "4") or 4)
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Only Ollama Cloud gets these caps by default; other hosts (localhost, your own
+# servers) are unlimited unless OLLAMA_RATE_LIMIT_RPS / OLLAMA_MAX_CONCURRENT are set
+# or configure_rate_limit() is called for them.
+CLOUD_HOSTS = ("ollama.com",)
+
+
+def is_cloud_host(host: str) -> bool:
+    name = host.rsplit("@", 1)[-1].split(":")[0].lower()
+    return any(name == h or name.endswith("." + h) for h in CLOUD_HOSTS)
+
+
+def default_limits(host: str) -> tuple[float, int]:
+    """(requests/second, max concurrent) for a host nobody configured; 0 = no limit."""
+    if is_cloud_host(host):
+        return DEFAULT_RPS, DEFAULT_MAX_CONCURRENT
+    return float(os.getenv("OLLAMA_RATE_LIMIT_RPS") or 0), int(os.getenv("OLLAMA_MAX_CONCURRENT") or 0)
+
+
+class RateLimiter:
+    """Token bucket (requests/second) plus a cap on concurrent requests, shared by every caller for one host."""
+
+    def __init__(self, rate: float = DEFAULT_RPS, max_concurrent: int = DEFAULT_MAX_CONCURRENT, burst: float | None = None):
+        self.rate = float(rate or 0)  # 0 = no requests/second limit
+        self.capacity = float(burst or max(1.0, self.rate))
+        self.tokens = self.capacity
+        self.max_concurrent = int(max_concurrent or 0)  # 0 = no cap on requests in flight
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_concurrent) if self.max_concurrent > 0 else None
+        self.acquired = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def acquire(self) -> float:
+        """Block until a concurrency slot and a token are free; return seconds waited."""
+        t0 = time.monotonic()
+        if self._slots is not None:
+            self._slots.acquire()
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self._blocked_until:
+                    sleep_for = self._blocked_until - now
+                elif self.rate <= 0:
+                    break
+                else:
+                    self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+                    self._updated = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        break
+                    sleep_for = (1 - self.tokens) / self.rate
+            time.sleep(sleep_for)
+        waited = time.monotonic() - t0
+        with self._lock:
+            self.acquired += 1
+            self.total_wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+        return waited
+
+    def release(self) -> None:
+        if self._slots is not None:
+            self._slots.release()
+
+    def pause(self, seconds: float) -> None:
+        """Hold every caller for this host (e.g. after a Retry-After header)."""
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + max(0.0, seconds))
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "rate_per_second": self.rate,
+                "max_concurrent": self.max_concurrent,
+                "acquired": self.acquired,
+                "total_wait_seconds": self.total_wait_seconds,
+                "mean_wait_seconds": self.total_wait_seconds / self.acquired if self.acquired else 0.0,
+                "max_wait_seconds": self.max_wait_seconds,
+            }
+
+
+_limiters: dict[str, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def _host_of(url: str) -> str:
+    return urlsplit(url).netloc or url
+
+
+def configure_rate_limit(host_or_url: str, rate: float | None = None, max_concurrent: int | None = None, burst: float | None = None) -> RateLimiter:
+    """Set limits for one host (e.g. 'ollama.com'); replaces any existing limiter for it."""
+    host = _host_of(host_or_url) if "//" in host_or_url else host_or_url
+    limiter = RateLimiter(
+        rate=default_limits(host)[0] if rate is None else rate,
+        max_concurrent=default_limits(host)[1] if max_concurrent is None else max_concurrent,
+        burst=burst,
+    )
+    with _limiters_lock:
+        _limiters[host] = limiter
+    return limiter
+
+
+def get_rate_limiter(url: str) -> RateLimiter:
+    """Process-wide limiter for the host in url (created with default_limits() on first use)."""
+    host = _host_of(url)
+    with _limiters_lock:
+        limiter = _limiters.get(host)
+        if limiter is None:
+            limiter = _limiters[host] = RateLimiter(*default_limits(host))
+        return limiter
+
+
+def rate_limit_stats() -> dict[str, dict[str, Any]]:
+    """Wait-time stats for every host seen so far."""
+    with _limiters_lock:
+        items = list(_limiters.items())
+    return {host: limiter.stats() for host, limiter in items}
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Retry-After is either seconds or an HTTP date; return seconds to wait (or None)."""
+    if not value:
+        return None
+    v = value.strip()
+    try:
+        return max(0.0, float(v))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(v).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def send_with_backoff(
+    send: Callable[[], Any],
+    url: str,
+    max_attempts: int = 5,
+    base_delay: float = 1.0,
+    max_delay: float = 30.0,
+) -> Any:
+    """
+    Call send() (one HTTP request; returns a requests/httpx response) through the host's limiter.
+
+    On 429/5xx, wait and retry: honor Retry-After when present (and pause the whole host), otherwise
+    jittered exponential backoff. The last response is returned as-is so callers can raise_for_status().
+    """
+    limiter = get_rate_limiter(url)
+    for attempt in range(1, max_attempts + 1):
+        limiter.acquire()
+        try:
+            response = send()
+        finally:
+            limiter.release()
+        if response.status_code not in RETRY_STATUSES or attempt >= max_attempts:
+            return response
+        retry_after = parse_retry_after(response.headers.get("Retry-After"))
+        if retry_after is not None:
+            limiter.pause(retry_after)
+            delay = retry_after
+        else:
+            cap = min(max_delay, base_delay * 2 ** (attempt - 1))
+            delay = cap / 2 + random.uniform(0, cap / 2)
+        time.sleep(delay)
+    return response
@@ -0,0 +1,147 @@
+# telemetry.py
+# Per-call Ollama timing + token telemetry: in-memory ring buffer, optional JSONL / SQLite sink, p50/p95 summaries
+# Tim Fraser
+
+import collections
+import contextvars
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Iterator
+
+# Ollama reports durations in nanoseconds: load_duration (model load), prompt_eval_* (reading the prompt),
+# eval_* (generating). Each record adds client-side wall time, so queueing / network shows up as wall - server.
+TELEMETRY_MAXLEN = int(os.getenv("OLLAMA_TELEMETRY_MAXLEN", "1000") or 1000)
+TELEMETRY_COLUMNS = (
+    "ts", "stage", "model", "host", "wall_seconds", "server_seconds", "load_seconds",
+    "prompt_tokens", "prompt_seconds", "output_tokens", "output_seconds", "tokens_per_second",
+)
+
+_stage: contextvars.ContextVar[str | None] = contextvars.ContextVar("telemetry_stage", default=None)
+
+
+def _percentile(values: list[float | None], q: float) -> float | None:
+    """Nearest-rank percentile (q in 0-100)."""
+    vals = sorted(v for v in values if v is not None)
+    if not vals:
+        return None
+    k = min(len(vals), max(1, math.ceil(q / 100 * len(vals))))
+    return vals[k - 1]
+
+
+class Telemetry:
+    """Ring buffer of per-call records; optionally appended to a JSONL file and/or a SQLite table."""
+
+    def __init__(self, maxlen: int = TELEMETRY_MAXLEN, jsonl_path: str | None = None, sqlite_path: str | None = None):
+        self.buffer: collections.deque[dict[str, Any]] = collections.deque(maxlen=maxlen)
+        self.jsonl_path = jsonl_path
+        self._lock = threading.Lock()
+        self._db: sqlite3.Connection | None = None
+        if sqlite_path:
+            self._db = sqlite3.connect(sqlite_path, check_same_thread=False)
+            self._db.execute(f"CREATE TABLE IF NOT EXISTS telemetry ({', '.join(TELEMETRY_COLUMNS)})")
+            self._db.commit()
+
+    def record(
+        self,
+        result: dict[str, Any],
+        wall_seconds: float,
+        model: str | None = None,
+        host: str | None = None,
+        stage: str | None = None,
+    ) -> dict[str, Any]:
+        """Store one /api/chat response's metadata plus client wall time; returns the record."""
+
+        def seconds(key: str) -> float | None:
+            v = result.get(key)
+            return v / 1e9 if v is not None else None
+
+        output_tokens = result.get("eval_count")
+        output_seconds = seconds("eval_duration")
+        row: dict[str, Any] = {
+            "ts": time.time(),
+            "stage": stage if stage is not None else _stage.get(),
+            "model": model or result.get("model"),
+            "host": host,
+            "wall_seconds": wall_seconds,
+            "server_seconds": seconds("total_duration"),
+            "load_seconds": seconds("load_duration"),
+            "prompt_tokens": result.get("prompt_eval_count"),
+            "prompt_seconds": seconds("prompt_eval_duration"),
+            "output_tokens": output_tokens,
+            "output_seconds": output_seconds,
+            "tokens_per_second": output_tokens / output_seconds if output_tokens and output_seconds else None,
+        }
+        with self._lock:
+            self.buffer.append(row)
+            if self.jsonl_path:
+                with open(self.jsonl_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(row) + "\n")
+            if self._db is not None:
+                marks = ", ".join("?" for _ in TELEMETRY_COLUMNS)
+                self._db.execute(f"INSERT INTO telemetry VALUES ({marks})", [row[c] for c in TELEMETRY_COLUMNS])
+                self._db.commit()
+        return row
+
+    def records(self) -> list[dict[str, Any]]:
+        with self._lock:
+            return list(self.buffer)
+
+    def summary(self, by: str | None = "stage") -> dict[Any, dict[str, Any]]:
+        """Per group (stage / model / host, or None = all): calls, p50/p95 wall, tokens/s, prompt tokens, load time."""
+        groups: dict[Any, list[dict[str, Any]]] = {}
+        for row in self.records():
+            groups.setdefault(row.get(by) if by else "all", []).append(row)
+        out: dict[Any, dict[str, Any]] = {}
+        for key, rows in groups.items():
+            wall = [r["wall_seconds"] for r in rows]
+            prompt = [r["prompt_tokens"] or 0 for r in rows]
+            out_tokens = sum(r["output_tokens"] or 0 for r in rows)
+            out_seconds = sum(r["output_seconds"] or 0 for r in rows)
+            out[key] = {
+                "calls": len(rows),
+                "wall_seconds": sum(wall),
+                "p50_seconds": _percentile(wall, 50),
+                "p95_seconds": _percentile(wall, 95),
+                "tokens_per_second": out_tokens / out_seconds if out_seconds else None,
+                "prompt_tokens": sum(prompt),
+                "mean_prompt_tokens": sum(prompt) / len(rows),
+                "output_tokens": out_tokens,
+                "load_seconds": sum(r["load_seconds"] or 0 for r in rows),
+            }
+        return out
+
+
+# Process-wide buffer; OLLAMA_TELEMETRY_JSONL / OLLAMA_TELEMETRY_SQLITE add file sinks.
+TELEMETRY = Telemetry(
+    jsonl_path=os.getenv("OLLAMA_TELEMETRY_JSONL") or None,
+    sqlite_path=os.getenv("OLLAMA_TELEMETRY_SQLITE") or None,
+)
+
+
+@contextmanager
+def telemetry_stage(name: str) -> Iterator[None]:
+    """Label every call recorded inside the block (e.g. with telemetry_stage("prefetch"): ...)."""
+    token = _stage.set(name)
+    try:
+        yield
+    finally:
+        _stage.reset(token)
+
+
+def record_telemetry(
+    result: dict[str, Any],
+    wall_seconds: float,
+    model: str | None = None,
+    host: str | None = None,
+    stage: str | None = None,
+) -> dict[str, Any]:
+    return TELEMETRY.record(result, wall_seconds, model=model, host=host, stage=stage)
+
+
+def telemetry_summary(by: str | None = "stage") -> dict[Any, dict[str, Any]]:
+    return TELEMETRY.summary(by=by)
@@ -0,0 +1,78 @@
+# warmup.py
+# Preload the Ollama model at startup and keep it loaded (OLLAMA_WARMUP / OLLAMA_KEEP_ALIVE)
+# Tim Fraser
+
+import logging
+import os
+import time
+from typing import Any
+
+import httpx
+
+from .endpoints import ollama_hosts
+
+log = logging.getLogger("agent")
+
+# Ollama Cloud serves models that are always loaded; only self-hosted servers need a warm-up.
+_CLOUD_HOSTS = ("ollama.com",)
+
+
+def keep_alive_setting() -> str | None:
+    """OLLAMA_KEEP_ALIVE (e.g. 30m, 1h, -1); sent with every chat call so the model is not unloaded between runs."""
+    value = os.getenv("OLLAMA_KEEP_ALIVE", "").strip()
+    return value or None
+
+
+def warm_up_enabled(base_url: str) -> bool:
+    """OLLAMA_WARMUP=1/0 forces it on/off; default (auto) warms up every host except Ollama Cloud."""
+    raw = os.getenv("OLLAMA_WARMUP", "auto").strip().lower()
+    if raw in ("0", "off", "false", "no"):
+        return False
+    if raw in ("1", "on", "true", "yes"):
+        return True
+    return any(not any(c in h for c in _CLOUD_HOSTS) for h in ollama_hosts(base_url))
+
+
+def warm_up_models(
+    base_url: str,
+    api_key: str,
+    models: list[str],
+    keep_alive: str | None = None,
+    timeout: float = 300.0,
+) -> list[dict[str, Any]]:
+    """
+    Load each model on each (non-cloud) host (see ollama_hosts()) with an empty /api/generate request.
+
+    Returns one row per host and model: load_seconds (Ollama's load_duration) is reported separately
+    from total_seconds (wall time), so model load is not mistaken for inference time. Never raises.
+    """
+    headers = {"Content-Type": "application/json"}
+    if api_key:
+        headers["Authorization"] = f"Bearer {api_key}"
+    report: list[dict[str, Any]] = []
+    for host in ollama_hosts(base_url):
+        if any(c in host for c in _CLOUD_HOSTS):
+            continue
+        for model in models:
+            body: dict[str, Any] = {"model": model}
+            if keep_alive:
+                body["keep_alive"] = keep_alive
+            row: dict[str, Any] = {"host": host, "model": model, "ok": False, "load_seconds": None, "error": None}
+            t0 = time.perf_counter()
+            try:
+                resp = httpx.post(host + "/api/generate", headers=headers, json=body, timeout=timeout)
+                resp.raise_for_status()
+                row["load_seconds"] = (resp.json().get("load_duration") or 0) / 1e9
+                row["ok"] = True
+            except httpx.HTTPError as e:
+                row["error"] = str(e)
+            row["total_seconds"] = time.perf_counter() - t0
+            if row["ok"]:
+                log.info(
+                    "warm-up %s on %s: load %.2fs, total %.2fs, keep_alive=%s",
+                    model, host, row["load_seconds"], row["total_seconds"], keep_alive or "default",
+                )
+            else:
+                log.warning("warm-up %s on %s failed: %s", model, host, row["error"])
+            report.append(row)
+    return report
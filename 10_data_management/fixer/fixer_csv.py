@@ -16,9 +16,14 @@ import pandas as pd
 from dotenv import load_dotenv
 
 from functions import (
+    chat_cache_summary,
+    hedge_summary_text,
     ollama_chat_once,
     parse_function_arguments,
     split_df_into_row_chunks,
+    telemetry_summary_text,
+    warm_up_models,
+    warm_up_summary,
 )
 
 # 0. SETUP ###################################
@@ -58,6 +63,9 @@ OLLAMA_API_KEY = os.environ.get("OLLAMA_API_KEY", "").strip()
 OLLAMA_MODEL = os.environ.get("OLLAMA_MODEL", "nemotron-3-nano:30b-cloud").strip()
 print(f"☁️  Ollama: host = {OLLAMA_HOST}")
 print(f"   model  = {OLLAMA_MODEL}")
+warmup = warm_up_models(OLLAMA_HOST, OLLAMA_API_KEY, [OLLAMA_MODEL])
+if warmup:
+    print(warm_up_summary(warmup))
 if OLLAMA_API_KEY:
     ak_show = f"{OLLAMA_API_KEY[:4]}...{OLLAMA_API_KEY[-1]}"
 else:
@@ -293,6 +301,7 @@ def call_chunk_ollama(
             tools=tools,
             format=None,
             max_output_tokens=max_output_tokens,
+            stage="csv",
         )
     except Exception as e:
         return {
@@ -450,4 +459,10 @@ print(f"✏️  Audit lines (set_cell): {n_audit}")
 print(f"👷 Chunk workers used:    {FIXER_CHUNK_WORKERS}")
 print(f"💾 Working file:          {WORK_PATH}")
 print(f"📝 Audit log:             {LOG_PATH}")
+if chat_cache_summary():
+    print(chat_cache_summary())
+if telemetry_summary_text():
+    print(telemetry_summary_text())
+if hedge_summary_text():
+    print(hedge_summary_text())
 print("=================================================================")
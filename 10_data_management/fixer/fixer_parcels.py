@@ -16,7 +16,16 @@ import matplotlib.pyplot as plt
 import pandas as pd
 from dotenv import load_dotenv
 
-from functions import ollama_chat_once, parse_function_arguments, split_df_into_row_chunks
+from functions import (
+    chat_cache_summary,
+    hedge_summary_text,
+    ollama_chat_once,
+    parse_function_arguments,
+    split_df_into_row_chunks,
+    telemetry_summary_text,
+    warm_up_models,
+    warm_up_summary,
+)
 
 print()
 print("=================================================================")
@@ -50,6 +59,9 @@ OLLAMA_API_KEY = os.environ.get("OLLAMA_API_KEY", "").strip()
 OLLAMA_MODEL = os.environ.get("OLLAMA_MODEL", "nemotron-3-nano:30b-cloud").strip()
 print(f"☁️  Ollama: host = {OLLAMA_HOST}")
 print(f"   model  = {OLLAMA_MODEL}\n")
+warmup = warm_up_models(OLLAMA_HOST, OLLAMA_API_KEY, [OLLAMA_MODEL])
+if warmup:
+    print(warm_up_summary(warmup) + "\n")
 
 
 def read_env_digits(name: str, default: int) -> int:
@@ -217,6 +229,7 @@ def call_parcel_chunk_ollama(
             tools=tools,
             format=None,
             max_output_tokens=max_output_tokens,
+            stage="parcels",
         )
     except Exception as e:
         return {"chunk_index": chunk_index, "tool_calls": [], "error": str(e), "content": ""}
@@ -381,4 +394,10 @@ print("📊 Summary (fixer_parcels.py)")
 print("=================================================================")
 print(f"📦 Chunks: {n_chunks} | tool calls: {n_tools} | audit lines: {n_audit}")
 print(f"⚠️  Rows error_flag TRUE: {n_err} / {len(parcels_out)}")
+if chat_cache_summary():
+    print(chat_cache_summary())
+if telemetry_summary_text():
+    print(telemetry_summary_text())
+if hedge_summary_text():
+    print(hedge_summary_text())
 print("=================================================================")
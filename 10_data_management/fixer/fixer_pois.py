@@ -6,6 +6,7 @@ from __future__ import annotations
 
 import json
 import os
+import time
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timezone
 from pathlib import Path
@@ -16,7 +17,19 @@ import matplotlib.pyplot as plt
 import pandas as pd
 from dotenv import load_dotenv
 
-from functions import ollama_chat_once, parse_function_arguments, split_df_into_row_chunks
+from functions import (
+    CascadeStats,
+    cascade_models,
+    cascade_summary_text,
+    chat_cache_summary,
+    hedge_summary_text,
+    ollama_chat_once,
+    parse_function_arguments,
+    split_df_into_row_chunks,
+    telemetry_summary_text,
+    warm_up_models,
+    warm_up_summary,
+)
 
 print()
 print("=================================================================")
@@ -48,8 +61,17 @@ print("   ✅ .env read from fixer folder.\n")
 OLLAMA_HOST = os.environ.get("OLLAMA_HOST", "https://ollama.com").strip()
 OLLAMA_API_KEY = os.environ.get("OLLAMA_API_KEY", "").strip()
 OLLAMA_MODEL = os.environ.get("OLLAMA_MODEL", "nemotron-3-nano:30b-cloud").strip()
+# Optional cascade: FIXER_CASCADE_MODEL answers first, OLLAMA_MODEL only gets the rows it could not classify
+CASCADE_MODELS = cascade_models(OLLAMA_MODEL)
+CASCADE = CascadeStats(CASCADE_MODELS)
 print(f"☁️  Ollama: host = {OLLAMA_HOST}")
-print(f"   model  = {OLLAMA_MODEL}\n")
+print(f"   model  = {OLLAMA_MODEL}")
+if len(CASCADE_MODELS) > 1:
+    print(f"   cascade = {' -> '.join(CASCADE_MODELS)}")
+print()
+warmup = warm_up_models(OLLAMA_HOST, OLLAMA_API_KEY, CASCADE_MODELS)
+if warmup:
+    print(warm_up_summary(warmup) + "\n")
 
 
 def read_env_digits(name: str, default: int) -> int:
@@ -63,6 +85,7 @@ def read_env_digits(name: str, default: int) -> int:
 
 ROWS_PER_BATCH = read_env_digits("ROWS_PER_BATCH", 10)
 FIXER_CHUNK_WORKERS = read_env_digits("FIXER_CHUNK_WORKERS", 1)
+CASCADE_MIN_CONFIDENCE = read_env_digits("FIXER_CASCADE_MIN_CONFIDENCE", 2)
 print(f"📊 ROWS_PER_BATCH = {ROWS_PER_BATCH}")
 print(f"📊 FIXER_CHUNK_WORKERS = {FIXER_CHUNK_WORKERS}\n")
 
@@ -74,15 +97,50 @@ print("   ✅ Helpers loaded.\n")
 
 WGS84_CRS = 4326
 
+
+def poi_tool_definitions() -> list[dict[str, Any]]:
+    return [
+        {
+            "type": "function",
+            "function": {
+                "name": "record_poi_category",
+                "description": "Store normalized category and display name for one POI. poi_id must match the chunk CSV.",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "poi_id": {"type": "integer", "description": "poi_id from the CSV row."},
+                        "normalized_category": {
+                            "type": "string",
+                            "enum": [
+                                "healthcare", "food_retail", "retail", "financial", "transport", "recreation",
+                                "parking", "childcare", "agriculture", "vacant", "public_government", "other",
+                            ],
+                            "description": "Closed vocabulary: exactly one of the enum values.",
+                        },
+                        "confidence": {"type": "integer", "description": "1=low, 2=medium, 3=high."},
+                        "display_name_clean": {"type": "string", "description": "Short cleaned facility name."},
+                    },
+                    "required": ["poi_id", "normalized_category", "confidence", "display_name_clean"],
+                },
+            },
+        }
+    ]
+
+
+# The category vocabulary lives only in the tool schema's enum; the check and the prompt read it from there
+POI_CATEGORY_ENUM: list[str] = poi_tool_definitions()[0]["function"]["parameters"]["properties"][
+    "normalized_category"
+]["enum"]
+POI_CATEGORIES = set(POI_CATEGORY_ENUM)
+
 POI_DATA_BLURB = (
     "## POI table\n"
     "Each row is one **point** (columns **x** = longitude, **y** = latitude). **poi_id** is the stable key. "
     "**name_messy** is a noisy facility label to classify.\n\n"
     "## Output fields (one tool call per row)\n"
     "- **normalized_category**: exactly one of "
-    '"healthcare", "food_retail", "retail", "financial", "transport", '
-    '"recreation", "parking", "childcare", "agriculture", "vacant", '
-    '"public_government", "other".\n'
+    + ", ".join(f'"{c}"' for c in POI_CATEGORY_ENUM)
+    + ".\n"
     "- **confidence**: integer 1 (low), 2 (medium), or 3 (high).\n"
     "- **display_name_clean**: short human-readable name.\n"
 )
@@ -133,34 +191,6 @@ def run_record_poi_category(args: dict[str, Any], api_round: int) -> str:
     return f"OK: poi_id={pid} updated."
 
 
-def poi_tool_definitions() -> list[dict[str, Any]]:
-    return [
-        {
-            "type": "function",
-            "function": {
-                "name": "record_poi_category",
-                "description": "Store normalized category and display name for one POI. poi_id must match the chunk CSV.",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "poi_id": {"type": "integer", "description": "poi_id from the CSV row."},
-                        "normalized_category": {
-                            "type": "string",
-                            "description": (
-                                "One of: healthcare, food_retail, retail, financial, transport, recreation, "
-                                "parking, childcare, agriculture, vacant, public_government, other."
-                            ),
-                        },
-                        "confidence": {"type": "integer", "description": "1=low, 2=medium, 3=high."},
-                        "display_name_clean": {"type": "string", "description": "Short cleaned facility name."},
-                    },
-                    "required": ["poi_id", "normalized_category", "confidence", "display_name_clean"],
-                },
-            },
-        }
-    ]
-
-
 def dispatch_poi_tool(name: str, args: dict[str, Any], api_round: int) -> str:
     if name == "record_poi_category":
         print(f"      ✏️  record_poi_category poi_id={args.get('poi_id', '?')}")
@@ -199,6 +229,7 @@ def call_poi_chunk_ollama(
             tools=tools,
             format=None,
             max_output_tokens=max_output_tokens,
+            stage="pois",
         )
     except Exception as e:
         return {"chunk_index": chunk_index, "tool_calls": [], "error": str(e), "content": ""}
@@ -211,6 +242,34 @@ def call_poi_chunk_ollama(
     }
 
 
+def accepted_poi_calls(
+    tool_calls: list[dict[str, Any]], poi_ids: list[int], min_confidence: int
+) -> tuple[list[dict[str, Any]], list[int]]:
+    """
+    Cascade check: keep record_poi_category calls with a known poi_id, a category from the closed vocabulary
+    and confidence >= min_confidence; return (kept calls, poi_ids still needing an answer).
+    """
+    kept: list[dict[str, Any]] = []
+    done: set[int] = set()
+    for tc in tool_calls:
+        if not isinstance(tc, dict):
+            continue
+        fn = tc.get("function") or {}
+        if str(fn.get("name") or "") != "record_poi_category":
+            continue
+        args = parse_function_arguments(fn.get("arguments"))
+        try:
+            pid = int(args.get("poi_id"))
+            conf = int(args.get("confidence"))
+        except (TypeError, ValueError):
+            continue
+        category = str(args.get("normalized_category") or "").strip()
+        if pid in poi_ids and pid not in done and category in POI_CATEGORIES and conf >= min_confidence:
+            kept.append(tc)
+            done.add(pid)
+    return kept, [pid for pid in poi_ids if pid not in done]
+
+
 # 2. LOAD DATA ###################################
 
 print("-----------------------------------------------------------------")
@@ -250,20 +309,42 @@ print("-----------------------------------------------------------------\n\n")
 
 
 def _run_poi(i: int) -> dict[str, Any]:
-    return call_poi_chunk_ollama(
-        chunk_index=i,
-        n_chunks=n_chunks,
-        chunk_csv_text=chunk_csv_texts[i - 1],
-        ollama_host=OLLAMA_HOST,
-        ollama_key=OLLAMA_API_KEY,
-        ollama_model=OLLAMA_MODEL,
-        system_prompt=SYSTEM_POIS,
-        data_blurb=POI_DATA_BLURB,
-        tools=poi_tools,
-        max_output_tokens=MAX_OUT,
-    )
-
-
+    # Without a cascade this is one call with OLLAMA_MODEL. With one, each model after the first only sees
+    # the rows whose earlier answers failed accepted_poi_calls(); the last model's calls are kept as-is.
+    chunk = chunks[i - 1]
+    pending = [int(p) for p in chunk["poi_id"]]
+    kept: list[dict[str, Any]] = []
+    cr: dict[str, Any] = {}
+    for level, model in enumerate(CASCADE_MODELS):
+        last = level == len(CASCADE_MODELS) - 1
+        rows = chunk[chunk["poi_id"].astype(int).isin(pending)]
+        t0 = time.perf_counter()
+        cr = call_poi_chunk_ollama(
+            chunk_index=i,
+            n_chunks=n_chunks,
+            chunk_csv_text=chunk_csv_texts[i - 1] if level == 0 else rows.to_csv(index=False),
+            ollama_host=OLLAMA_HOST,
+            ollama_key=OLLAMA_API_KEY,
+            ollama_model=model,
+            system_prompt=SYSTEM_POIS,
+            data_blurb=POI_DATA_BLURB,
+            tools=poi_tools,
+            max_output_tokens=MAX_OUT,
+        )
+        good, still = accepted_poi_calls(cr["tool_calls"], pending, CASCADE_MIN_CONFIDENCE)
+        CASCADE.record(model, len(pending), len(good), time.perf_counter() - t0)
+        if last:
+            kept.extend(cr["tool_calls"])
+            break
+        kept.extend(good)
+        pending = still
+        if not pending:
+            break
+    # Rows answered by an earlier model still get applied if the larger model fails
+    return {**cr, "chunk_index": i, "tool_calls": kept, "error": cr.get("error") if not kept else None}
+
+
+t_chunks = time.perf_counter()
 with ThreadPoolExecutor(max_workers=FIXER_CHUNK_WORKERS) as ex:
     tmp: dict[int, dict[str, Any]] = {}
     futs = {ex.submit(_run_poi, i): i for i in range(1, n_chunks + 1)}
@@ -271,6 +352,8 @@ with ThreadPoolExecutor(max_workers=FIXER_CHUNK_WORKERS) as ex:
         cr = fut.result()
         tmp[cr["chunk_index"]] = cr
     chunk_results = [tmp[i] for i in range(1, n_chunks + 1)]
+chunk_seconds = time.perf_counter() - t_chunks
+print(f"   ⏱️  {n_chunks} chunk(s) in {chunk_seconds:.1f}s ({len(chunks_in) / max(chunk_seconds, 1e-9):.1f} rows/s)\n")
 
 # 4. APPLY TOOLS ###################################
 
@@ -370,4 +453,12 @@ print("📊 Summary (fixer_pois.py)")
 print("=================================================================")
 print(f"📦 Chunks: {n_chunks} | tool calls: {n_tools} | audit lines: {n_audit}")
 print(f"⚠️  Rows error_flag TRUE: {n_err} / {len(df)}")
+if chat_cache_summary():
+    print(chat_cache_summary())
+if telemetry_summary_text():
+    print(telemetry_summary_text())
+if hedge_summary_text():
+    print(hedge_summary_text())
+if cascade_summary_text(CASCADE):
+    print(cascade_summary_text(CASCADE))
 print("=================================================================")
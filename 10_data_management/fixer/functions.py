@@ -5,10 +5,22 @@
 
 from __future__ import annotations
 
+import collections
+import contextvars
+import hashlib
 import json
+import math
 import os
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
 from pathlib import Path
-from typing import Any
+from typing import Any, Callable, Iterator, TypeVar
+from urllib.parse import urlsplit
 
 import httpx
 import pandas as pd
@@ -48,6 +60,909 @@ def split_df_into_row_chunks(df: pd.DataFrame, n_rows: int) -> list[pd.DataFrame
     return out
 
 
+# Client-side rate limiting for Ollama Cloud: one process-wide limiter per host shared by all chunk workers.
+# Ollama Cloud defaults (override with env or configure_rate_limit()).
+DEFAULT_RPS = float(os.getenv("OLLAMA_RATE_LIMIT_RPS", "2") or 0)
+DEFAULT_MAX_CONCURRENT = int(os.getenv("OLLAMA_MAX_CONCURRENT", "4") or 4)
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Only Ollama Cloud gets these caps by default; other hosts (localhost, your own
+# servers) are unlimited unless OLLAMA_RATE_LIMIT_RPS / OLLAMA_MAX_CONCURRENT are set
+# or configure_rate_limit() is called for them.
+CLOUD_HOSTS = ("ollama.com",)
+
+
+def is_cloud_host(host: str) -> bool:
+    name = host.rsplit("@", 1)[-1].split(":")[0].lower()
+    return any(name == h or name.endswith("." + h) for h in CLOUD_HOSTS)
+
+
+def default_limits(host: str) -> tuple[float, int]:
+    """(requests/second, max concurrent) for a host nobody configured; 0 = no limit."""
+    if is_cloud_host(host):
+        return DEFAULT_RPS, DEFAULT_MAX_CONCURRENT
+    return float(os.getenv("OLLAMA_RATE_LIMIT_RPS") or 0), int(os.getenv("OLLAMA_MAX_CONCURRENT") or 0)
+
+
+class RateLimiter:
+    """Token bucket (requests/second) plus a cap on concurrent requests, shared by every caller for one host."""
+
+    def __init__(self, rate: float = DEFAULT_RPS, max_concurrent: int = DEFAULT_MAX_CONCURRENT, burst: float | None = None):
+        self.rate = float(rate or 0)  # 0 = no requests/second limit
+        self.capacity = float(burst or max(1.0, self.rate))
+        self.tokens = self.capacity
+        self.max_concurrent = int(max_concurrent or 0)  # 0 = no cap on requests in flight
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_concurrent) if self.max_concurrent > 0 else None
+        self.acquired = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def acquire(self) -> float:
+        """Block until a concurrency slot and a token are free; return seconds waited."""
+        t0 = time.monotonic()
+        if self._slots is not None:
+            self._slots.acquire()
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self._blocked_until:
+                    sleep_for = self._blocked_until - now
+                elif self.rate <= 0:
+                    break
+                else:
+                    self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+                    self._updated = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        break
+                    sleep_for = (1 - self.tokens) / self.rate
+            time.sleep(sleep_for)
+        waited = time.monotonic() - t0
+        with self._lock:
+            self.acquired += 1
+            self.total_wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+        return waited
+
+    def release(self) -> None:
+        if self._slots is not None:
+            self._slots.release()
+
+    def pause(self, seconds: float) -> None:
+        """Hold every caller for this host (e.g. after a Retry-After header)."""
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + max(0.0, seconds))
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "rate_per_second": self.rate,
+                "max_concurrent": self.max_concurrent,
+                "acquired": self.acquired,
+                "total_wait_seconds": self.total_wait_seconds,
+                "mean_wait_seconds": self.total_wait_seconds / self.acquired if self.acquired else 0.0,
+                "max_wait_seconds": self.max_wait_seconds,
+            }
+
+
+_limiters: dict[str, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def _host_of(url: str) -> str:
+    return urlsplit(url).netloc or url
+
+
+def configure_rate_limit(host_or_url: str, rate: float | None = None, max_concurrent: int | None = None, burst: float | None = None) -> RateLimiter:
+    """Set limits for one host (e.g. 'ollama.com'); replaces any existing limiter for it."""
+    host = _host_of(host_or_url) if "//" in host_or_url else host_or_url
+    limiter = RateLimiter(
+        rate=default_limits(host)[0] if rate is None else rate,
+        max_concurrent=default_limits(host)[1] if max_concurrent is None else max_concurrent,
+        burst=burst,
+    )
+    with _limiters_lock:
+        _limiters[host] = limiter
+    return limiter
+
+
+def get_rate_limiter(url: str) -> RateLimiter:
+    """Process-wide limiter for the host in url (created with default_limits() on first use)."""
+    host = _host_of(url)
+    with _limiters_lock:
+        limiter = _limiters.get(host)
+        if limiter is None:
+            limiter = _limiters[host] = RateLimiter(*default_limits(host))
+        return limiter
+
+
+def rate_limit_stats() -> dict[str, dict[str, Any]]:
+    """Wait-time stats for every host seen so far."""
+    with _limiters_lock:
+        items = list(_limiters.items())
+    return {host: limiter.stats() for host, limiter in items}
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Retry-After is either seconds or an HTTP date; return seconds to wait (or None)."""
+    if not value:
+        return None
+    v = value.strip()
+    try:
+        return max(0.0, float(v))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(v).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def send_with_backoff(
+    send: Callable[[], Any],
+    url: str,
+    max_attempts: int = 5,
+    base_delay: float = 1.0,
+    max_delay: float = 30.0,
+) -> Any:
+    """
+    Call send() (one HTTP request; returns a requests/httpx response) through the host's limiter.
+
+    On 429/5xx, wait and retry: honor Retry-After when present (and pause the whole host), otherwise
+    jittered exponential backoff. The last response is returned as-is so callers can raise_for_status().
+    """
+    limiter = get_rate_limiter(url)
+    for attempt in range(1, max_attempts + 1):
+        limiter.acquire()
+        try:
+            response = send()
+        finally:
+            limiter.release()
+        if response.status_code not in RETRY_STATUSES or attempt >= max_attempts:
+            return response
+        retry_after = parse_retry_after(response.headers.get("Retry-After"))
+        if retry_after is not None:
+            limiter.pause(retry_after)
+            delay = retry_after
+        else:
+            cap = min(max_delay, base_delay * 2 ** (attempt - 1))
+            delay = cap / 2 + random.uniform(0, cap / 2)
+        time.sleep(delay)
+    return response
+
+
+# Hedged requests (opt-in, FIXER_HEDGE=1): when a chat call is still running after the stage's observed p95 latency,
+# send a duplicate (through the load balancer, so usually to another host when OLLAMA_HOSTS lists several), keep
+# whichever answers first and close the other's connection so Ollama stops generating. FIXER_HEDGE_DELAY sets a fixed
+# delay in seconds until FIXER_HEDGE_MIN_SAMPLES calls have been timed; hedge_summary_text() reports the hedge rate.
+T = TypeVar("T")
+
+
+class HedgeCancelled(Exception):
+    """Raised inside the losing attempt of a hedged call; never reaches the caller."""
+
+
+class HedgeAttempt:
+    """One try of a hedged call; register cleanup (e.g. client.close) to run if it loses."""
+
+    def __init__(self, index: int):
+        self.index = index
+        self.cancelled = False
+        self._callbacks: list[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    def on_cancel(self, callback: Callable[[], None]) -> None:
+        with self._lock:
+            if not self.cancelled:
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def cancel(self) -> None:
+        with self._lock:
+            self.cancelled = True
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:  # noqa: BLE001 — best-effort cleanup of the losing request
+                pass
+
+
+class HedgePolicy:
+    """Latency window for one stage; hedges after its `quantile` (0-100) latency and counts what happened."""
+
+    def __init__(
+        self,
+        quantile: float = 95.0,
+        min_samples: int = 5,
+        initial_delay: float | None = None,
+        window: int = 200,
+    ):
+        self.quantile = float(quantile)
+        self.min_samples = int(min_samples)
+        self.initial_delay = initial_delay
+        self.latencies: collections.deque[float] = collections.deque(maxlen=int(window))
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self._lock = threading.Lock()
+
+    def delay(self) -> float | None:
+        """Seconds to wait before hedging (None = don't hedge yet)."""
+        with self._lock:
+            if len(self.latencies) >= self.min_samples:
+                return _percentile(list(self.latencies), self.quantile)
+        return self.initial_delay
+
+    def record(self, seconds: float, hedged: bool, hedge_won: bool) -> None:
+        with self._lock:
+            self.latencies.append(float(seconds))
+            self.calls += 1
+            self.hedged += int(hedged)
+            self.hedge_wins += int(hedge_won)
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            lat = list(self.latencies)
+            calls, hedged, wins = self.calls, self.hedged, self.hedge_wins
+        return {
+            "calls": calls,
+            "hedged": hedged,
+            "hedge_rate": hedged / calls if calls else 0.0,
+            "hedge_wins": wins,
+            "p50_seconds": _percentile(lat, 50),
+            "p95_seconds": _percentile(lat, 95),
+            "p99_seconds": _percentile(lat, 99),
+        }
+
+
+def run_hedged(fn: Callable[[HedgeAttempt], T], policy: HedgePolicy) -> T:
+    """
+    Call fn(attempt); if it has not returned after policy.delay(), call fn again in parallel and return the
+    first success. The loser is cancelled. An error before the hedge fires is raised as-is.
+    """
+    delay = policy.delay()
+    t0 = time.perf_counter()
+    if delay is None:
+        out = fn(HedgeAttempt(0))
+        policy.record(time.perf_counter() - t0, hedged=False, hedge_won=False)
+        return out
+
+    executor = ThreadPoolExecutor(max_workers=2)
+    attempts = [HedgeAttempt(0)]
+    futures = [executor.submit(fn, attempts[0])]
+    try:
+        done, _ = wait(futures, timeout=delay)
+        if not done:
+            attempts.append(HedgeAttempt(1))
+            futures.append(executor.submit(fn, attempts[1]))
+        pending = set(futures)
+        winner = None
+        error: BaseException | None = None
+        while pending and winner is None:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                if fut.exception() is None:
+                    winner = fut
+                    break
+                error = error or fut.exception()
+        for fut, attempt in zip(futures, attempts):
+            if fut is not winner:
+                attempt.cancel()
+        if winner is None:
+            assert error is not None
+            raise error
+        hedged = len(futures) > 1
+        policy.record(time.perf_counter() - t0, hedged=hedged, hedge_won=hedged and winner is futures[1])
+        return winner.result()
+    finally:
+        executor.shutdown(wait=False)
+
+
+_hedge_policies: dict[str, HedgePolicy] = {}
+_hedge_lock = threading.Lock()
+
+
+def hedge_policy(stage: str | None = None) -> HedgePolicy:
+    """Process-wide policy per stage (latencies differ a lot between stages); settings from FIXER_HEDGE_* env."""
+    key = stage or "chat"
+    with _hedge_lock:
+        policy = _hedge_policies.get(key)
+        if policy is None:
+            delay = os.environ.get("FIXER_HEDGE_DELAY", "").strip()
+            policy = _hedge_policies[key] = HedgePolicy(
+                quantile=float(os.environ.get("FIXER_HEDGE_QUANTILE", "") or 95),
+                min_samples=int(os.environ.get("FIXER_HEDGE_MIN_SAMPLES", "") or 5),
+                initial_delay=float(delay) if delay else None,
+            )
+        return policy
+
+
+def hedge_summary_text() -> str:
+    """One line per stage that used hedging; empty when FIXER_HEDGE is off."""
+    with _hedge_lock:
+        items = list(_hedge_policies.items())
+    lines = []
+    for stage, policy in items:
+        st = policy.stats()
+        if not st["calls"]:
+            continue
+        lines.append(
+            f"🪁 Hedging [{stage}]: {st['hedged']}/{st['calls']} calls hedged ({st['hedge_rate']:.0%}), "
+            f"duplicate won {st['hedge_wins']} | p50 {st['p50_seconds']:.2f}s | p95 {st['p95_seconds']:.2f}s | "
+            f"p99 {st['p99_seconds']:.2f}s"
+        )
+    return "\n".join(lines)
+
+
+# Load balancing: OLLAMA_HOSTS may list several hosts ("http://a:11434,http://b:11434"); each chat call goes to the
+# healthy host with the fewest requests in flight, skipping hosts that keep failing or lack the model. OLLAMA_HOST
+# stays a single URL, because the ollama CLI and server read it too.
+
+
+def split_hosts(value: str) -> list[str]:
+    """'http://a:11434, http://b:11434' -> ['http://a:11434', 'http://b:11434']."""
+    return [h.strip().rstrip("/") for h in (value or "").split(",") if h.strip()]
+
+
+def ollama_hosts(base_url: str) -> list[str]:
+    """Hosts to send chat calls to: the OLLAMA_HOSTS list if set, else just base_url."""
+    return split_hosts(os.environ.get("OLLAMA_HOSTS", "")) or split_hosts(base_url)[:1]
+
+
+def _model_key(name: str) -> str:
+    """Ollama treats 'llama3.2' and 'llama3.2:latest' as the same model."""
+    n = (name or "").strip()
+    return n if ":" in n else f"{n}:latest"
+
+
+def is_endpoint_failure(exc: BaseException) -> bool:
+    """Connection errors, timeouts and 5xx count against a host; 4xx (bad request) and hedge losers do not."""
+    # GeneratorExit (a caller stopped reading a stream early), KeyboardInterrupt and
+    # SystemExit pass through route() too, but say nothing about the host's health
+    if not isinstance(exc, Exception):
+        return False
+    if isinstance(exc, HedgeCancelled):
+        return False
+    response = getattr(exc, "response", None)
+    status = getattr(response, "status_code", None)
+    if status is None:
+        return True
+    return status >= 500
+
+
+class Endpoint:
+    def __init__(self, host: str):
+        self.host = host
+        self.outstanding = 0
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.models: set[str] | None = None  # None = not fetched yet / unknown
+        self.models_fetched_at = 0.0
+
+
+class EndpointPool:
+    """
+    Route each request to the healthy host with the fewest requests in flight.
+
+    - Passive health: after `eject_after` consecutive failures a host is skipped for `eject_seconds`.
+    - Model awareness: `fetch_models(host)` (e.g. GET /api/tags) is cached for `models_ttl` seconds;
+      hosts known not to have the model are skipped while any other host has it.
+    """
+
+    def __init__(
+        self,
+        hosts: list[str],
+        fetch_models: Callable[[str], list[str]] | None = None,
+        eject_after: int = 3,
+        eject_seconds: float = 30.0,
+        models_ttl: float = 60.0,
+    ):
+        if not hosts:
+            raise ValueError("EndpointPool needs at least one host.")
+        self.endpoints = [Endpoint(h.rstrip("/")) for h in hosts]
+        self.fetch_models = fetch_models
+        self.eject_after = int(eject_after)
+        self.eject_seconds = float(eject_seconds)
+        self.models_ttl = float(models_ttl)
+        self._lock = threading.Lock()
+        self._rr = 0  # round-robin tie breaker
+
+    def _refresh_models(self, ep: Endpoint) -> None:
+        if self.fetch_models is None or time.monotonic() - ep.models_fetched_at < self.models_ttl:
+            return
+        ep.models_fetched_at = time.monotonic()
+        try:
+            ep.models = {_model_key(m) for m in self.fetch_models(ep.host)}
+        except Exception:  # noqa: BLE001 — an unreachable host is handled by passive ejection
+            ep.models = None
+
+    def _pick(self, model: str | None) -> Endpoint:
+        now = time.monotonic()
+        if model:
+            for ep in self.endpoints:
+                self._refresh_models(ep)
+        with self._lock:
+            healthy = [ep for ep in self.endpoints if ep.ejected_until <= now]
+            if not healthy:
+                # Everyone is ejected: try the host that comes back soonest rather than failing outright
+                healthy = [min(self.endpoints, key=lambda e: e.ejected_until)]
+            if model:
+                key = _model_key(model)
+                serving = [ep for ep in healthy if ep.models is None or key in ep.models]
+                healthy = serving or healthy
+            low = min(ep.outstanding for ep in healthy)
+            ties = [ep for ep in healthy if ep.outstanding == low]
+            ep = ties[self._rr % len(ties)]
+            self._rr += 1
+            ep.outstanding += 1
+            ep.requests += 1
+            return ep
+
+    def _done(self, ep: Endpoint, ok: bool) -> None:
+        with self._lock:
+            ep.outstanding -= 1
+            if ok:
+                ep.consecutive_failures = 0
+                return
+            ep.failures += 1
+            ep.consecutive_failures += 1
+            if ep.consecutive_failures >= self.eject_after:
+                ep.ejected_until = time.monotonic() + self.eject_seconds
+                ep.consecutive_failures = 0
+
+    @contextmanager
+    def route(self, model: str | None = None) -> Iterator[str]:
+        """with pool.route(model) as host: ... — host is released (and health recorded) on exit."""
+        ep = self._pick(model)
+        try:
+            yield ep.host
+        except BaseException as exc:
+            self._done(ep, ok=not is_endpoint_failure(exc))
+            raise
+        else:
+            self._done(ep, ok=True)
+
+    def stats(self) -> list[dict[str, Any]]:
+        now = time.monotonic()
+        with self._lock:
+            return [
+                {
+                    "host": ep.host,
+                    "outstanding": ep.outstanding,
+                    "requests": ep.requests,
+                    "failures": ep.failures,
+                    "ejected": ep.ejected_until > now,
+                    "models": sorted(ep.models) if ep.models is not None else None,
+                }
+                for ep in self.endpoints
+            ]
+
+
+_pools: dict[str, EndpointPool] = {}
+_pools_lock = threading.Lock()
+
+
+def pool_for(hosts_value: str, fetch_models: Callable[[str], list[str]] | None = None) -> EndpointPool:
+    """One shared pool per comma-separated host list, so every request in the process sees the same load."""
+    key = ",".join(split_hosts(hosts_value))
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = EndpointPool(split_hosts(hosts_value), fetch_models=fetch_models)
+        return pool
+
+
+# Warm-up for self-hosted Ollama: load OLLAMA_MODEL with an empty /api/generate request before the first chunk, so
+# chunk 1 does not pay the model load time. OLLAMA_WARMUP=auto (default) skips Ollama Cloud, whose models are always
+# loaded; OLLAMA_KEEP_ALIVE (e.g. 30m) is also sent with every chat call so the model stays loaded between chunks.
+_CLOUD_HOSTS = ("ollama.com",)
+
+
+def keep_alive_setting() -> str | None:
+    value = os.environ.get("OLLAMA_KEEP_ALIVE", "").strip()
+    return value or None
+
+
+def warm_up_enabled(base_url: str) -> bool:
+    raw = os.environ.get("OLLAMA_WARMUP", "auto").strip().lower()
+    if raw in ("0", "off", "false", "no"):
+        return False
+    if raw in ("1", "on", "true", "yes"):
+        return True
+    return any(not any(c in h for c in _CLOUD_HOSTS) for h in ollama_hosts(base_url))
+
+
+def warm_up_models(base_url: str, api_key: str, models: list[str], timeout: float = 300.0) -> list[dict[str, Any]]:
+    """
+    Load each model on each self-hosted host (see ollama_hosts()); [] when warm-up is off. Never raises.
+
+    load_seconds is Ollama's load_duration, reported apart from total_seconds (wall time), so model load
+    is not counted as inference time.
+    """
+    if not warm_up_enabled(base_url):
+        return []
+    headers = {"Content-Type": "application/json"}
+    if api_key:
+        headers["Authorization"] = f"Bearer {api_key}"
+    keep_alive = keep_alive_setting()
+    report: list[dict[str, Any]] = []
+    for host in ollama_hosts(base_url):
+        if any(c in host for c in _CLOUD_HOSTS):
+            continue
+        for model in models:
+            body: dict[str, Any] = {"model": model}
+            if keep_alive:
+                body["keep_alive"] = keep_alive
+            row: dict[str, Any] = {"host": host, "model": model, "ok": False, "load_seconds": None, "error": None}
+            t0 = time.perf_counter()
+            try:
+                resp = httpx.post(host + "/api/generate", headers=headers, json=body, timeout=timeout)
+                resp.raise_for_status()
+                row["load_seconds"] = (resp.json().get("load_duration") or 0) / 1e9
+                row["ok"] = True
+            except httpx.HTTPError as e:
+                row["error"] = str(e)
+            row["total_seconds"] = time.perf_counter() - t0
+            report.append(row)
+    return report
+
+
+def warm_up_summary(report: list[dict[str, Any]]) -> str:
+    """One line per warmed model, e.g. for the driver scripts' startup output."""
+    lines = []
+    for r in report:
+        if r["ok"]:
+            lines.append(f"🔥 Warm-up {r['model']} @ {r['host']}: load {r['load_seconds']:.2f}s, total {r['total_seconds']:.2f}s")
+        else:
+            lines.append(f"⚠️  Warm-up {r['model']} @ {r['host']} failed: {r['error']}")
+    return "\n".join(lines)
+
+
+# Model cascade: with FIXER_CASCADE_MODEL set (e.g. smollm2:135m), a script asks that small model first and re-sends
+# only the rows whose answer fails its check (missing, outside the closed vocabulary, low confidence) to OLLAMA_MODEL.
+# CascadeStats counts rows and calls per model so the summary shows the escalation rate and time per model.
+def cascade_models(primary_model: str) -> list[str]:
+    """[FIXER_CASCADE_MODEL, primary_model] (small to large), or just [primary_model] when no cascade is set."""
+    small = os.environ.get("FIXER_CASCADE_MODEL", "").strip()
+    if not small or small == primary_model:
+        return [primary_model]
+    return [small, primary_model]
+
+
+class CascadeStats:
+    """Thread-safe per-model counters for one cascade run (rows sent / accepted, calls, seconds)."""
+
+    def __init__(self, models: list[str]):
+        self.models = list(models)
+        self._lock = threading.Lock()
+        self.by_model: dict[str, dict[str, Any]] = {
+            m: {"calls": 0, "rows_sent": 0, "rows_accepted": 0, "seconds": 0.0} for m in self.models
+        }
+
+    def record(self, model: str, rows_sent: int, rows_accepted: int, seconds: float) -> None:
+        with self._lock:
+            s = self.by_model[model]
+            s["calls"] += 1
+            s["rows_sent"] += int(rows_sent)
+            s["rows_accepted"] += int(rows_accepted)
+            s["seconds"] += float(seconds)
+
+    def summary(self) -> dict[str, Any]:
+        with self._lock:
+            by_model = {m: dict(s) for m, s in self.by_model.items()}
+        rows = by_model[self.models[0]]["rows_sent"]
+        escalated = by_model[self.models[1]]["rows_sent"] if len(self.models) > 1 else 0
+        last = by_model[self.models[-1]]
+        return {
+            "models": list(self.models),
+            "by_model": by_model,
+            "rows": rows,
+            "escalated_rows": escalated,
+            "escalation_rate": escalated / rows if rows else 0.0,
+            "rejected_rows": last["rows_sent"] - last["rows_accepted"],
+        }
+
+
+def cascade_summary_text(stats: CascadeStats | None) -> str:
+    """Escalation rate plus calls / seconds per model; empty when no cascade ran."""
+    if stats is None or len(stats.models) < 2:
+        return ""
+    s = stats.summary()
+    per_model = ", ".join(
+        f"{m}: {b['calls']} calls / {b['seconds']:.1f}s" for m, b in s["by_model"].items()
+    )
+    return (
+        f"🪜 Cascade {' -> '.join(s['models'])}: {s['escalated_rows']}/{s['rows']} rows escalated "
+        f"({s['escalation_rate']:.0%}), {s['rejected_rows']} still failed the check | {per_model}"
+    )
+
+
+# Telemetry: every network /api/chat call (cache hits excluded) records Ollama's load / prompt / eval durations and
+# token counts plus client wall time in a ring buffer (OLLAMA_TELEMETRY_MAXLEN). OLLAMA_TELEMETRY_JSONL and
+# OLLAMA_TELEMETRY_SQLITE add file sinks; telemetry_summary() gives p50/p95, tokens/s and prompt tokens per stage.
+TELEMETRY_MAXLEN = int(os.getenv("OLLAMA_TELEMETRY_MAXLEN", "1000") or 1000)
+TELEMETRY_COLUMNS = (
+    "ts", "stage", "model", "host", "wall_seconds", "server_seconds", "load_seconds",
+    "prompt_tokens", "prompt_seconds", "output_tokens", "output_seconds", "tokens_per_second",
+)
+
+_stage: contextvars.ContextVar[str | None] = contextvars.ContextVar("telemetry_stage", default=None)
+
+
+def _percentile(values: list[float | None], q: float) -> float | None:
+    """Nearest-rank percentile (q in 0-100)."""
+    vals = sorted(v for v in values if v is not None)
+    if not vals:
+        return None
+    k = min(len(vals), max(1, math.ceil(q / 100 * len(vals))))
+    return vals[k - 1]
+
+
+class Telemetry:
+    """Ring buffer of per-call records; optionally appended to a JSONL file and/or a SQLite table."""
+
+    def __init__(self, maxlen: int = TELEMETRY_MAXLEN, jsonl_path: str | None = None, sqlite_path: str | None = None):
+        self.buffer: collections.deque[dict[str, Any]] = collections.deque(maxlen=maxlen)
+        self.jsonl_path = jsonl_path
+        self._lock = threading.Lock()
+        self._db: sqlite3.Connection | None = None
+        if sqlite_path:
+            self._db = sqlite3.connect(sqlite_path, check_same_thread=False)
+            self._db.execute(f"CREATE TABLE IF NOT EXISTS telemetry ({', '.join(TELEMETRY_COLUMNS)})")
+            self._db.commit()
+
+    def record(
+        self,
+        result: dict[str, Any],
+        wall_seconds: float,
+        model: str | None = None,
+        host: str | None = None,
+        stage: str | None = None,
+    ) -> dict[str, Any]:
+        """Store one /api/chat response's metadata plus client wall time; returns the record."""
+
+        def seconds(key: str) -> float | None:
+            v = result.get(key)
+            return v / 1e9 if v is not None else None
+
+        output_tokens = result.get("eval_count")
+        output_seconds = seconds("eval_duration")
+        row: dict[str, Any] = {
+            "ts": time.time(),
+            "stage": stage if stage is not None else _stage.get(),
+            "model": model or result.get("model"),
+            "host": host,
+            "wall_seconds": wall_seconds,
+            "server_seconds": seconds("total_duration"),
+            "load_seconds": seconds("load_duration"),
+            "prompt_tokens": result.get("prompt_eval_count"),
+            "prompt_seconds": seconds("prompt_eval_duration"),
+            "output_tokens": output_tokens,
+            "output_seconds": output_seconds,
+            "tokens_per_second": output_tokens / output_seconds if output_tokens and output_seconds else None,
+        }
+        with self._lock:
+            self.buffer.append(row)
+            if self.jsonl_path:
+                with open(self.jsonl_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(row) + "\n")
+            if self._db is not None:
+                marks = ", ".join("?" for _ in TELEMETRY_COLUMNS)
+                self._db.execute(f"INSERT INTO telemetry VALUES ({marks})", [row[c] for c in TELEMETRY_COLUMNS])
+                self._db.commit()
+        return row
+
+    def records(self) -> list[dict[str, Any]]:
+        with self._lock:
+            return list(self.buffer)
+
+    def summary(self, by: str | None = "stage") -> dict[Any, dict[str, Any]]:
+        """Per group (stage / model / host, or None = all): calls, p50/p95 wall, tokens/s, prompt tokens, load time."""
+        groups: dict[Any, list[dict[str, Any]]] = {}
+        for row in self.records():
+            groups.setdefault(row.get(by) if by else "all", []).append(row)
+        out: dict[Any, dict[str, Any]] = {}
+        for key, rows in groups.items():
+            wall = [r["wall_seconds"] for r in rows]
+            prompt = [r["prompt_tokens"] or 0 for r in rows]
+            out_tokens = sum(r["output_tokens"] or 0 for r in rows)
+            out_seconds = sum(r["output_seconds"] or 0 for r in rows)
+            out[key] = {
+                "calls": len(rows),
+                "wall_seconds": sum(wall),
+                "p50_seconds": _percentile(wall, 50),
+                "p95_seconds": _percentile(wall, 95),
+                "tokens_per_second": out_tokens / out_seconds if out_seconds else None,
+                "prompt_tokens": sum(prompt),
+                "mean_prompt_tokens": sum(prompt) / len(rows),
+                "output_tokens": out_tokens,
+                "load_seconds": sum(r["load_seconds"] or 0 for r in rows),
+            }
+        return out
+
+
+# Process-wide buffer; OLLAMA_TELEMETRY_JSONL / OLLAMA_TELEMETRY_SQLITE add file sinks.
+TELEMETRY = Telemetry(
+    jsonl_path=os.getenv("OLLAMA_TELEMETRY_JSONL") or None,
+    sqlite_path=os.getenv("OLLAMA_TELEMETRY_SQLITE") or None,
+)
+
+
+@contextmanager
+def telemetry_stage(name: str) -> Iterator[None]:
+    """Label every call recorded inside the block (e.g. with telemetry_stage("prefetch"): ...)."""
+    token = _stage.set(name)
+    try:
+        yield
+    finally:
+        _stage.reset(token)
+
+
+def record_telemetry(
+    result: dict[str, Any],
+    wall_seconds: float,
+    model: str | None = None,
+    host: str | None = None,
+    stage: str | None = None,
+) -> dict[str, Any]:
+    return TELEMETRY.record(result, wall_seconds, model=model, host=host, stage=stage)
+
+
+def telemetry_summary(by: str | None = "stage") -> dict[Any, dict[str, Any]]:
+    return TELEMETRY.summary(by=by)
+
+
+def telemetry_summary_text() -> str:
+    """One line per stage for the driver scripts' summaries; empty when no calls were recorded."""
+    lines = []
+    for stage, s in telemetry_summary().items():
+        tps = f"{s['tokens_per_second']:.1f} tok/s" if s["tokens_per_second"] else "n/a tok/s"
+        lines.append(
+            f"⏱️  LLM calls [{stage}]: {s['calls']} | p50 {s['p50_seconds']:.2f}s | p95 {s['p95_seconds']:.2f}s | "
+            f"{tps} | {s['mean_prompt_tokens']:.0f} prompt tokens/call | load {s['load_seconds']:.2f}s"
+        )
+    return "\n".join(lines)
+
+
+# Opt-in response cache: FIXER_CACHE=1 stores each /api/chat response in a local SQLite file, keyed by a hash
+# of the request (model, messages, tools, format, options). Reruns on unchanged chunks then skip the LLM call.
+# FIXER_CACHE_PATH (default output/llm_cache.sqlite), FIXER_CACHE_MAX_ENTRIES, FIXER_CACHE_MAX_MB bound the store;
+# FIXER_CACHE_BYPASS=1 ignores stored answers but still records fresh ones.
+
+
+def chat_cache_key(
+    model: str,
+    messages: list[dict[str, Any]],
+    tools: list[dict[str, Any]] | None,
+    format: str | None,
+    options: dict[str, Any] | None,
+) -> str:
+    """Content-addressed key: sha256 of the canonical JSON of everything that shapes the reply."""
+    payload = {"model": model, "messages": messages, "tools": tools or None, "format": format, "options": options}
+    canon = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.sha256(canon.encode("utf-8")).hexdigest()
+
+
+class ChatCache:
+    """SQLite store of chat responses with least-recently-used eviction by entry count and total bytes."""
+
+    def __init__(self, path: str | Path, max_entries: int = 5000, max_bytes: int = 200 * 1024 * 1024) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = int(max_entries)
+        self.max_bytes = int(max_bytes)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        # One connection shared by chunk worker threads; the lock serializes access.
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chat_cache ("
+            "key TEXT PRIMARY KEY, response TEXT NOT NULL, nbytes INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> dict[str, Any] | None:
+        with self._lock:
+            row = self._conn.execute("SELECT response FROM chat_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE chat_cache SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, data: dict[str, Any]) -> None:
+        text = json.dumps(data, ensure_ascii=False)
+        nbytes = len(text.encode("utf-8"))
+        if nbytes > self.max_bytes:
+            return
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO chat_cache (key, response, nbytes, last_used) VALUES (?, ?, ?, ?)",
+                (key, text, nbytes, time.time()),
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        """Drop least-recently-used rows until both the entry and byte limits hold (caller holds the lock)."""
+        while True:
+            n, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(nbytes), 0) FROM chat_cache").fetchone()
+            if n <= self.max_entries and total <= self.max_bytes:
+                return
+            oldest = self._conn.execute("SELECT key FROM chat_cache ORDER BY last_used ASC LIMIT 1").fetchone()
+            if oldest is None:
+                return
+            self._conn.execute("DELETE FROM chat_cache WHERE key = ?", (oldest[0],))
+            self.evictions += 1
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            n, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(nbytes), 0) FROM chat_cache").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": int(n),
+            "bytes": int(total),
+            "path": str(self.path),
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_default_cache: ChatCache | None = None
+_default_cache_lock = threading.Lock()
+
+
+def _env_flag(name: str) -> bool:
+    return os.environ.get(name, "").strip().lower() in ("1", "true", "yes", "on")
+
+
+def default_chat_cache() -> ChatCache | None:
+    """Process-wide cache from FIXER_CACHE* env vars, or None when caching is off."""
+    global _default_cache
+    if not _env_flag("FIXER_CACHE"):
+        return None
+    with _default_cache_lock:
+        if _default_cache is None:
+            raw_path = os.environ.get("FIXER_CACHE_PATH", "").strip()
+            path = Path(raw_path) if raw_path else Path(__file__).resolve().parent / "output" / "llm_cache.sqlite"
+            n = os.environ.get("FIXER_CACHE_MAX_ENTRIES", "").strip()
+            mb = os.environ.get("FIXER_CACHE_MAX_MB", "").strip()
+            _default_cache = ChatCache(
+                path,
+                max_entries=int(n) if n.isdigit() else 5000,
+                max_bytes=(int(mb) if mb.isdigit() else 200) * 1024 * 1024,
+            )
+        return _default_cache
+
+
+def chat_cache_summary() -> str:
+    """One-line hit/miss summary for driver scripts ('' when caching is off)."""
+    cache = default_chat_cache()
+    if cache is None:
+        return ""
+    st = cache.stats()
+    return (
+        f"💽 LLM cache: {st['hits']} hits / {st['misses']} misses "
+        f"({st['hit_rate']:.0%}), {st['entries']} entries, {st['evictions']} evicted"
+    )
+
+
 def ollama_chat_once(
     base_url: str,
     api_key: str | None,
@@ -56,9 +971,20 @@ def ollama_chat_once(
     tools: list[dict[str, Any]] | None = None,
     format: str | None = None,
     max_output_tokens: int | None = None,
+    cache: ChatCache | None = None,
+    bypass_cache: bool | None = None,
+    stage: str | None = None,
+    hedge: bool | None = None,
 ) -> dict[str, Any]:
-    """Single chat completion. Pass tools for tool-calling; pass format='json' for JSON mode."""
-    url = base_url.rstrip("/") + "/api/chat"
+    """
+    Single chat completion. Pass tools for tool-calling; pass format='json' for JSON mode.
+
+    cache defaults to default_chat_cache() (FIXER_CACHE=1). bypass_cache skips the lookup
+    (default: FIXER_CACHE_BYPASS) but still stores the fresh reply. stage labels the call in telemetry.
+    hedge (default: FIXER_HEDGE) sends a duplicate when the call outlives the stage's p95; see run_hedged().
+    """
+    # base_url is one host (OLLAMA_HOST); several hosts come from OLLAMA_HOSTS, see ollama_hosts()
+    url = base_url.strip().rstrip("/") + "/api/chat"
     body: dict[str, Any] = {
         "model": model,
         "messages": messages,
@@ -70,16 +996,63 @@ def ollama_chat_once(
         body["format"] = str(format)
     if max_output_tokens is not None:
         body["options"] = {"num_predict": int(max_output_tokens)}
+    keep_alive = keep_alive_setting()
+    if keep_alive:
+        body["keep_alive"] = keep_alive
 
-    headers = {"Content-Type": "application/json"}
-    ak = (api_key or "").strip()
-    if ak:
-        headers["Authorization"] = f"Bearer {ak}"
-
-    with httpx.Client(timeout=120.0) as client:
-        resp = client.post(url, json=body, headers=headers)
-        resp.raise_for_status()
-        data = resp.json()
+    if cache is None:
+        cache = default_chat_cache()
+    if bypass_cache is None:
+        bypass_cache = _env_flag("FIXER_CACHE_BYPASS")
+    key = None
+    data = None
+    if cache is not None:
+        key = chat_cache_key(model, messages, body.get("tools"), body.get("format"), body.get("options"))
+        if not bypass_cache:
+            data = cache.get(key)
+
+    if data is None:
+        headers = {"Content-Type": "application/json"}
+        ak = (api_key or "").strip()
+        if ak:
+            headers["Authorization"] = f"Bearer {ak}"
+
+        def post(chat_url: str, attempt: HedgeAttempt | None = None) -> dict[str, Any]:
+            with httpx.Client(timeout=120.0) as client:
+                if attempt is not None:
+                    # Losing a hedge closes this client, which aborts the request mid-flight
+                    attempt.on_cancel(client.close)
+                # Shared per-host limiter + Retry-After-aware backoff, so parallel chunks don't trip 429s
+                t0 = time.perf_counter()
+                try:
+                    resp = send_with_backoff(lambda: client.post(chat_url, json=body, headers=headers), chat_url)
+                    resp.raise_for_status()
+                    out = resp.json()
+                except Exception as e:
+                    if attempt is not None and attempt.cancelled:
+                        raise HedgeCancelled(chat_url) from e
+                    raise
+                record_telemetry(out, time.perf_counter() - t0, model=model, host=chat_url, stage=stage)
+                return out
+
+        def send(attempt: HedgeAttempt | None = None) -> dict[str, Any]:
+            hosts = ollama_hosts(base_url)
+            if len(hosts) > 1:
+                def fetch_models(host: str) -> list[str]:
+                    r = httpx.get(host + "/api/tags", headers=headers, timeout=10.0)
+                    r.raise_for_status()
+                    return [m.get("name", "") for m in r.json().get("models", [])]
+
+                # A hedge's duplicate is routed separately, so it lands on the least busy (usually other) host
+                with pool_for(",".join(hosts), fetch_models=fetch_models).route(model) as host:
+                    return post(host + "/api/chat", attempt)
+            return post(hosts[0] + "/api/chat" if hosts else url, attempt)
+
+        if hedge is None:
+            hedge = _env_flag("FIXER_HEDGE")
+        data = run_hedged(send, hedge_policy(stage)) if hedge else send()
+        if cache is not None and key is not None:
+            cache.put(key, data)
 
     msg = data.get("message") or {}
     content = msg.get("content")
@@ -0,0 +1,61 @@
+# Offline tests for the fixer LLM response cache (no Ollama / no network)
+# Run: python 10_data_management/fixer/tests/test_fixer_cache.py
+
+from __future__ import annotations
+
+import sys
+import tempfile
+from pathlib import Path
+
+fixer_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(fixer_root))
+
+from functions import ChatCache, chat_cache_key
+
+
+def main() -> None:
+    msgs = [{"role": "user", "content": "hi"}]
+
+    print("test_fixer_cache: chat_cache_key ...")
+    k1 = chat_cache_key("m", msgs, None, None, None)
+    assert k1 == chat_cache_key("m", [{"content": "hi", "role": "user"}], [], None, None)
+    assert k1 != chat_cache_key("m2", msgs, None, None, None)
+    assert k1 != chat_cache_key("m", msgs, None, "json", None)
+    assert k1 != chat_cache_key("m", msgs, None, None, {"num_predict": 10})
+    print("   OK")
+
+    with tempfile.TemporaryDirectory() as td:
+        print("test_fixer_cache: get/put + counters ...")
+        c = ChatCache(Path(td) / "c.sqlite", max_entries=2)
+        assert c.get("a") is None
+        c.put("a", {"message": {"content": "A"}})
+        assert c.get("a") == {"message": {"content": "A"}}
+        st = c.stats()
+        assert st["hits"] == 1 and st["misses"] == 1 and st["entries"] == 1
+        print("   OK")
+
+        print("test_fixer_cache: LRU eviction by count ...")
+        c.put("b", {"message": {"content": "B"}})
+        c.get("a")  # touch a so b is least recently used
+        c.put("c", {"message": {"content": "C"}})
+        assert c.get("b") is None and c.get("a") is not None and c.get("c") is not None
+        assert c.stats()["evictions"] == 1
+        c.close()
+        print("   OK")
+
+        print("test_fixer_cache: eviction by bytes + persistence ...")
+        c2 = ChatCache(Path(td) / "d.sqlite", max_entries=100, max_bytes=120)
+        c2.put("x", {"content": "x" * 50})
+        c2.put("y", {"content": "y" * 50})
+        assert c2.stats()["bytes"] <= 120 and c2.stats()["entries"] == 1
+        c2.close()
+        c3 = ChatCache(Path(td) / "d.sqlite", max_entries=100, max_bytes=120)
+        assert c3.get("y") == {"content": "y" * 50}
+        c3.close()
+        print("   OK")
+
+    print("test_fixer_cache: all passed.")
+
+
+if __name__ == "__main__":
+    main()
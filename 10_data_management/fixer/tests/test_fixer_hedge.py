@@ -0,0 +1,81 @@
+# Offline tests for hedged chat calls (no Ollama / no network)
+# Run: python 10_data_management/fixer/tests/test_fixer_hedge.py
+
+from __future__ import annotations
+
+import sys
+import threading
+from pathlib import Path
+
+fixer_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(fixer_root))
+
+from functions import HedgeAttempt, HedgeCancelled, HedgePolicy, is_endpoint_failure, run_hedged
+
+
+def sleeper(delays: dict[int, float], log: list[int]):
+    """fn(attempt) that waits delays[attempt.index] seconds unless cancelled first."""
+
+    def fn(attempt: HedgeAttempt) -> int:
+        log.append(attempt.index)
+        cancelled = threading.Event()
+        attempt.on_cancel(cancelled.set)
+        if cancelled.wait(delays[attempt.index]):
+            raise HedgeCancelled()
+        return attempt.index
+
+    return fn
+
+
+def main() -> None:
+    print("test_fixer_hedge: no hedge before enough samples ...")
+    p = HedgePolicy(min_samples=3)
+    log: list[int] = []
+    assert p.delay() is None
+    assert run_hedged(sleeper({0: 0.01}, log), p) == 0
+    assert log == [0] and p.stats()["calls"] == 1 and p.stats()["hedged"] == 0
+    print("   OK")
+
+    print("test_fixer_hedge: slow primary loses to the duplicate ...")
+    p = HedgePolicy(min_samples=100, initial_delay=0.05)
+    log = []
+    assert run_hedged(sleeper({0: 2.0, 1: 0.01}, log), p) == 1
+    st = p.stats()
+    assert log == [0, 1] and st["hedged"] == 1 and st["hedge_wins"] == 1
+    assert st["p99_seconds"] < 1.0
+    print("   OK")
+
+    print("test_fixer_hedge: fast primary never hedges ...")
+    log = []
+    assert run_hedged(sleeper({0: 0.0, 1: 0.0}, log), p) == 0
+    assert log == [0] and p.stats()["hedged"] == 1
+    print("   OK")
+
+    print("test_fixer_hedge: delay follows the observed p95 ...")
+    p = HedgePolicy(quantile=95, min_samples=3)
+    for s in (0.1, 0.2, 0.3, 0.4):
+        p.record(s, hedged=False, hedge_won=False)
+    assert p.delay() == 0.4
+    print("   OK")
+
+    print("test_fixer_hedge: errors before the hedge are raised; losers and early stops are not endpoint failures ...")
+
+    def boom(attempt: HedgeAttempt) -> int:
+        raise ValueError("bad request")
+
+    try:
+        run_hedged(boom, HedgePolicy(initial_delay=1.0))
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("expected ValueError")
+    assert not is_endpoint_failure(HedgeCancelled())
+    assert not is_endpoint_failure(GeneratorExit()) and not is_endpoint_failure(KeyboardInterrupt())
+    assert is_endpoint_failure(ConnectionError())
+    print("   OK")
+
+    print("test_fixer_hedge: all passed.")
+
+
+if __name__ == "__main__":
+    main()
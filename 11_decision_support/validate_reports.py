@@ -18,6 +18,7 @@ import os
 import json
 import re
 import time
+from collections import deque
 import requests
 import pandas as pd
 import matplotlib
@@ -26,8 +27,28 @@ import matplotlib.pyplot as plt
 from scipy.stats import bartlett
 import pingouin as pg
 
+
+def normalize_ollama_host(value, default_port=11434):
+    """
+    Turn an OLLAMA_HOST setting into a URL we can send requests to.
+    "0.0.0.0:11434" (the address `ollama serve` listens on) -> "http://localhost:11434",
+    "mybox" -> "http://mybox:11434", "https://ollama.com" stays as it is.
+    """
+    value = (value or "").strip().rstrip("/")
+    if not value:
+        return None
+    if "://" not in value:
+        value = "http://" + value
+        if ":" not in value.split("://", 1)[1]:
+            value += f":{default_port}"
+    for wildcard in ("0.0.0.0", "[::]"):
+        value = value.replace(f"://{wildcard}", "://localhost")
+    return value
+
+
 # Ollama local configuration (no API key required)
-OLLAMA_HOST  = "http://localhost:11434"
+# Set OLLAMA_HOST to use another server; "0.0.0.0:11434" (what `ollama serve` binds to) means this machine
+OLLAMA_HOST  = normalize_ollama_host(os.getenv("OLLAMA_HOST")) or "http://localhost:11434"
 OLLAMA_MODEL = "llama3.2:latest"
 
 # Source data the reports are supposed to summarise
@@ -46,6 +67,11 @@ TOTAL         | 5,232,600    | 100.0%\
 OUTPUT_DIR = os.path.join(os.path.dirname(__file__), "data")
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
+# Per-call telemetry: Ollama's token counts + durations (ns) and our wall time,
+# kept for the last 1000 calls and appended to a JSONL file.
+TELEMETRY = deque(maxlen=1000)
+TELEMETRY_PATH = os.path.join(OUTPUT_DIR, "ollama_telemetry.jsonl")
+
 # ── 1. Generation Prompts ─────────────────────────────────────────────────────
 #
 # Three prompts that vary in instruction specificity and style.
@@ -74,7 +100,42 @@ GENERATION_PROMPTS = {
     ),
 }
 
-def _ollama_chat(messages: list, use_json: bool = False) -> str:
+def _record_telemetry(data: dict, wall_seconds: float, stage: str) -> None:
+    ns = lambda k: data[k] / 1e9 if data.get(k) is not None else None
+    row = {
+        "ts":             time.time(),
+        "stage":          stage,
+        "model":          data.get("model", OLLAMA_MODEL),
+        "wall_seconds":   wall_seconds,
+        "server_seconds": ns("total_duration"),
+        "load_seconds":   ns("load_duration"),
+        "prompt_tokens":  data.get("prompt_eval_count"),
+        "prompt_seconds": ns("prompt_eval_duration"),
+        "output_tokens":  data.get("eval_count"),
+        "output_seconds": ns("eval_duration"),
+    }
+    TELEMETRY.append(row)
+    with open(TELEMETRY_PATH, "a", encoding="utf-8") as f:
+        f.write(json.dumps(row) + "\n")
+
+def telemetry_summary() -> pd.DataFrame:
+    """p50/p95 latency, tokens/s and prompt tokens per stage."""
+    t = pd.DataFrame(list(TELEMETRY))
+    if t.empty:
+        return t
+    g = t.groupby("stage")
+    out = pd.DataFrame({
+        "calls":              g.size(),
+        "wall_total_s":       g["wall_seconds"].sum(),
+        "p50_s":              g["wall_seconds"].quantile(0.50),
+        "p95_s":              g["wall_seconds"].quantile(0.95),
+        "tokens_per_s":       g["output_tokens"].sum() / g["output_seconds"].sum(),
+        "mean_prompt_tokens": g["prompt_tokens"].mean(),
+        "load_total_s":       g["load_seconds"].sum(),
+    })
+    return out.round(3)
+
+def _ollama_chat(messages: list, use_json: bool = False, stage: str = "chat") -> str:
     body = {
         "model":    OLLAMA_MODEL,
         "messages": messages,
@@ -82,16 +143,19 @@ def _ollama_chat(messages: list, use_json: bool = False) -> str:
     }
     if use_json:
         body["format"] = "json"
+    t0 = time.perf_counter()
     resp = requests.post(f"{OLLAMA_HOST}/api/chat", json=body, timeout=120)
     resp.raise_for_status()
-    return resp.json()["message"]["content"]
+    data = resp.json()
+    _record_telemetry(data, time.perf_counter() - t0, stage)
+    return data["message"]["content"]
 
 def generate_report(prompt_text: str) -> str:
     messages = [
         {"role": "system", "content": prompt_text},
         {"role": "user",   "content": f"Source Data:\n{SOURCE_DATA}\n\nWrite the paragraph now."},
     ]
-    return _ollama_chat(messages).strip()
+    return _ollama_chat(messages, stage="generate").strip()
 
 # ── 2. Custom Validation Criteria ─────────────────────────────────────────────
 #
@@ -156,7 +220,7 @@ def validate_report(report_text: str) -> dict:
         {"role": "system", "content": VALIDATOR_SYSTEM},
         {"role": "user",   "content": prompt},
     ]
-    raw = _ollama_chat(messages, use_json=True)
+    raw = _ollama_chat(messages, use_json=True, stage="validate")
     # extract JSON if model wraps it in text
     m = re.search(r"\{.*\}", raw, re.DOTALL)
     data = json.loads(m.group(0) if m else raw)
@@ -188,6 +252,11 @@ scores_path = os.path.join(OUTPUT_DIR, "validation_scores.csv")
 df.to_csv(scores_path, index=False)
 print(f"\n✅  Scores saved → {scores_path}")
 
+# Where did the time go? Generation vs validation calls
+print("\nOllama call telemetry by stage:")
+print(telemetry_summary().to_string())
+print(f"✅  Per-call telemetry appended → {TELEMETRY_PATH}")
+
 # ── 4. Descriptive Statistics ─────────────────────────────────────────────────
 
 print("\n\n══════════════════════════════════════════")
@@ -0,0 +1,257 @@
+# bench_clients.py
+# Benchmark: Every Chat Helper in the Repo, Side by Side
+# Pairs with 06_agents, 07_rag, 08_function_calling, 09_text_analysis,
+# 10_data_management and 11_decision_support
+# Tim Fraser
+
+# The course has several hand-written wrappers around Ollama's /api/chat.
+# They all do the same job, but differ in HTTP client, connection reuse,
+# readiness checks, rate limiting and telemetry. This script sends the same
+# batch of calls through each one at a few fixed concurrency levels, against
+# a mock Ollama server running in its own process, and reports:
+#   - throughput (requests/second)
+#   - p50 / p99 latency
+#   - client CPU time per request (our process only; the mock is separate)
+#   - peak Python memory allocated during a batch (tracemalloc)
+# Every run is appended to benchmarks/results/bench_clients.jsonl with the git
+# commit, and compared with the last run from a different commit, so a
+# regression shows up as soon as it lands.
+# Run from the repo root:
+# python benchmarks/bench_clients.py --calls 200 --concurrency 1,4,16
+
+# 0. SETUP ###################################
+
+import argparse  # for command line options
+import json      # for the results file
+import os        # for pointing the helpers at the mock
+import platform  # for recording the Python version
+import sys
+import tempfile  # for throwaway telemetry files
+import time      # for timing
+import tracemalloc  # for peak memory
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from common import REPO_ROOT, git_revision, load_functions, load_module, percentile, start_mock_process
+
+RESULTS_PATH = Path(__file__).resolve().parent / "results" / "bench_clients.jsonl"
+MODEL = "smollm2:1.7b"
+# Every model a wrapper asks for, so readiness checks against /api/tags pass
+MOCK_MODELS = "smollm2:1.7b,smollm2:135m,llama3.2:latest"
+
+
+def messages_for(i):
+    # A different prompt per call, so no wrapper can answer from a cache
+    return [{"role": "user", "content": f"Say ok ({i})"}]
+
+
+# 1. CLIENTS ###################################
+
+# Each builder loads one wrapper and returns call(i), which makes one chat request.
+
+def build_agent(folder, name):
+    def build(url):
+        fn = load_module(f"{folder}/functions.py", name)
+        return lambda i: fn.agent(messages=messages_for(i), model=MODEL)
+    return build
+
+
+def build_fixer(url):
+    fx = load_module("10_data_management/fixer/functions.py", "bench_fixer")
+    return lambda i: fx.ollama_chat_once(url, None, MODEL, messages_for(i))
+
+
+def build_agentpy(url):
+    import importlib
+
+    sys.path.insert(0, str(REPO_ROOT / "10_data_management" / "agentpy"))
+    import httpx
+
+    loop = importlib.import_module("app.loop")
+    # One client for the whole batch, like run_research_loop()
+    client = httpx.Client(timeout=120.0)
+    return lambda i: loop._chat_once(client, url, "", MODEL, messages_for(i), None, [])
+
+
+def build_quality_control(url):
+    qc = load_functions("09_text_analysis/02_ai_quality_control.py", ["query_ai_quality_control"], "bench_qc")
+    return lambda i: qc.query_ai_quality_control(f"Rate this report ({i})")
+
+
+def build_validate_reports(url):
+    vr = load_functions("11_decision_support/validate_reports.py", ["_ollama_chat"], "bench_validate")
+    # Keep the benchmark's calls out of 11_decision_support/data/ollama_telemetry.jsonl
+    vr.TELEMETRY_PATH = os.path.join(tempfile.mkdtemp(), "ollama_telemetry.jsonl")
+    return lambda i: vr._ollama_chat(messages_for(i))
+
+
+def build_parallel_queries(url):
+    pq = load_functions("06_agents/07_parallel_queries.py", ["req_perform"], "bench_parallel_queries")
+    return lambda i: pq.req_perform(f"great product ({i})", "Label the sentiment.", MODEL)
+
+
+CLIENTS = {
+    "06 agent()": build_agent("06_agents", "bench_agents_06"),
+    "07 agent()": build_agent("07_rag", "bench_rag_07"),
+    "08 agent()": build_agent("08_function_calling", "bench_fc_08"),
+    "fixer ollama_chat_once": build_fixer,
+    "agentpy _chat_once": build_agentpy,
+    "09 query_ai_quality_control": build_quality_control,
+    "11 _ollama_chat": build_validate_reports,
+    "07_parallel_queries req_perform": build_parallel_queries,
+}
+
+
+# 2. MEASUREMENT ###################################
+
+def run_batch(call, calls, concurrency):
+    """Send `calls` requests from `concurrency` threads; return (latencies, errors, wall seconds)."""
+    def timed(i):
+        t0 = time.perf_counter()
+        try:
+            call(i)
+        except Exception:  # noqa: BLE001 — counted, not raised, so one bad call doesn't end the run
+            return None
+        return time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(timed, range(calls)))
+    latencies = [r for r in results if r is not None]
+    return latencies, len(results) - len(latencies), time.perf_counter() - t0
+
+
+def measure(call, calls, concurrency):
+    """Throughput, latency and CPU from one batch; peak memory from a second, traced batch."""
+    cpu0 = time.process_time()
+    latencies, errors, seconds = run_batch(call, calls, concurrency)
+    cpu = time.process_time() - cpu0
+
+    # tracemalloc slows every allocation, so it gets its own (shorter) batch
+    tracemalloc.start()
+    run_batch(call, max(concurrency, calls // 4), concurrency)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    ms = [s * 1000 for s in latencies]
+    return {
+        "rps": len(latencies) / seconds if seconds else 0.0,
+        "p50_ms": percentile(ms, 50),
+        "p99_ms": percentile(ms, 99),
+        "cpu_ms_per_call": cpu * 1000 / calls,
+        "peak_kib": peak / 1024,
+        "errors": errors,
+    }
+
+
+# 3. RESULTS ###################################
+
+def load_results(path):
+    if not path.exists():
+        return []
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def previous_run(history, row):
+    """Latest saved row for the same client + settings from a different commit."""
+    same = ("client", "concurrency", "calls", "latency")
+    for old in reversed(history):
+        if all(old.get(k) == row[k] for k in same) and old.get("commit") != row["commit"]:
+            return old
+    return None
+
+
+def compare(row, old, threshold):
+    """'' or a short note like 'rps -18% vs 1a2b3c4 ⚠️' (⚠️ when worse than threshold)."""
+    if old is None:
+        return ""
+    notes, worse = [], False
+    for key, higher_is_better in (("rps", True), ("p99_ms", False), ("cpu_ms_per_call", False)):
+        if not old.get(key):
+            continue
+        change = (row[key] - old[key]) / old[key]
+        worse |= (change < -threshold) if higher_is_better else (change > threshold)
+        notes.append(f"{key} {change:+.0%}")
+    return f"{', '.join(notes)} vs {old['commit']}" + (" ⚠️" if worse else "")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark every chat helper against a mock Ollama server.")
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--concurrency", default="1,4,16", help="comma-separated thread counts")
+    parser.add_argument("--latency", type=float, default=0.02, help="mock model seconds per call")
+    parser.add_argument("--clients", default="", help="comma-separated substrings to run only some clients")
+    parser.add_argument("--threshold", type=float, default=0.10, help="flag changes worse than this share")
+    parser.add_argument("--results", default=str(RESULTS_PATH))
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args()
+    levels = [int(c) for c in args.concurrency.split(",") if c.strip()]
+    wanted = [w.strip().lower() for w in args.clients.split(",") if w.strip()]
+
+    proc, url = start_mock_process("--latency", args.latency, "--models", MOCK_MODELS, "--tool-mode", "none")
+    # Point every helper at the mock before loading it (they read these at import time):
+    # no client-side rate limiting, no response cache, no telemetry files
+    os.environ["OLLAMA_HOST"] = url
+    os.environ["OLLAMA_RATE_LIMIT_RPS"] = "0"
+    os.environ["OLLAMA_MAX_CONCURRENT"] = str(max(levels) * 2)
+    os.environ["FIXER_CACHE"] = "0"
+    os.environ["OLLAMA_WARMUP"] = "0"
+    for name in ("OLLAMA_HOSTS", "OLLAMA_TELEMETRY_JSONL", "OLLAMA_TELEMETRY_SQLITE"):
+        os.environ.pop(name, None)
+
+    commit, dirty = git_revision()
+    results_path = Path(args.results)
+    history = load_results(results_path)
+    rows = []
+
+    print(f"\nbench_clients | {args.calls} calls per level, concurrency {levels}, "
+          f"{args.latency * 1000:.0f}ms mock latency, commit {commit}{' (dirty)' if dirty else ''}")
+    print(f"   {'client':<32} {'conc':>4} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} "
+          f"{'cpu ms':>7} {'peak KiB':>9} {'err':>4}")
+    try:
+        for label, build in CLIENTS.items():
+            if wanted and not any(w in label.lower() for w in wanted):
+                continue
+            try:
+                call = build(url)
+            except ImportError as e:
+                # e.g. agentpy needs crewai_tools; report it and keep going
+                print(f"   {label:<32} skipped: {e}")
+                continue
+            try:
+                call(-1)  # warm up: connection pools, readiness probes, lazy imports
+            except Exception as e:  # noqa: BLE001
+                print(f"   {label:<32} failed: {e}")
+                continue
+            for concurrency in levels:
+                row = {
+                    "client": label,
+                    "concurrency": concurrency,
+                    "calls": args.calls,
+                    "latency": args.latency,
+                    "commit": commit,
+                    "dirty": dirty,
+                    "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                    "python": platform.python_version(),
+                    **measure(call, args.calls, concurrency),
+                }
+                rows.append(row)
+                note = compare(row, previous_run(history, row), args.threshold)
+                print(f"   {label:<32} {concurrency:>4} {row['rps']:>8.1f} {row['p50_ms']:>8.2f} "
+                      f"{row['p99_ms']:>8.2f} {row['cpu_ms_per_call']:>7.2f} {row['peak_kib']:>9.0f} "
+                      f"{row['errors']:>4}  {note}")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+    if rows and not args.no_save:
+        results_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(results_path, "a", encoding="utf-8") as f:
+            for row in rows:
+                f.write(json.dumps(row) + "\n")
+        print(f"\n   Saved {len(rows)} rows to {results_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+# bench_df_as_text.py
+# Benchmark: Prompt Tokens and Latency per df_as_text() Table Format
+# Pairs with df_as_text() in 06_agents / 07_rag / 08_function_calling functions.py
+# Tim Fraser
+
+# Serializes the same 500-row drug shortage table as markdown, CSV, TSV and the
+# "columns" format, plus a few max_tokens budgets, then sends each one to a model
+# and records Ollama's prompt_eval_count and prompt-eval time.
+# By default the model is the local mock server (token counts ~ chars / 4, fixed
+# latency), which checks the plumbing; pass --host to measure a real Ollama.
+# Run from the repo root:
+# python benchmarks/bench_df_as_text.py
+# python benchmarks/bench_df_as_text.py --host http://localhost:11434 --model smollm2:1.7b
+# python benchmarks/bench_df_as_text.py --live   # real FDA data via get_shortages()
+
+# 0. SETUP ###################################
+
+import argparse  # for command line options
+import random    # for the synthetic table
+import time      # for timing calls
+
+import pandas as pd
+import requests  # for calling Ollama
+
+from common import load_module
+from mock_ollama import start_mock_server
+
+# 1. DATA ###################################
+
+def synthetic_shortages(n=500, seed=1):
+    """A table shaped like get_shortages(): repeated names/statuses and a long free-text column."""
+    rng = random.Random(seed)
+    names = ["sertraline hydrochloride", "fluoxetine hydrochloride", "bupropion hydrochloride extended release",
+             "lithium carbonate", "clonidine hydrochloride", "atomoxetine", "methylphenidate hydrochloride"]
+    reasons = ["increased demand", "manufacturing delays", "discontinuation of the 10 mg strength",
+               "shortage of an active ingredient", "regulatory delay"]
+    return pd.DataFrame({
+        "generic_name": [rng.choice(names) for _ in range(n)],
+        "update_type": [rng.choice(["New", "Revised", "Reverified"]) for _ in range(n)],
+        "update_date": pd.Timestamp("2024-01-01") + pd.to_timedelta([rng.randint(0, 500) for _ in range(n)], unit="D"),
+        "availability": [rng.choice(["Available", "Limited Availability", "Unavailable"]) for _ in range(n)],
+        "related_info": [f"Company reports {rng.choice(reasons)}; estimated recovery {rng.choice(['Q1', 'Q2', 'Q3', 'Q4'])} "
+                         f"{rng.choice([2025, 2026])}. Contact 1-800-{rng.randint(100, 999)}-{rng.randint(1000, 9999)}."
+                         for _ in range(n)],
+    })
+
+
+# 2. BENCHMARK ###################################
+
+def prompt_stats(host, model, text):
+    """Send the table in one chat; return Ollama's prompt token count, prompt-eval and wall seconds."""
+    body = {
+        "model": model,
+        "messages": [{"role": "user", "content": f"How many rows are Unavailable?\n\n{text}"}],
+        "stream": False,
+        "options": {"num_predict": 1, "num_ctx": 32768},
+    }
+    t0 = time.perf_counter()
+    r = requests.post(f"{host}/api/chat", json=body, timeout=600)
+    r.raise_for_status()
+    data = r.json()
+    return {
+        "prompt_tokens": data.get("prompt_eval_count"),
+        "prompt_seconds": (data.get("prompt_eval_duration") or 0) / 1e9,
+        "wall_seconds": time.perf_counter() - t0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="df_as_text() table format benchmark.")
+    parser.add_argument("--rows", type=int, default=500)
+    parser.add_argument("--budgets", default="8000,2000", help="comma-separated max_tokens settings")
+    parser.add_argument("--host", default=None, help="real Ollama URL (default: start the mock)")
+    parser.add_argument("--model", default="smollm2:1.7b")
+    parser.add_argument("--live", action="store_true", help="use get_shortages() instead of synthetic data")
+    args = parser.parse_args()
+
+    fn = load_module("06_agents/functions.py", "agents_functions")
+    df = fn.get_shortages(limit=args.rows) if args.live else synthetic_shortages(args.rows)
+
+    server = None
+    host = args.host
+    if host is None:
+        server, host = start_mock_server(latency=0.01, models=(args.model,))
+
+    configs = [(f, {"format": f}) for f in fn.TABLE_FORMATS]
+    configs += [(f"max_tokens={b}", {"max_tokens": int(b)}) for b in args.budgets.split(",") if b.strip()]
+
+    print(f"\nbench_df_as_text | {len(df)} rows x {len(df.columns)} cols, model {args.model} at {host}")
+    print(f"   {'format':<18} {'chars':>8} {'est tok':>8} {'prompt tok':>11} {'prompt s':>9} {'wall s':>8}")
+    baseline = None
+    for label, kwargs in configs:
+        text = fn.df_as_text(df, **kwargs)
+        st = prompt_stats(host, args.model, text)
+        est = fn.estimate_tokens(text)
+        baseline = baseline or st["prompt_tokens"]
+        ratio = f"{baseline / st['prompt_tokens']:.1f}x fewer" if st["prompt_tokens"] else ""
+        print(f"   {label:<18} {len(text):>8} {est:>8} {st['prompt_tokens'] or 0:>11} "
+              f"{st['prompt_seconds']:>9.2f} {st['wall_seconds']:>8.2f}  {ratio}")
+
+    if server is not None:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
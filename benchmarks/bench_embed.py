@@ -0,0 +1,245 @@
+# bench_embed.py
+# Benchmark: Building the Semantic Search Index in 07_rag/05_embed.py
+# Pairs with 07_rag/05_embed.py
+# Tim Fraser
+
+# Embeds every sentence of a large plan document into an in-memory sqlite-vec
+# database, once with the old loop (one encode() call and two INSERTs per sentence)
+# and once per --batch-sizes setting with build_index_from_document(), and reports
+# chunks/second for each. Then it times update_index() on the unchanged document
+# (nothing to embed) and after editing a few sentences. Last, it measures search
+# queries/second at k = 3, 10 and 50: the original KNN query plus one text lookup
+# per hit, the single joined statement, batched search_embed_sql_many(), and a
+# repeat of the same queries answered from the query embedding cache. Finally it
+# compares the sqlite-vec index with the memory-mapped NumPy store (float32 and int8):
+# single-query latency, batched queries/second, size, peak search memory (Python and
+# NumPy allocations only; sqlite-vec's own C memory isn't traced) and recall@k
+# against exact search. --store-rows pads the corpus with perturbed copies of the real
+# vectors to see how each store scales.
+# Needs sentence-transformers and sqlite-vec (pip install sentence-transformers sqlite-vec).
+# Run from the repo root:
+# python benchmarks/bench_embed.py
+# python benchmarks/bench_embed.py --document "07_rag/data/plans/wallkill_nyrcr_plan.txt" --batch-sizes 16,64,256
+
+# 0. SETUP ###################################
+
+import argparse  # for command line options
+import tempfile  # for the NumPy store files
+import time      # for timing
+import tracemalloc  # for peak search memory
+
+import numpy as np
+
+from common import REPO_ROOT, load_functions, percentile
+
+DEFAULT_DOCUMENT = "07_rag/data/plans/Gravesend-Bensonhurst NYRCR Plan.txt"
+
+# 1. HELPERS ###################################
+
+def load_embed():
+    """The index and search functions from 05_embed.py, without running the script."""
+    return load_functions("07_rag/05_embed.py",
+                          ["build_index_from_document", "connect_db", "embed", "get_text", "init_index",
+                           "NumpyVectorStore", "export_numpy_store", "query_cache", "search_embed_sql", "search_embed_sql_many", "search_vectors",
+                           "serialize_float32", "update_index"], "bench_embed")
+
+
+def fresh_db(rag):
+    """An empty in-memory database with 05_embed.py's tables."""
+    conn = rag.connect_db(":memory:")
+    rag.init_index(conn)
+    return conn
+
+
+def old_db(rag):
+    """An empty in-memory database with the original two-column chunks table."""
+    conn = rag.connect_db(":memory:")
+    conn.execute("CREATE TABLE chunks (id INTEGER PRIMARY KEY, text TEXT NOT NULL)")
+    conn.execute(f"CREATE VIRTUAL TABLE vec_chunks USING vec0(embedding float[{rag.VEC_DIM}] distance_metric=cosine)")
+    return conn
+
+
+def per_sentence_build(rag, conn, chunks):
+    """The original loop: one encode(), one list -> blob conversion and two INSERTs per chunk."""
+    for i, text in enumerate(chunks):
+        blob = rag.serialize_float32(rag.embed(text))
+        conn.execute("INSERT INTO chunks (id, text) VALUES (?, ?)", (i, text))
+        conn.execute("INSERT INTO vec_chunks (rowid, embedding) VALUES (?, ?)", (i, blob))
+    conn.commit()
+
+
+def n_plus_one_search(conn, query_blob, k):
+    """The original search: KNN for rowids, then one SELECT per hit for its text.
+    (`k = ?` instead of the original LIMIT, which vec0 only sees on SQLite 3.41+.)"""
+    rows = conn.execute(
+        "SELECT rowid, distance FROM vec_chunks WHERE embedding MATCH ? AND k = ? ORDER BY distance",
+        (query_blob, k)
+    ).fetchall()
+    out = []
+    for rowid, distance in rows:
+        (text,) = conn.execute("SELECT text FROM chunks WHERE id = ?", (rowid,)).fetchone()
+        out.append({"id": rowid, "score": 1 - distance, "text": text})
+    return out
+
+
+def queries_per_second(fn, n):
+    t0 = time.perf_counter()
+    fn()
+    return n / (time.perf_counter() - t0)
+
+
+# 2. BENCHMARK ###################################
+
+def bench_build(rag, chunks, batch_sizes):
+    print(f"   {'method':<24} {'chunks':>7} {'seconds':>8} {'chunks/s':>9}")
+    rows = []
+    conn = old_db(rag)
+    t0 = time.perf_counter()
+    per_sentence_build(rag, conn, chunks)
+    seconds = time.perf_counter() - t0
+    conn.close()
+    rows.append(("one at a time", seconds))
+    for b in batch_sizes:
+        conn = fresh_db(rag)
+        seconds = rag.build_index_from_document(conn, chunks, batch_size=b)["seconds"]
+        conn.close()
+        rows.append((f"batch_size={b}", seconds))
+    base = rows[0][1]
+    for label, seconds in rows:
+        print(f"   {label:<24} {len(chunks):>7} {seconds:>8.2f} {len(chunks) / seconds:>9.0f}  "
+              f"{base / seconds:.1f}x")
+
+
+def bench_update(rag, chunks, edits=10):
+    """update_index() on a built index: rerun unchanged, then with `edits` sentences changed."""
+    conn = fresh_db(rag)
+    full = rag.update_index(conn, chunks)
+    same = rag.update_index(conn, chunks)
+    edited = list(chunks)
+    for i in range(0, len(edited), max(1, len(edited) // edits)):
+        edited[i] = edited[i] + " (revised)"
+    changed = rag.update_index(conn, edited)
+    conn.close()
+    print(f"   {'full build':<24} {full['added']:>7} embedded {full['seconds'] * 1000:>9.0f} ms")
+    print(f"   {'rerun, unchanged':<24} {same['added']:>7} embedded {same['seconds'] * 1000:>9.1f} ms")
+    print(f"   {'rerun, sentences edited':<24} {changed['added']:>7} embedded {changed['seconds'] * 1000:>9.1f} ms")
+
+
+def bench_search(rag, chunks, n_queries=200, ks=(3, 10, 50)):
+    """Queries/second for SQL only (pre-embedded vectors) and end to end (embedding included)."""
+    conn = fresh_db(rag)
+    rag.update_index(conn, chunks)
+    step = max(1, len(chunks) // n_queries)
+    queries = [" ".join(c.split()[:6]) for c in chunks[::step]][:n_queries]
+    vecs = rag.embed_many(queries)
+    blobs = [v.tobytes() for v in vecs]
+    n = len(queries)
+
+    print(f"   {n} queries; queries/second (higher is better)")
+    print(f"   {'k':>4} {'N+1 SQL':>9} {'joined SQL':>11} {'loop e2e':>9} {'batched e2e':>12} {'cached e2e':>11}")
+    for k in ks:
+        old = queries_per_second(lambda: [n_plus_one_search(conn, b, k) for b in blobs], n)
+        joined = queries_per_second(lambda: rag.search_vectors(conn, vecs, k=k), n)
+        rag.query_cache.clear()
+        loop = queries_per_second(lambda: [rag.search_embed_sql(conn, q, k=k) for q in queries], n)
+        cached = queries_per_second(lambda: [rag.search_embed_sql(conn, q, k=k) for q in queries], n)
+        rag.query_cache.clear()
+        batched = queries_per_second(lambda: rag.search_embed_sql_many(conn, queries, k=k), n)
+        # Same hits either way
+        assert [h["id"] for h in n_plus_one_search(conn, blobs[0], k)] == [h["id"] for h in rag.search_vectors(conn, vecs[:1], k=k)[0]]
+        print(f"   {k:>4} {old:>9.0f} {joined:>11.0f} {loop:>9.0f} {batched:>12.0f} {cached:>11.0f}")
+    conn.close()
+    st = rag.query_cache.stats()
+    print(f"   query cache: {st['hits']} hits, {st['misses']} misses ({st['hit_rate']:.0%} hit rate)")
+
+
+def padded_index(rag, chunks, rows, seed=1):
+    """An in-memory index of the document, padded to `rows` with noisy copies of its vectors."""
+    conn = fresh_db(rag)
+    texts = list(dict.fromkeys(chunks))
+    vecs = rag.embed_many(texts)
+    rng = np.random.default_rng(seed)
+    while len(texts) < rows:
+        n = min(len(vecs), rows - len(texts))
+        noisy = vecs[:n] + rng.normal(0, 0.05, (n, vecs.shape[1])).astype(np.float32)
+        texts += [f"{t} [copy {len(texts) + i}]" for i, t in enumerate(texts[:n])]
+        vecs = np.vstack([vecs, noisy / np.linalg.norm(noisy, axis=1, keepdims=True)])
+    with conn:
+        conn.executemany("INSERT INTO chunks (id, text, source, hash, model) VALUES (?, ?, 'bench', '', ?)",
+                         ((i, t, rag.EMBED_MODEL) for i, t in enumerate(texts)))
+        conn.executemany("INSERT INTO vec_chunks (rowid, embedding) VALUES (?, ?)",
+                         ((i, v.tobytes()) for i, v in enumerate(vecs)))
+    return conn, vecs
+
+
+def db_bytes(conn):
+    return conn.execute("PRAGMA page_count").fetchone()[0] * conn.execute("PRAGMA page_size").fetchone()[0]
+
+
+def bench_stores(rag, chunks, rows, n_queries=100, k=10):
+    conn, vecs = padded_index(rag, chunks, rows)
+    rng = np.random.default_rng(2)
+    qvecs = vecs[rng.choice(len(vecs), n_queries, replace=False)]
+    qvecs = qvecs + rng.normal(0, 0.05, qvecs.shape).astype(np.float32)
+    # Ground truth: exact cosine top k, in memory
+    unit = vecs / np.linalg.norm(vecs, axis=1, keepdims=True)
+    truth = [set(np.argsort(-(unit @ q))[:k]) for q in qvecs]
+
+    folder = tempfile.mkdtemp()
+    stores = {
+        "sqlite-vec": (lambda v: rag.search_vectors(conn, v, k=k), db_bytes(conn)),
+    }
+    for label, quantize in (("numpy float32", False), ("numpy int8", True)):
+        store = rag.export_numpy_store(conn, f"{folder}/{label.split()[1]}", quantize=quantize)
+        stores[label] = (lambda v, store=store: store.search_vectors(v, k=k), store.nbytes())
+
+    print(f"   {len(vecs)} vectors, {n_queries} queries, k={k}")
+    print(f"   {'store':<15} {'p50 ms':>8} {'p95 ms':>8} {'batch q/s':>10} {'size MB':>8} "
+          f"{'peak MB':>8} {'recall@k':>9}")
+    for label, (search, size) in stores.items():
+        seconds = []
+        for q in qvecs:
+            t0 = time.perf_counter()
+            search(q[None, :])
+            seconds.append(time.perf_counter() - t0)
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        hits = search(qvecs)
+        batch = n_queries / (time.perf_counter() - t0)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        recall = np.mean([len(truth[i] & {h["id"] for h in hits[i]}) / k for i in range(n_queries)])
+        ms = [x * 1000 for x in seconds]
+        print(f"   {label:<15} {percentile(ms, 50):>8.2f} {percentile(ms, 95):>8.2f} {batch:>10.0f} "
+              f"{size / 1e6:>8.1f} {peak / 1e6:>8.1f} {recall:>9.3f}")
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="05_embed.py index build benchmark.")
+    parser.add_argument("--document", default=DEFAULT_DOCUMENT, help="text file, relative to the repo root")
+    parser.add_argument("--limit", type=int, default=0, help="use only the first N sentences (0 = all)")
+    parser.add_argument("--batch-sizes", default="1,16,64,256")
+    parser.add_argument("--store-rows", type=int, default=100_000, help="vectors in the store comparison")
+    args = parser.parse_args()
+
+    rag = load_embed()
+    chunks = rag.get_text(str(REPO_ROOT / args.document))
+    if args.limit:
+        chunks = chunks[:args.limit]
+    rag.get_embed_model()  # load the model before timing anything
+    rag.embed("warm up")
+
+    print(f"\nbench_embed | {len(chunks)} sentences from {args.document}, model {rag.EMBED_MODEL}")
+    print("\n-- index build --")
+    bench_build(rag, chunks, [int(b) for b in args.batch_sizes.split(",") if b.strip()])
+    print("\n-- incremental update --")
+    bench_update(rag, chunks)
+    print("\n-- search --")
+    bench_search(rag, chunks)
+    print("\n-- vector stores --")
+    bench_stores(rag, chunks, args.store_rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+# bench_endpoints.py
+# Benchmark: One Ollama Host vs Load Balancing Across Several
+# Pairs with 08_function_calling/functions.py (configure_endpoints)
+# Tim Fraser
+
+# Starts 1..N mock Ollama servers, each answering only `--parallel` chats at once
+# (like OLLAMA_NUM_PARALLEL), then fires the same batch of agent() calls from a
+# thread pool. Throughput should grow roughly with the number of hosts.
+# Run from the repo root:
+# python benchmarks/bench_endpoints.py --hosts 3 --calls 60
+
+# 0. SETUP ###################################
+
+import argparse  # for command line options
+import time      # for timing the batch
+from concurrent.futures import ThreadPoolExecutor
+
+from common import load_module, summarize_latencies
+from mock_ollama import start_mock_server
+
+# 1. BENCHMARK ###################################
+
+def run_batch(fc, calls, workers):
+    """Send `calls` agent() requests from `workers` threads; return (latencies, seconds)."""
+    messages = [{"role": "user", "content": "hi"}]
+
+    def one(_):
+        t0 = time.perf_counter()
+        fc.agent(messages=messages)
+        return time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        latencies = list(pool.map(one, range(calls)))
+    return latencies, time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-host load balancing benchmark.")
+    parser.add_argument("--hosts", type=int, default=3)
+    parser.add_argument("--calls", type=int, default=60)
+    parser.add_argument("--latency", type=float, default=0.05, help="mock model seconds per call")
+    parser.add_argument("--parallel", type=int, default=2, help="chats each host answers at once")
+    args = parser.parse_args()
+
+    servers = [start_mock_server(latency=args.latency, parallel=args.parallel) for _ in range(args.hosts)]
+    urls = [url for _, url in servers]
+    fc = load_module("08_function_calling/functions.py", "fc_functions")
+    # Enough threads to keep every host busy
+    workers = args.hosts * args.parallel * 2
+
+    print(f"\nbench_endpoints | {args.calls} calls, {workers} threads, "
+          f"{args.parallel} parallel per host, {args.latency * 1000:.0f}ms per call")
+
+    baseline = None
+    for n in range(1, args.hosts + 1):
+        pool = fc.configure_endpoints(urls[:n])
+        latencies, seconds = run_batch(fc, args.calls, workers)
+        rps = args.calls / seconds
+        baseline = baseline or rps
+        summarize_latencies(f"{n} host(s)", latencies)
+        spread = [s["requests"] for s in pool.stats()]
+        print(f"   {'':<28} {rps:.1f} req/s ({rps / baseline:.2f}x) requests per host: {spread}")
+
+    fc.configure_endpoints(None)
+    for server, _ in servers:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+# bench_hedging.py
+# Benchmark: Hedged Duplicate Requests vs Waiting Out Stragglers
+# Pairs with 10_data_management/fixer/functions.py (FIXER_HEDGE / run_hedged)
+# Tim Fraser
+
+# Starts a mock Ollama server whose latency has a long tail (lognormal), then sends
+# the same batch of ollama_chat_once() calls twice: once plain, once hedged. A hedged
+# call that outlives the observed p95 gets a duplicate; the first answer wins and the
+# other is closed. The tail (p99, max) should shrink for a few percent extra requests.
+# Run from the repo root:
+# python benchmarks/bench_hedging.py --calls 300 --sigma 1.0
+
+# 0. SETUP ###################################
+
+import argparse  # for command line options
+import os        # for fixer settings
+import time      # for timing calls
+from concurrent.futures import ThreadPoolExecutor
+
+from common import load_module, percentile
+from mock_ollama import start_mock_server
+
+# 1. BENCHMARK ###################################
+
+def run_batch(fx, url, calls, workers, hedge):
+    """Send `calls` chats from `workers` threads; return per-call latencies in seconds."""
+    def one(i):
+        t0 = time.perf_counter()
+        fx.ollama_chat_once(url, None, "smollm2:1.7b", [{"role": "user", "content": f"hi {i}"}],
+                            cache=None, stage="bench", hedge=hedge)
+        return time.perf_counter() - t0
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(one, range(calls)))
+
+
+def describe(label, seconds, requests_sent):
+    ms = [s * 1000 for s in seconds]
+    out = {"p50": percentile(ms, 50), "p95": percentile(ms, 95), "p99": percentile(ms, 99), "max": max(ms)}
+    print(f"   {label:<10} p50={out['p50']:.0f}ms p95={out['p95']:.0f}ms p99={out['p99']:.0f}ms "
+          f"max={out['max']:.0f}ms requests sent={requests_sent}")
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hedged request benchmark.")
+    parser.add_argument("--calls", type=int, default=300)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.05, help="mean mock seconds per call")
+    parser.add_argument("--sigma", type=float, default=1.0, help="lognormal spread (bigger = longer tail)")
+    args = parser.parse_args()
+
+    # No client rate limit or cache, so only hedging differs between the two runs
+    os.environ.update({"OLLAMA_RATE_LIMIT_RPS": "0", "OLLAMA_MAX_CONCURRENT": "64", "FIXER_CACHE": "0"})
+    server, url = start_mock_server(latency=args.latency, latency_dist="lognormal",
+                                    latency_sigma=args.sigma, tool_mode="none", seed=1)
+    fx = load_module("10_data_management/fixer/functions.py", "fixer_functions")
+
+    print(f"\nbench_hedging | {args.calls} calls, {args.workers} threads, "
+          f"lognormal latency mean {args.latency * 1000:.0f}ms sigma {args.sigma}")
+
+    # Same seed before each run, so both draw the same latencies (the hedged run also
+    # draws one per duplicate, which shifts the later ones a little)
+    server.reseed(1)
+    plain = run_batch(fx, url, args.calls, args.workers, hedge=False)
+    server.reseed(1)
+    hedged = run_batch(fx, url, args.calls, args.workers, hedge=True)
+    st = fx.hedge_policy("bench").stats()
+
+    before = describe("plain", plain, args.calls)
+    after = describe("hedged", hedged, args.calls + st["hedged"])
+    print(f"   hedge rate {st['hedge_rate']:.1%} ({st['hedged']} duplicates, {st['hedge_wins']} won) | "
+          f"p99 {before['p99'] / after['p99']:.2f}x lower, max {before['max'] / after['max']:.2f}x lower")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# bench_session.py
+# Benchmark: Fresh Connection per Call vs Pooled Keep-Alive Session
+# Pairs with 08_function_calling/functions.py
+# Tim Fraser
+
+# Times many small chat calls against the local mock Ollama server, first with a bare
+# requests.post() per call (a new TCP connection each time), then with the same POST
+# through the shared pooled session (SESSION), then through agent(), which uses that
+# session. Each path gets one untimed warm-up call first, so agent()'s /api/tags
+# readiness probe (cached afterwards) isn't counted against it.
+# Run from the repo root:
+# python benchmarks/bench_session.py --calls 200
+
+# 0. SETUP ###################################
+
+import argparse  # for command line options
+import time      # for timing calls
+
+import requests  # for the "before" baseline
+
+from common import load_module, summarize_latencies
+from mock_ollama import start_mock_server
+
+# 1. BENCHMARK ###################################
+
+def main():
+    parser = argparse.ArgumentParser(description="Pooled session benchmark.")
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.0, help="mock model seconds per call")
+    args = parser.parse_args()
+
+    server, base_url = start_mock_server(latency=args.latency)
+    fc = load_module("08_function_calling/functions.py", "fc_functions")
+    # Point the helpers at the mock server
+    fc.CHAT_URL = f"{base_url}/api/chat"
+    fc.OLLAMA_TAGS_URL = f"{base_url}/api/tags"
+
+    messages = [{"role": "user", "content": "hi"}]
+    body = {"model": fc.DEFAULT_MODEL, "messages": messages, "stream": False}
+
+    print(f"\nbench_session | {args.calls} calls against {base_url}")
+
+    def post_with(post):
+        def call():
+            r = post(fc.CHAT_URL, json=body, timeout=30)
+            r.raise_for_status()
+            r.json()
+        return call
+
+    def timed(call):
+        call()  # warm up (not timed)
+        seconds = []
+        for _ in range(args.calls):
+            t0 = time.perf_counter()
+            call()
+            seconds.append(time.perf_counter() - t0)
+        return seconds
+
+    # Before: one new connection per call
+    before = timed(post_with(requests.post))
+    # After: the same request through the shared keep-alive session, then via agent()
+    pooled = timed(post_with(fc.SESSION.post))
+    after = timed(lambda: fc.agent(messages=messages))
+
+    a = summarize_latencies("requests.post (no pool)", before)
+    p = summarize_latencies("SESSION.post (pooled)", pooled)
+    b = summarize_latencies("agent() pooled session", after)
+    print(f"   speedup (mean): pooled POST {a['mean_ms'] / p['mean_ms']:.2f}x, agent() {a['mean_ms'] / b['mean_ms']:.2f}x")
+    # With the readiness cache, agent() probes /api/tags once instead of once per call
+    stats = fc.ollama_probe_stats()
+    print(f"   readiness probes: {stats['probes']} sent, {stats['cache_hits']} skipped "
+          f"(HTTP requests: {args.calls + 1 + stats['probes']} instead of {2 * (args.calls + 1)})")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
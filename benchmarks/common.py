@@ -0,0 +1,167 @@
+# common.py
+# Shared Helpers for the Benchmark Scripts
+# Tim Fraser
+
+# Small helpers used by every benchmark in this folder:
+# loading a module's functions.py by path, pulling single functions out of
+# course scripts, running the mock server in its own process, and summarizing latencies.
+
+# 0. SETUP ###################################
+
+import ast             # for reading a script without running it
+import importlib.util  # for loading a file as a module
+import socket          # for finding a free port
+import statistics      # for median / quantiles
+import subprocess      # for the mock server process and git
+import sys
+import time
+import types
+import urllib.request  # for the readiness check
+from pathlib import Path
+
+# Repository root (one level above benchmarks/)
+REPO_ROOT = Path(__file__).resolve().parent.parent
+BENCH_DIR = Path(__file__).resolve().parent
+
+# 1. HELPERS ###################################
+
+def load_module(relative_path, name):
+    """
+    Load a Python file from the repo as a module under a unique name.
+    Each course module has its own functions.py, so we can't just `import functions`.
+    """
+    path = REPO_ROOT / relative_path
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _bound_names(node):
+    """Names a top-level statement defines (imports, defs, classes, assignments)."""
+    if isinstance(node, (ast.Import, ast.ImportFrom)):
+        return [(a.asname or a.name).split(".")[0] for a in node.names]
+    if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+        return [node.name]
+    if isinstance(node, (ast.Assign, ast.AnnAssign, ast.AugAssign)):
+        targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+        return [n.id for t in targets for n in ast.walk(t) if isinstance(n, ast.Name)]
+    return []
+
+
+def _used_names(node):
+    """Names a top-level statement reads from the script; a function's (or method's) own arguments and locals don't count."""
+    loads = {x.id for x in ast.walk(node) if isinstance(x, ast.Name) and isinstance(x.ctx, ast.Load)}
+    if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+        local = {a.arg for a in ast.walk(node.args) if isinstance(a, ast.arg)}
+        local |= {x.id for x in ast.walk(node) if isinstance(x, ast.Name) and isinstance(x.ctx, ast.Store)}
+        local -= {n for x in ast.walk(node) if isinstance(x, ast.Global) for n in x.names}
+        # Default values are evaluated in the script, so they always count
+        defaults = node.args.defaults + [d for d in node.args.kw_defaults if d is not None]
+        return (loads - local) | {x.id for d in defaults for x in ast.walk(d) if isinstance(x, ast.Name)}
+    if isinstance(node, ast.ClassDef):
+        outer = node.bases + node.keywords + node.decorator_list
+        return set().union(*map(_used_names, node.body), *map(_used_names, outer))
+    return loads | {x.id for x in ast.walk(node) if isinstance(x, ast.Name)}
+
+
+def load_functions(relative_path, names, name):
+    """
+    Load just `names` from a course *script*, plus the imports, constants and helper
+    functions they use. The rest of the script (reading data, calling the model,
+    plotting) is not run, so we can time e.g. validate_reports._ollama_chat on its own.
+    """
+    path = REPO_ROOT / relative_path
+    tree = ast.parse(path.read_text(encoding="utf-8"), filename=str(path))
+    binders = {}
+    for node in tree.body:
+        for bound in _bound_names(node):
+            binders.setdefault(bound, []).append(node)
+
+    # Follow names from the requested functions to everything they depend on
+    keep, seen, todo = set(), set(), list(names)
+    while todo:
+        n = todo.pop()
+        if n in seen:
+            continue
+        seen.add(n)
+        for node in binders.get(n, []):
+            if id(node) not in keep:
+                keep.add(id(node))
+                todo.extend(_used_names(node))
+    missing = [n for n in names if n not in binders]
+    if missing:
+        raise NameError(f"{relative_path} does not define {missing}")
+
+    body = [node for node in tree.body if id(node) in keep]
+    module = types.ModuleType(name)
+    module.__file__ = str(path)
+    # Scripts import their folder's functions.py as `functions`; load the right one
+    sys.path.insert(0, str(path.parent))
+    previous = sys.modules.pop("functions", None)
+    try:
+        exec(compile(ast.Module(body=body, type_ignores=[]), str(path), "exec"), module.__dict__)
+    finally:
+        sys.path.remove(str(path.parent))
+        sys.modules.pop("functions", None)
+        if previous is not None:
+            sys.modules["functions"] = previous
+    return module
+
+
+def start_mock_process(*flags, timeout=10.0):
+    """
+    Run mock_ollama.py in a separate process, so its CPU time doesn't count
+    against the client we are measuring. Returns (process, url).
+    """
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    proc = subprocess.Popen(
+        [sys.executable, str(BENCH_DIR / "mock_ollama.py"), "--port", str(port), *map(str, flags)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            urllib.request.urlopen(f"{url}/api/version", timeout=1).read()
+            return proc, url
+        except OSError:
+            if proc.poll() is not None or time.monotonic() > deadline:
+                proc.kill()
+                raise RuntimeError(f"mock_ollama.py did not start on port {port}")
+            time.sleep(0.05)
+
+
+def git_revision():
+    """(short commit hash, True if the working tree has uncommitted changes)."""
+    def git(*args):
+        out = subprocess.run(["git", *args], cwd=REPO_ROOT, capture_output=True, text=True)
+        return out.stdout.strip() if out.returncode == 0 else ""
+    commit = git("rev-parse", "--short", "HEAD") or "unknown"
+    return commit, bool(git("status", "--porcelain", "--untracked-files=no"))
+
+
+def percentile(values, q):
+    """Return the q-th percentile (0-100) of a list of numbers."""
+    if not values:
+        return float("nan")
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[max(0, min(98, int(q) - 1))]
+
+
+def summarize_latencies(label, seconds):
+    """Print and return mean / p50 / p95 latency in milliseconds."""
+    ms = [s * 1000 for s in seconds]
+    out = {
+        "label": label,
+        "n": len(ms),
+        "mean_ms": statistics.fmean(ms) if ms else float("nan"),
+        "p50_ms": percentile(ms, 50),
+        "p95_ms": percentile(ms, 95),
+    }
+    print(f"   {label:<28} n={out['n']:<5} mean={out['mean_ms']:.2f}ms "
+          f"p50={out['p50_ms']:.2f}ms p95={out['p95_ms']:.2f}ms")
+    return out
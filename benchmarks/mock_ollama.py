@@ -0,0 +1,397 @@
+# mock_ollama.py
+# Local Stand-in for the Ollama HTTP API
+# Tim Fraser
+
+# A small offline server that answers like Ollama does, so we can time our
+# HTTP client code without a real model. Uses only the Python standard library.
+#
+# It supports:
+# - POST /api/chat      (streaming and non-streaming, tools, format="json" or a JSON schema)
+# - POST /api/generate  (an empty prompt just "loads" the model, like a warm-up)
+# - POST /api/embed     (deterministic hashed bag-of-words vectors)
+# - GET  /api/tags, GET /api/version
+# - latency distributions, a tokens/second rate, simulated model load time,
+#   500 / 429 (+ Retry-After) error injection, and scripted tool calls.
+#
+# Run it on its own, then point any helper at it with OLLAMA_HOST:
+# python benchmarks/mock_ollama.py --port 11500 --latency 0.05 --tokens-per-second 200
+# OLLAMA_HOST=http://127.0.0.1:11500 python 06_agents/07_parallel_queries.py
+
+# 0. SETUP ###################################
+
+import argparse  # for command line options
+import contextlib # for an optional no-op lock
+import hashlib   # for deterministic embeddings
+import json      # for working with JSON
+import math      # for vector norms
+import random    # for latency distributions and error injection
+import re        # for splitting replies into tokens
+import sys       # for the exception in handle_error
+import threading # for running the server in the background
+import time      # for simulated model latency
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 1. RESPONSE HELPERS ###################################
+
+def split_tokens(text):
+    """Split text into word-sized 'tokens', keeping the spaces so they join back exactly."""
+    return re.findall(r"\S+\s*|\s+", text or "") or [""]
+
+
+def count_prompt_tokens(messages):
+    """Rough prompt size: about 4 characters per token, like most tokenizers."""
+    chars = sum(len(str(m.get("content") or "")) for m in messages or [])
+    return max(1, chars // 4)
+
+
+def sample_latency(dist, mean, sigma, rng):
+    """Seconds before the first token, drawn from a fixed/uniform/exponential/lognormal distribution."""
+    if mean <= 0:
+        return 0.0
+    if dist == "uniform":
+        return rng.uniform(mean * (1 - sigma), mean * (1 + sigma))
+    if dist == "exponential":
+        return rng.expovariate(1 / mean)
+    if dist == "lognormal":
+        # Keep the mean at `mean`: E[lognormal] = exp(mu + sigma^2 / 2)
+        return rng.lognormvariate(math.log(mean) - sigma ** 2 / 2, sigma)
+    return mean
+
+
+def value_for_schema(schema):
+    """A small placeholder value that fits a JSON schema (for format=schema and tool arguments)."""
+    schema = schema or {}
+    if "enum" in schema:
+        return schema["enum"][0]
+    kind = schema.get("type", "string")
+    if kind == "object":
+        return {k: value_for_schema(v) for k, v in schema.get("properties", {}).items()}
+    if kind == "array":
+        return [value_for_schema(schema.get("items", {}))]
+    return {"integer": 1, "number": 1.0, "boolean": True, "null": None}.get(kind, "mock")
+
+
+def embed_text(text, dim):
+    """Hashed bag of words, L2-normalized: texts sharing words get similar vectors."""
+    vec = [0.0] * dim
+    for word in re.findall(r"\w+", (text or "").lower()):
+        h = int.from_bytes(hashlib.md5(word.encode("utf-8")).digest()[:8], "little")
+        vec[h % dim] += 1.0 if (h >> 63) == 0 else -1.0
+    norm = math.sqrt(sum(v * v for v in vec)) or 1.0
+    return [v / norm for v in vec]
+
+
+# 2. REQUEST HANDLER ###################################
+
+class MockOllamaHandler(BaseHTTPRequestHandler):
+    """Answer Ollama API routes with canned, Ollama-shaped JSON."""
+
+    # HTTP/1.1 lets clients keep the connection open between requests (keep-alive)
+    protocol_version = "HTTP/1.1"
+    # Buffer each response and send it without Nagle's algorithm. Unbuffered, the headers
+    # and body leave as two small TCP segments, and on a kept-alive connection the second
+    # one waits for the client's delayed ACK (~40 ms per request), which made pooled
+    # sessions look slower than a new connection per call.
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        # Stay quiet; benchmarks print their own summaries
+        pass
+
+    def _send_json(self, payload, status=200, headers=None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+        self.wfile.flush()
+        self.server.count(status)
+
+    def _send_chunk(self, payload):
+        # Chunked transfer encoding: size in hex, CRLF, data, CRLF
+        data = (json.dumps(payload) + "\n").encode("utf-8")
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_GET(self):
+        path = self.path.rstrip("/")
+        if path == "/api/tags":
+            models = [{"name": m, "model": m} for m in self.server.models]
+            self._send_json({"models": models})
+        elif path == "/api/version":
+            self._send_json({"version": "0.0.0-mock"})
+        else:
+            self._send_json({"error": "not found"}, status=404)
+
+    def do_POST(self):
+        # Always read the body so the connection stays usable for the next request
+        n = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(n) if n > 0 else b"{}"
+        routes = {"/api/chat": self._chat, "/api/generate": self._generate, "/api/embed": self._embed}
+        route = routes.get(self.path.rstrip("/"))
+        if route is None:
+            self._send_json({"error": "not found"}, status=404)
+            return
+        try:
+            body = json.loads(raw or b"{}")
+        except json.JSONDecodeError:
+            self._send_json({"error": "invalid JSON body"}, status=400)
+            return
+        # Like OLLAMA_NUM_PARALLEL: only `parallel` requests run at once, the rest queue
+        with self.server.slots:
+            if not self._inject_error():
+                route(body)
+
+    def _inject_error(self):
+        """Maybe answer 429 (with Retry-After) or 500 instead of doing the work."""
+        roll = self.server.random()
+        if roll < self.server.rate_limit_rate:
+            self._send_json({"error": "rate limited"}, status=429,
+                            headers={"Retry-After": str(self.server.retry_after)})
+            return True
+        if roll < self.server.rate_limit_rate + self.server.error_rate:
+            self._send_json({"error": "mock server error"}, status=500)
+            return True
+        return False
+
+    def _load_seconds(self, model):
+        """The first request for each model pays load_seconds, like Ollama loading it into memory."""
+        with self.server.lock:
+            if model in self.server.loaded:
+                return 0.0
+            self.server.loaded.add(model)
+        return self.server.load_seconds
+
+    def _plan_reply(self, body):
+        """Decide the reply: the next scripted step, a tool call, JSON, or plain text."""
+        step = self.server.next_script_step()
+        if step is not None:
+            return step.get("content", ""), step.get("tool_calls")
+        tools = body.get("tools") or []
+        if tools and self.server.tool_mode == "first":
+            fn = tools[0].get("function", {})
+            args = value_for_schema(fn.get("parameters", {"type": "object"}))
+            return "", [{"function": {"name": fn.get("name", "tool"), "arguments": args}}]
+        fmt = body.get("format")
+        if isinstance(fmt, dict):
+            return json.dumps(value_for_schema(fmt)), None
+        if fmt == "json":
+            return self.server.json_reply, None
+        return self.server.reply, None
+
+    def _start(self, model, prompt_tokens, tokens):
+        """Sleep like a model would before the first token (load + latency); return Ollama's fields."""
+        load = self._load_seconds(model)
+        with self.server.lock:
+            ttft = sample_latency(self.server.latency_dist, self.server.latency, self.server.latency_sigma,
+                                  self.server.rng)
+        time.sleep(load + ttft)
+        return {
+            "model": model,
+            "load_duration": int(load * 1e9),
+            "prompt_eval_count": prompt_tokens,
+            "prompt_eval_duration": int(ttft * 1e9),
+            "eval_count": len(tokens),
+        }
+
+    def _token_delay(self):
+        tps = self.server.tokens_per_second
+        return 1.0 / tps if tps else 0.0
+
+    def _final(self, t0, meta):
+        total = time.perf_counter() - t0
+        eval_seconds = max(0.0, total - (meta["load_duration"] + meta["prompt_eval_duration"]) / 1e9)
+        return {"done": True, "done_reason": "stop", "total_duration": int(total * 1e9),
+                "eval_duration": int(eval_seconds * 1e9)}
+
+    def _chat(self, body):
+        content, tool_calls = self._plan_reply(body)
+        tokens = split_tokens(content)
+        t0 = time.perf_counter()
+        meta = self._start(body.get("model", "mock"), count_prompt_tokens(body.get("messages")), tokens)
+        if body.get("stream", True) is False:
+            time.sleep(self._token_delay() * len(tokens))
+            message = {"role": "assistant", "content": content}
+            if tool_calls:
+                message["tool_calls"] = tool_calls
+            self._send_json({**meta, **self._final(t0, meta), "message": message})
+            return
+        self._stream(meta, t0, tokens, tool_calls,
+                     lambda tok: {"message": {"role": "assistant", "content": tok}},
+                     {"message": {"role": "assistant", "content": ""}})
+
+    def _generate(self, body):
+        model = body.get("model", "mock")
+        prompt = body.get("prompt") or ""
+        if not prompt:
+            # Empty prompt = load the model and return (what warm-up requests do)
+            load = self._load_seconds(model)
+            time.sleep(load)
+            self._send_json({"model": model, "response": "", "done": True, "done_reason": "load",
+                             "load_duration": int(load * 1e9), "total_duration": int(load * 1e9)})
+            return
+        tokens = split_tokens(self.server.reply)
+        t0 = time.perf_counter()
+        meta = self._start(model, count_prompt_tokens([{"content": prompt}]), tokens)
+        if body.get("stream", True) is False:
+            time.sleep(self._token_delay() * len(tokens))
+            self._send_json({**meta, **self._final(t0, meta), "response": self.server.reply})
+            return
+        self._stream(meta, t0, tokens, None, lambda tok: {"response": tok}, {"response": ""})
+
+    def _embed(self, body):
+        model = body.get("model", "mock")
+        inputs = body.get("input", "")
+        inputs = [inputs] if isinstance(inputs, str) else list(inputs)
+        load = self._load_seconds(model)
+        time.sleep(load + self.server.embed_latency * len(inputs))
+        self._send_json({"model": model,
+                         "embeddings": [embed_text(t, self.server.embed_dim) for t in inputs],
+                         "load_duration": int(load * 1e9)})
+
+    def _stream(self, meta, t0, tokens, tool_calls, piece, last):
+        """Send NDJSON chunks (one per token) with chunked transfer encoding, then the final stats chunk."""
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        delay = self._token_delay()
+        for tok in tokens:
+            if tok:
+                self._send_chunk({"model": meta["model"], **piece(tok), "done": False})
+                time.sleep(delay)
+        if tool_calls:
+            self._send_chunk({"model": meta["model"], "done": False,
+                              "message": {"role": "assistant", "content": "", "tool_calls": tool_calls}})
+        self._send_chunk({**meta, **last, **self._final(t0, meta)})
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+        self.server.count(200)
+
+
+# 3. SERVER HELPERS ###################################
+
+class MockOllamaServer(ThreadingHTTPServer):
+    """ThreadingHTTPServer plus the mock's settings and request counters."""
+
+    daemon_threads = True
+
+    def count(self, status):
+        with self.lock:
+            self.stats[status] = self.stats.get(status, 0) + 1
+
+    def random(self):
+        with self.lock:
+            return self.rng.random()
+
+    def reseed(self, seed):
+        """Restart the latency / error draws, so two runs against this server see the same values."""
+        with self.lock:
+            self.rng = random.Random(seed)
+
+    def handle_error(self, request, client_address):
+        # A client that hangs up mid-reply (e.g. the losing copy of a hedged request) is expected
+        if isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            return
+        super().handle_error(request, client_address)
+
+    def next_script_step(self):
+        """Scripted replies are served in order, then repeat from the start."""
+        if not self.script:
+            return None
+        with self.lock:
+            step = self.script[self.script_index % len(self.script)]
+            self.script_index += 1
+        return step
+
+
+def start_mock_server(port=0, latency=0.0, reply="ok", models=("smollm2:1.7b",), parallel=None,
+                      latency_dist="fixed", latency_sigma=0.5, tokens_per_second=None,
+                      load_seconds=0.0, error_rate=0.0, rate_limit_rate=0.0, retry_after=1,
+                      script=None, tool_mode="first", json_reply='{"result": "ok"}',
+                      embed_dim=384, embed_latency=0.0, seed=None):
+    """
+    Start the mock server on a background thread. Returns (server, base_url);
+    call server.shutdown() when done. server.stats counts responses by status code.
+
+    port=0 picks any free port.
+    latency, latency_dist, latency_sigma: seconds before the first token; "fixed", "uniform"
+        (mean +/- sigma*mean), "exponential" or "lognormal" (sigma = spread in log space).
+    tokens_per_second: pace of the reply tokens (None = instant).
+    load_seconds: extra wait on the first request for each model (reported as load_duration).
+    parallel: how many requests are answered at once (None = no cap), like OLLAMA_NUM_PARALLEL.
+    error_rate / rate_limit_rate: share of requests answered with 500 / 429 (+ Retry-After).
+    script: replies served in order, each {"content": "..."} and/or {"tool_calls": [...]}.
+    tool_mode: "first" = when a request has tools and no script, call the first tool with
+        placeholder arguments; "none" = always answer with text.
+    json_reply: content for format="json" (a JSON schema format gets a matching object).
+    seed: make latency and error injection repeatable.
+    """
+    server = MockOllamaServer(("127.0.0.1", port), MockOllamaHandler)
+    server.latency = latency
+    server.latency_dist = latency_dist
+    server.latency_sigma = latency_sigma
+    server.tokens_per_second = tokens_per_second
+    server.load_seconds = load_seconds
+    server.reply = reply
+    server.models = list(models)
+    server.slots = threading.BoundedSemaphore(parallel) if parallel else contextlib.nullcontext()
+    server.error_rate = error_rate
+    server.rate_limit_rate = rate_limit_rate
+    server.retry_after = retry_after
+    server.script = list(script or [])
+    server.script_index = 0
+    server.tool_mode = tool_mode
+    server.json_reply = json_reply
+    server.embed_dim = embed_dim
+    server.embed_latency = embed_latency
+    server.rng = random.Random(seed)
+    server.lock = threading.Lock()
+    server.loaded = set()
+    server.stats = {}
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    host, bound_port = server.server_address[:2]
+    return server, f"http://{host}:{bound_port}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a mock Ollama server.")
+    parser.add_argument("--port", type=int, default=11500)
+    parser.add_argument("--latency", type=float, default=0.0, help="mean seconds before the first token")
+    parser.add_argument("--latency-dist", default="fixed", choices=["fixed", "uniform", "exponential", "lognormal"])
+    parser.add_argument("--latency-sigma", type=float, default=0.5)
+    parser.add_argument("--tokens-per-second", type=float, default=None)
+    parser.add_argument("--load-seconds", type=float, default=0.0, help="first-request model load time")
+    parser.add_argument("--parallel", type=int, default=None, help="max requests answered at once")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="share answered with 429")
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--reply", default="ok")
+    parser.add_argument("--models", default="smollm2:1.7b", help="comma-separated names for /api/tags")
+    parser.add_argument("--script", default=None, help="JSON file with a list of scripted replies")
+    parser.add_argument("--tool-mode", default="first", choices=["first", "none"])
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+    script = None
+    if args.script:
+        with open(args.script, encoding="utf-8") as f:
+            script = json.load(f)
+    server, url = start_mock_server(
+        port=args.port, latency=args.latency, reply=args.reply, models=args.models.split(","),
+        parallel=args.parallel, latency_dist=args.latency_dist, latency_sigma=args.latency_sigma,
+        tokens_per_second=args.tokens_per_second, load_seconds=args.load_seconds,
+        error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate, retry_after=args.retry_after,
+        script=script, tool_mode=args.tool_mode, seed=args.seed,
+    )
+    print(f"Mock Ollama listening at {url} (Ctrl+C to stop)")
+    print(f"Point the helpers at it with: OLLAMA_HOST={url}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()